@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Benchmarks de chaque étape du pipeline + du pipeline complet.
+#   python -m benchmarks.bench_pipeline                       (1k, 10k, 100k avis)
+#   python -m benchmarks.bench_pipeline --sizes 1000 --models stub
+#   python -m benchmarks.bench_pipeline --baseline benchmarks/results/ancien.json --threshold 0.2
+# Les résultats sont enregistrés en JSON (benchmarks/results/) pour comparer deux versions du code.
+# Le code n'écrit jamais dans la vraie base : une base SQLite temporaire est utilisée.
+
+_DOSSIER_TMP = tempfile.mkdtemp(prefix="bench_avis_")
+os.environ.setdefault("AVIS_DATABASE_URL", f"sqlite:///{os.path.join(_DOSSIER_TMP, 'bench.db')}")
+os.environ.setdefault("AVIS_WARMUP", "0")
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.standins import real_models_available, install_standins
+from src.cache import evict_cache
+from src.database import init_db, save_reviews
+from src.instrumentation import rss_bytes
+from src.models import registry
+from src.pipeline import run_streaming_pipeline
+from src.preprocessing import detect_language, detect_languages, clean_texts, detect_language_cache_clear
+from src.sentiment import analyze_sentiment_batch
+from src.topic_modeling import run_topic_modeling
+
+DOSSIER_RESULTATS = os.path.join("benchmarks", "results")
+TAILLES = [1000, 10000, 100000]
+TAILLE_LOT = 500   # Les étapes "batch" sont mesurées lot par lot (latence par avis = temps du lot / taille)
+
+# 1. Mesures
+class _MemoirePic:
+    """Pic de mémoire (RSS) pendant un bloc de code, échantillonné toutes les 10 ms"""
+
+    def __init__(self):
+        self.pic = 0
+        self._stop = threading.Event()
+
+    def _boucle(self):
+        while not self._stop.is_set():
+            self.pic = max(self.pic, rss_bytes())
+            self._stop.wait(0.01)
+
+    def __enter__(self):
+        self.depart = rss_bytes()
+        self.pic = self.depart
+        self._thread = threading.Thread(target=self._boucle, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.pic = max(self.pic, rss_bytes())
+
+def _percentile(valeurs, p):
+    if not valeurs:
+        return None
+    if len(valeurs) == 1:
+        return valeurs[0]
+    return statistics.quantiles(valeurs, n=100, method="inclusive")[p - 1]
+
+def measure(nom, n_items, fonction, latences=None):
+    """
+    Exécute fonction() et retourne ses mesures.
+    latences : liste remplie par la fonction (secondes par avis) ; sinon temps total / n_items
+    """
+    latences = latences if latences is not None else []
+    with _MemoirePic() as memoire:
+        debut = time.perf_counter()
+        fonction()
+        secondes = time.perf_counter() - debut
+    if not latences:
+        latences = [secondes / max(n_items, 1)]
+    return {
+        "etape": nom,
+        "avis": n_items,
+        "secondes": secondes,
+        "avis_par_seconde": n_items / max(secondes, 1e-9),
+        "latence_p50_ms": _percentile(latences, 50) * 1000,
+        "latence_p95_ms": _percentile(latences, 95) * 1000,
+        "pic_memoire_mo": (memoire.pic - memoire.depart) / 1e6,
+    }
+
+def _par_lots(textes, fonction, latences):
+    resultats = []
+    for debut in range(0, len(textes), TAILLE_LOT):
+        lot = textes[debut:debut + TAILLE_LOT]
+        t = time.perf_counter()
+        resultats.extend(fonction(lot))
+        latences.append((time.perf_counter() - t) / len(lot))
+    return resultats
+
+# 2. Étapes
+def bench_size(n, seed=42):
+    """Mesure chaque étape puis le pipeline complet sur un corpus de n avis"""
+    df = generate_corpus(n, seed=seed)
+    textes = df["commentaire"].tolist()
+    resultats = []
+    etat = {}
+
+    # A. Détection de langue (appel par appel, cache vidé avant)
+    detect_language_cache_clear()
+    latences = []
+    def _langue():
+        for texte in textes:
+            t = time.perf_counter()
+            detect_language(texte)
+            latences.append(time.perf_counter() - t)
+    resultats.append(measure("detect_language", n, _langue, latences))
+    etat["langues"] = detect_languages(textes)
+
+    # B. Nettoyage spaCy (par lots)
+    latences = []
+    def _nettoyage():
+        etat["nettoyes"] = _par_lots(list(range(n)), lambda lot: clean_texts(
+            [textes[i] for i in lot], langues=[etat["langues"][i] for i in lot]), latences)
+    resultats.append(measure("clean_text", n, _nettoyage, latences))
+
+    # C. Sentiment (par lots)
+    latences = []
+    def _sentiment():
+        etat["sentiments"] = _par_lots(textes, analyze_sentiment_batch, latences)
+    resultats.append(measure("analyze_sentiment", n, _sentiment, latences))
+
+    # D. Topic Modeling (tout le corpus d'un coup)
+    df["Avis_Nettoye"] = etat["nettoyes"]
+    def _topics():
+        etat["df"], _ = run_topic_modeling(df.copy(), "Avis_Nettoye", n_topics=2)
+    resultats.append(measure("run_topic_modeling", n, _topics))
+
+    # E. Écriture en base (par lots)
+    lignes = [{"text_content": f"{texte} #{i}", "source": source, "topic": sujet, "sentiment": label, "score": score}
+              for i, (texte, source, sujet, (label, score, _)) in enumerate(zip(
+                  textes, df["source"], etat["df"].get("Sujet_Dominant", [None] * n), etat["sentiments"]))]
+    latences = []
+    resultats.append(measure("save_to_db", n, lambda: _par_lots(
+        lignes, lambda lot: [save_reviews(lot)], latences), latences))
+
+    # F. Pipeline complet, par le même chemin que l'application (run_streaming_pipeline :
+    #    process_with_cache -> sujets -> base), cache de résultats vide puis rempli
+    source = os.path.join(_DOSSIER_TMP, f"corpus_{n}.csv")
+    generate_corpus(n, seed=seed + 1).to_csv(source, index=False)
+    modele_sujets = os.path.join(_DOSSIER_TMP, f"topics_{n}.joblib")
+    detect_language_cache_clear()
+    evict_cache(0)
+    resultats.append(measure("end_to_end", n, lambda: run_streaming_pipeline(source, topic_model_path=modele_sujets)))
+    resultats.append(measure("end_to_end_cache", n,
+                             lambda: run_streaming_pipeline(source, topic_model_path=modele_sujets)))
+    return resultats
+
+# 3. Comparaison avec une exécution précédente
+def compare(resultats, baseline, threshold):
+    """
+    Compare le débit (avis/s) de chaque étape à celui du fichier de référence.
+    Retourne : la liste des régressions (baisse de débit > threshold, ex: 0.2 = -20 %)
+    """
+    reference = {(r["etape"], r["avis"]): r for r in baseline["resultats"]}
+    regressions = []
+    for r in resultats:
+        ancien = reference.get((r["etape"], r["avis"]))
+        if ancien is None:
+            continue
+        variation = r["avis_par_seconde"] / max(ancien["avis_par_seconde"], 1e-9) - 1
+        r["variation_vs_reference"] = variation
+        if variation < -threshold:
+            regressions.append(f"{r['etape']} ({r['avis']} avis) : {variation * 100:+.1f} %")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks du pipeline d'analyse d'avis")
+    parser.add_argument("--sizes", type=int, nargs="+", default=TAILLES, help="Tailles de corpus")
+    parser.add_argument("--models", choices=["auto", "real", "stub"], default="auto",
+                        help="Vrais modèles, modèles de substitution, ou auto (vrais s'ils sont présents)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Fichier JSON de sortie")
+    parser.add_argument("--baseline", default=None, help="Fichier JSON d'une exécution précédente")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Baisse de débit tolérée (0.2 = 20 %%)")
+    args = parser.parse_args(argv)
+
+    vrais_modeles = args.models == "real" or (args.models == "auto" and real_models_available())
+    if not vrais_modeles:
+        install_standins()
+    init_db()
+
+    resultats = []
+    for n in args.sizes:
+        print(f"⏳ Corpus de {n} avis...")
+        for r in bench_size(n, seed=args.seed):
+            print(f"   {r['etape']:<20} {r['avis_par_seconde']:>10.0f} avis/s   "
+                  f"p50 {r['latence_p50_ms']:.3f} ms   p95 {r['latence_p95_ms']:.3f} ms   "
+                  f"mémoire +{r['pic_memoire_mo']:.1f} Mo")
+            resultats.append(r)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(resultats, json.load(f), args.threshold)
+
+    rapport = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu": os.cpu_count(),
+        "modeles": "reels" if vrais_modeles else "substitution",
+        "chargement_modeles_s": {k: v for k, v in registry.load_times.items()},
+        "resultats": resultats,
+        "regressions": regressions,
+    }
+    sortie = args.output or os.path.join(DOSSIER_RESULTATS, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(sortie) or ".", exist_ok=True)
+    with open(sortie, "w", encoding="utf-8") as f:
+        json.dump(rapport, f, indent=2, ensure_ascii=False)
+    print(f"✅ Résultats enregistrés : {sortie}")
+
+    if regressions:
+        print("❌ Régressions de performance :")
+        for ligne in regressions:
+            print(f"   - {ligne}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import os
+import random
+
+import pandas as pd
+
+# Générateur de corpus d'avis synthétiques FR/EN, à partir des avis de data/avis_clients.csv
+# (phrases courtes, une opinion + un sujet, sources site_web / email / app_mobile).
+# Chaque avis reçoit des détails variés (produit, numéro de commande, délai, prix...) : le nombre de textes
+# distincts croît avec n, comme sur de vrais avis. Sans cela, les caches (langue, résultats) et le
+# regroupement des doublons ne mesureraient presque que des doublons. La part de vrais doublons
+# (copier-coller) est fixée par part_doublons.
+
+CHEMIN_EXEMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "avis_clients.csv")
+SOURCES = ["site_web", "email", "app_mobile"]
+
+SUJETS_FR = ["Ce produit", "La livraison", "Le service client", "Le rapport qualité prix", "L'emballage",
+             "L'application", "Le remboursement", "Le vendeur"]
+AVIS_FR = {
+    "positif": ["est incroyable, je l'adore !", "était très rapide, merci.", "est impeccable, comme toujours.",
+                "est excellent, je recommande.", "m'a vraiment satisfait."],
+    "negatif": ["est une catastrophe, je déteste.", "était très lente et personne ne répond.",
+                "est absent, c'est inadmissible.", "est nul, je ne rachèterai jamais.", "m'a beaucoup déçu."],
+    "neutre": ["est correct sans plus.", "est pas mal, mais un peu cher.", "est moyen, ça passe.",
+               "est conforme à la description."],
+}
+INTROS_FR = ["", "", "Bonjour, ", "Alors, ", "Franchement, ", "Bof. ", "Honnêtement, ", "Pour résumer : "]
+PRODUITS_FR = ["cafetière", "casque audio", "paire de baskets", "lampe de bureau", "sac à dos", "montre", "tapis",
+               "perceuse", "valise", "robot cuiseur", "aspirateur", "veste", "clavier", "poussette", "matelas"]
+DETAILS_FR = ["Commande n°{num} ({produit}).", "Reçu en {jours} jours.", "Payé {prix} € ({produit}).",
+              "C'est mon {rang}e achat ici.", "Acheté le {jour}/{mois} : {produit}, taille {taille}.",
+              "Colis de {poids} kg, {produit} {couleur}."]
+
+SUJETS_EN = ["This product", "The delivery", "Customer service", "The price", "The packaging",
+             "The app", "The refund", "The seller"]
+AVIS_EN = {
+    "positif": ["is amazing, I love it!", "was extremely fast, good job!", "is perfect as always.",
+                "is excellent, highly recommended.", "really made my day."],
+    "negatif": ["is terrible, I hate it.", "was very slow and nobody answers.", "is too expensive for what it is.",
+                "is very bad, I will never buy again.", "was a huge disappointment."],
+    "neutre": ["is okay, nothing special.", "is fine but a bit pricey.", "is average.",
+               "matches the description."],
+}
+INTROS_EN = ["", "", "Hi, ", "Well, ", "Honestly, ", "Meh. ", "To be fair, ", "In short: "]
+PRODUITS_EN = ["coffee maker", "headset", "pair of sneakers", "desk lamp", "backpack", "watch", "rug", "drill",
+               "suitcase", "food processor", "vacuum", "jacket", "keyboard", "stroller", "mattress"]
+DETAILS_EN = ["Order #{num} ({produit}).", "Arrived in {jours} days.", "Paid ${prix} for a {produit}.",
+              "This is my order number {rang} here.", "Bought on {mois}/{jour}: {produit}, size {taille}.",
+              "{poids} kg parcel, {couleur} {produit}."]
+
+COULEURS = {"fr": ["noir", "blanc", "rouge", "bleu", "vert", "gris"],
+            "en": ["black", "white", "red", "blue", "green", "grey"]}
+TAILLES = ["XS", "S", "M", "L", "XL", "36", "38", "40", "42", "44"]
+
+def _exemples():
+    """Avis du fichier d'exemple, rangés par langue ({'fr': [...], 'en': [...]}, vide si le fichier manque)"""
+    if not os.path.exists(CHEMIN_EXEMPLES):
+        return {"fr": [], "en": []}
+    from src.preprocessing import detect_language
+
+    exemples = {"fr": [], "en": []}
+    for texte in pd.read_csv(CHEMIN_EXEMPLES)["commentaire"].dropna():
+        exemples["en" if detect_language(texte) == "en" else "fr"].append(texte)
+    return exemples
+
+def _detail(rng, langue):
+    """Phrase de détail tirée au hasard (nombres, produit, couleur...)"""
+    modele = rng.choice(DETAILS_EN if langue == "en" else DETAILS_FR)
+    return modele.format(
+        num=rng.randint(10000, 99999), jours=rng.randint(1, 30), prix=rng.randint(5, 500), rang=rng.randint(2, 40),
+        jour=rng.randint(1, 28), mois=rng.randint(1, 12), taille=rng.choice(TAILLES), poids=rng.randint(1, 25),
+        produit=rng.choice(PRODUITS_EN if langue == "en" else PRODUITS_FR), couleur=rng.choice(COULEURS[langue]),
+    )
+
+def generate_corpus(n, seed=42, part_en=0.4, part_doublons=0.05):
+    """
+    Génère n avis (DataFrame avec les colonnes 'commentaire' et 'source', comme le fichier d'exemple).
+    part_doublons : part des avis recopiés à l'identique d'un avis précédent.
+    Même graine = même corpus.
+    """
+    rng = random.Random(seed)
+    exemples = _exemples()
+    lignes = []
+    for _ in range(n):
+        if lignes and rng.random() < part_doublons:
+            lignes.append(dict(rng.choice(lignes)))
+            continue
+        langue = "en" if rng.random() < part_en else "fr"
+        sujets, avis, intros = (SUJETS_EN, AVIS_EN, INTROS_EN) if langue == "en" else (SUJETS_FR, AVIS_FR, INTROS_FR)
+        # Un avis sur quatre part d'un avis réel du fichier d'exemple
+        if exemples[langue] and rng.random() < 0.25:
+            phrase = rng.choice(exemples[langue])
+        else:
+            polarite = rng.choices(["positif", "negatif", "neutre"], weights=[5, 3, 2])[0]
+            phrase = f"{rng.choice(sujets)} {rng.choice(avis[polarite])}"
+        intro = rng.choice(intros)
+        if intro.endswith((", ", ": ")) and not phrase.startswith("I "):
+            phrase = phrase[0].lower() + phrase[1:]
+        phrase = f"{intro}{phrase}"
+        # Un avis sur trois contient une deuxième phrase (textes de longueurs variées)
+        if rng.random() < 0.33:
+            phrase += f" {rng.choice(sujets)} {rng.choice(avis[rng.choice(list(avis))])}"
+        if rng.random() < 0.8:
+            phrase += f" {_detail(rng, langue)}"
+        lignes.append({"commentaire": phrase, "source": rng.choice(SOURCES)})
+    return pd.DataFrame(lignes)
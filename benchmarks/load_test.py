@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import requests
+
+# Test de charge du service de scoring (src/api.py) : débit et latences sous différentes concurrences.
+#   python -m benchmarks.load_test --url http://127.0.0.1:8000           (service déjà lancé)
+#   python -m benchmarks.load_test --models stub --concurrency 1 8 32    (service lancé dans ce processus)
+#   python -m benchmarks.load_test --bulk-size 50                        (endpoint /score/bulk)
+# Chaque "client" est un thread qui enchaîne ses requêtes sans pause (boucle fermée).
+
+os.environ.setdefault("AVIS_WARMUP", "1")
+
+from benchmarks.corpus import generate_corpus
+
+DOSSIER_RESULTATS = os.path.join("benchmarks", "results")
+CONCURRENCES = [1, 8, 32, 64]
+DELAI_DEMARRAGE = 600   # Secondes d'attente maximale du chargement des modèles
+
+# 1. Service local (optionnel)
+def _port_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_local_server(models="auto"):
+    """Lance le service dans un thread de ce processus ; retourne son URL"""
+    import uvicorn
+    from benchmarks.standins import real_models_available, install_standins
+    from src.api import app
+
+    if not (models == "real" or (models == "auto" and real_models_available())):
+        install_standins()
+    port = _port_libre()
+    serveur = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=serveur.run, name="service-scoring", daemon=True).start()
+    return f"http://127.0.0.1:{port}"
+
+def wait_until_ready(url, timeout=DELAI_DEMARRAGE):
+    """Attend que /ready réponde 200 ; retourne le temps d'attente (secondes)"""
+    debut = time.perf_counter()
+    while time.perf_counter() - debut < timeout:
+        try:
+            if requests.get(f"{url}/ready", timeout=5).status_code == 200:
+                return time.perf_counter() - debut
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Service non prêt après {timeout} s ({url})")
+
+# 2. Charge
+def run_level(url, texts, concurrency, n_requests, bulk_size=0):
+    """
+    n_requests requêtes réparties sur concurrency clients.
+    bulk_size=0 : un avis par requête (/score) ; sinon bulk_size avis par requête (/score/bulk)
+    """
+    latences = []
+    erreurs = 0
+    verrou = threading.Lock()
+    compteur = iter(range(n_requests))
+
+    def client():
+        nonlocal erreurs
+        session = requests.Session()
+        while True:
+            with verrou:
+                i = next(compteur, None)
+            if i is None:
+                return
+            if bulk_size:
+                debut_lot = (i * bulk_size) % len(texts)
+                endpoint, corps = "/score/bulk", {"texts": texts[debut_lot:debut_lot + bulk_size]}
+            else:
+                endpoint, corps = "/score", {"text": texts[i % len(texts)]}
+            debut = time.perf_counter()
+            try:
+                ok = session.post(f"{url}{endpoint}", json=corps, timeout=60).status_code == 200
+            except requests.RequestException:
+                ok = False
+            secondes = time.perf_counter() - debut
+            with verrou:
+                if ok:
+                    latences.append(secondes)
+                else:
+                    erreurs += 1
+
+    avant = requests.get(f"{url}/health", timeout=5).json()["batcher"]
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    duree = time.perf_counter() - debut
+    apres = requests.get(f"{url}/health", timeout=5).json()["batcher"]
+
+    lots = apres["lots"] - avant["lots"]
+    avis_par_requete = bulk_size or 1
+    latences_ms = np.array(latences) * 1000
+    return {
+        "concurrence": concurrency,
+        "requetes": n_requests,
+        "erreurs": erreurs,
+        "avis_par_requete": avis_par_requete,
+        "requetes_par_seconde": len(latences) / duree,
+        "avis_par_seconde": len(latences) * avis_par_requete / duree,
+        **{f"latence_p{p}_ms": float(np.percentile(latences_ms, p)) if len(latences_ms) else None
+           for p in (50, 95, 99)},
+        "latence_max_ms": float(latences_ms.max()) if len(latences_ms) else None,
+        "taille_moyenne_lot": (apres["avis"] - avant["avis"]) / lots if lots else None,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge du service de scoring")
+    parser.add_argument("--url", default=None, help="URL d'un service déjà lancé (défaut : service local)")
+    parser.add_argument("--models", choices=["auto", "real", "stub"], default="auto",
+                        help="Modèles du service local (ignoré avec --url)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=CONCURRENCES, help="Clients simultanés")
+    parser.add_argument("--requests", type=int, default=1000, help="Requêtes par niveau de concurrence")
+    parser.add_argument("--bulk-size", type=int, default=0, help="Avis par requête /score/bulk (0 = /score)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Fichier JSON de sortie")
+    args = parser.parse_args(argv)
+
+    url = args.url or start_local_server(args.models)
+    print(f"⏳ Attente du service ({url})...")
+    attente = wait_until_ready(url)
+    print(f"✅ Service prêt ({attente:.1f} s)")
+
+    texts = generate_corpus(max(args.requests * max(args.bulk_size, 1), 100), seed=args.seed)["commentaire"].tolist()
+    # Une première requête hors mesure (connexions, premiers appels des modèles)
+    requests.post(f"{url}/score", json={"text": texts[0]}, timeout=60)
+
+    resultats = []
+    for concurrence in args.concurrency:
+        r = run_level(url, texts, concurrence, args.requests, args.bulk_size)
+        print(f"   {concurrence:>4} clients   {r['avis_par_seconde']:>8.0f} avis/s   "
+              f"p50 {r['latence_p50_ms'] or 0:.1f} ms   p99 {r['latence_p99_ms'] or 0:.1f} ms   "
+              f"lots de {r['taille_moyenne_lot'] or 0:.1f} avis   erreurs {r['erreurs']}")
+        resultats.append(r)
+
+    sante = requests.get(f"{url}/health", timeout=5).json()
+    rapport = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "url": url,
+        "cpu": os.cpu_count(),
+        "endpoint": "/score/bulk" if args.bulk_size else "/score",
+        "batcher": {k: sante["batcher"][k] for k in ("max_batch_size", "max_wait_ms")},
+        "attente_demarrage_s": attente,
+        "resultats": resultats,
+    }
+    sortie = args.output or os.path.join(DOSSIER_RESULTATS, f"load_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(sortie) or ".", exist_ok=True)
+    with open(sortie, "w", encoding="utf-8") as f:
+        json.dump(rapport, f, indent=2, ensure_ascii=False)
+    print(f"✅ Résultats enregistrés : {sortie}")
+    return 1 if any(r["erreurs"] for r in resultats) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
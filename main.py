@@ -2,16 +2,45 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import numpy as np # Pour les dates simulées
-from datetime import datetime, timedelta
+import hashlib
+import io
+import os
+from datetime import date, datetime, timedelta
 
-from src.database import SessionLocal, Review, init_db
-from src.preprocessing import clean_text, detect_language
-from src.topic_modeling import run_topic_modeling
-from src.sentiment import analyze_sentiment
+from src.database import init_db, save_reviews
+from src.models import registry, WARMUP, SENTIMENT_BACKEND, SENTIMENT_CASCADE, CASCADE_THRESHOLD
+from src.topic_modeling import run_incremental_topic_modeling, run_topic_modeling, TOPIC_ENGINE
+from src.cache import process_with_cache, pipeline_version
+from src.pipeline import find_text_column
+from src.jobs import get_job_manager, get_job, get_job_keywords, list_jobs, load_job_results, TERMINE, ERREUR
+from src.sentiment import sentiment_to_stars
+from src.instrumentation import metrics
+from src.storage import (compact_dtypes, memory_mb, store_path, write_store, read_store, read_store_metadata,
+                         touch_store)
+from src.kpis import get_filter_options, get_kpis, sentiment_distribution, topic_averages, daily_counts
+from src.preprocessing import detect_language_cache_info
+from src.dedup import NEAR_DUPLICATES, SEUIL_SIMILARITE
+from src.cascade import train_cascade, compare_cascade, ETAPE_LINEAIRE
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Projet Data Science - Othmane", layout="wide")
-init_db()
+
+# Streamlit ré-exécute ce script à chaque clic : les étapes coûteuses sont mises en cache
+CACHE_TTL = 3600          # Durée de vie d'un résultat de pipeline (secondes)
+CACHE_MAX_FICHIERS = 8    # Nombre de fichiers traités gardés en mémoire
+TAILLE_COMPARAISON_CASCADE = 2000   # Avis de la sélection passés dans les deux modes (admin)
+INTERVALLE_SUIVI_JOB = 2  # Secondes entre deux relectures de l'avancement d'un job en arrière-plan
+
+@st.cache_resource
+def initialiser():
+    """Exécuté une seule fois par processus (et non à chaque interaction)"""
+    init_db()
+    # Les modèles se chargent en arrière-plan pendant que l'utilisateur se connecte / choisit son fichier
+    if WARMUP:
+        registry.warm_up(background=True)
+    return registry
+
+initialiser()
 
 # --- GESTION DES DROITS (AUTH SIMPLE - SEMAINE 9) ---
 def check_password():
@@ -33,33 +62,212 @@ def check_password():
     return "visiteur"
 
 # --- FONCTIONS UTILITAIRES ---
-def sentiment_to_stars(sentiment_label):
-    if "Positif" in sentiment_label: return 5
-    elif "Neutre" in sentiment_label: return 3
-    else: return 1
-
 def save_to_db(df, text_column, source_column='source'):
-    session = SessionLocal()
-    count = 0
+    """Archive les avis en BDD en une écriture groupée (sans doublons si on ré-archive)"""
     try:
-        for index, row in df.iterrows():
-            new_review = Review(
-                text_content=row[text_column],
-                source=row.get(source_column, "manuel"),
-                topic=row.get('Sujet_Dominant', None),
-                sentiment=row.get('Sentiment', None),
-                score=row.get('Score_IA', 0.0)
-            )
-            session.add(new_review)
-            count += 1
-        session.commit()
-        return count
+        lignes = pd.DataFrame({
+            # Avis vide (NaN) -> "" et non le texte "nan"
+            'text_content': df[text_column].fillna("").astype(str),
+            'source': df[source_column] if source_column in df else "manuel",
+            'topic': df['Sujet_Dominant'] if 'Sujet_Dominant' in df else None,
+            'sentiment': df['Sentiment'] if 'Sentiment' in df else None,
+            'score': df['Score_IA'].fillna(0.0) if 'Score_IA' in df else 0.0,
+            'sentiment_stage': df['Etape_Sentiment'] if 'Etape_Sentiment' in df else None,
+            'review_date': df['Date'] if 'Date' in df else None,
+        })
+        lignes = lignes.astype(object).where(lignes.notna(), None)
+        return save_reviews(lignes.to_dict('records'))
     except Exception as e:
-        session.rollback()
         st.error(f"Erreur : {e}")
         return 0
-    finally:
-        session.close()
+
+def simuler_dates(df, file_hash):
+    """Dates simulées (Pour filtres S9). Graine tirée du hash : un même fichier a toujours les mêmes dates"""
+    rng = np.random.default_rng(int(file_hash[:8], 16))
+    maintenant = datetime.now()
+    df['Date'] = [(maintenant - timedelta(days=int(j))).date() for j in rng.integers(0, 365, size=len(df))]
+    return df
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_FICHIERS, show_spinner=False)
+def charger_resultats_job(job_id, chunks_done, status, file_hash):
+    """
+    Résultats (éventuellement partiels) d'un job : relus seulement quand un nouveau morceau est prêt,
+    et une dernière fois à la fin (les sujets provisoires sont alors remplacés par ceux du modèle final)
+    """
+    df = load_job_results(job_id)
+    if not df.empty:
+        df = compact_dtypes(simuler_dates(df, file_hash))
+    return df
+
+def barre_avancement(job):
+    total = max(job.rows_total or 0, job.rows_done or 0, 1)
+    st.progress(min((job.rows_done or 0) / total, 1.0), text=f"{job.rows_done or 0} / ~{total} avis")
+
+@st.fragment(run_every=INTERVALLE_SUIVI_JOB)
+def suivre_avancement(job_id, chunks_affiches):
+    """
+    Avancement d'un job en cours, relu toutes les INTERVALLE_SUIVI_JOB secondes (seul ce bloc est réexécuté).
+    Dès qu'un nouveau morceau est prêt (ou que le job s'arrête), toute la page est relancée pour l'afficher.
+    """
+    job = get_job(job_id)
+    if job.status in (TERMINE, ERREUR) or (job.chunks_done or 0) != chunks_affiches:
+        st.rerun()
+    barre_avancement(job)
+
+def suivre_job(file_hash, contenu, filename):
+    """
+    Mode arrière-plan : lance (ou retrouve) le job de ce fichier et affiche son avancement.
+    Le job continue même si la page est rechargée ; ré-uploader le fichier permet de le retrouver.
+    Retourne : (df disponible, mots-clés des sujets, colonne texte, job terminé ?)
+    """
+    job_id = get_job_manager().submit(contenu, filename, file_hash)
+    job = get_job(job_id)
+
+    st.sidebar.caption(f"Job n°{job.id} : {job.status}")
+    if job.status == ERREUR:
+        st.sidebar.error(f"Erreur : {job.error}")
+        return pd.DataFrame(), {}, None, True
+    with st.sidebar:
+        if job.status == TERMINE:
+            barre_avancement(job)
+        else:
+            suivre_avancement(job.id, job.chunks_done or 0)
+
+    df = charger_resultats_job(job.id, job.chunks_done or 0, job.status, file_hash)
+    return df, get_job_keywords(job), job.text_column, job.status == TERMINE
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_FICHIERS, show_spinner=False)
+def run_pipeline(file_hash, _contenu, n_topics=2):
+    """
+    Pipeline complet sur un fichier uploadé.
+    Le cache est indexé sur le hash du contenu (file_hash) et les paramètres :
+    _contenu (préfixe '_') n'est pas re-hashé par Streamlit.
+    Le résultat est écrit en Parquet (store/<hash>.parquet) : Streamlit ne garde que le chemin,
+    les données sont relues à la demande (voir charger_selection). Un fichier déjà traité par la même
+    version du pipeline n'est pas recalculé, même après un redémarrage.
+    Retourne : (chemin Parquet, métadonnées : colonne texte, mots-clés des sujets, valeurs des filtres...)
+               chemin = None si la colonne texte est introuvable ou si le fichier ne contient aucun avis
+    """
+    chemin = store_path(file_hash)
+    infos = read_store_metadata(chemin)
+    dedup = {"near": NEAR_DUPLICATES, "threshold": SEUIL_SIMILARITE}
+    if (infos and infos.get("version") == pipeline_version() and infos.get("n_topics") == n_topics
+            and infos.get("dedup") == dedup and infos.get("topic_engine", "online") == TOPIC_ENGINE):
+        # Réutilisé : le fichier ne doit pas être purgé tant que ce résultat est en cache
+        touch_store(chemin)
+        return chemin, infos
+
+    # Chaque étape est mesurée (voir la section Performance de la zone admin)
+    with metrics.stage("pipeline.total") as mesure_totale:
+        # Lecture
+        with metrics.stage("pipeline.lecture_csv") as mesure:
+            df = pd.read_csv(io.BytesIO(_contenu))
+            mesure.items = len(df)
+        col_texte = find_text_column(df.columns)
+        if col_texte is None:
+            return None, {"text_column": None}
+        if df.empty:
+            # Fichier sans aucun avis : rien à calculer ni à stocker
+            return None, {"text_column": col_texte, "lignes": 0}
+        mesure_totale.items = len(df)
+
+        # 1. Simulation Dates (Pour filtres S9)
+        df = simuler_dates(df, file_hash)
+
+        # 2. NLP + 3. Sentiment (par lots)
+        # Seuls les avis jamais vus (ou vus avec une autre version des modèles) sont recalculés,
+        # et un seul avis par groupe de doublons (voir src/dedup.py)
+        with metrics.stage("pipeline.nlp_sentiment", items=len(df)):
+            # Un seul processus : pas de fork de spaCy dans le serveur Streamlit, où tournent déjà le
+            # préchargement des modèles et les jobs (fork + threads actifs = risque de blocage).
+            # Le nettoyage multi-cœurs reste dans le mode batch (src/batch.py, processus "spawn").
+            resultats = process_with_cache(df[col_texte].tolist(), n_process=1, batch_size=32)
+            for col in resultats.columns:
+                df[col] = resultats[col].values
+            df['Note_Business'] = df['Sentiment'].apply(sentiment_to_stars)
+
+        # 4. Topics (modèle sauvegardé, mis à jour avec ce fichier : les sujets restent les mêmes d'un jour à l'autre)
+        # AVIS_TOPIC_ENGINE=nmf / lda : moteur entraîné sur ce fichier seulement ("nmf" : le plus rapide)
+        with metrics.stage("pipeline.topics", items=len(df)):
+            if TOPIC_ENGINE == "online":
+                df, topics_display = run_incremental_topic_modeling(df, 'Avis_Nettoye', n_topics=n_topics)
+            else:
+                df, topics_display = run_topic_modeling(df, 'Avis_Nettoye', n_topics=n_topics, engine=TOPIC_ENGINE)
+
+        # 5. Stockage compact (catégories, float32, chaînes Arrow) en Parquet
+        with metrics.stage("pipeline.stockage", items=len(df)):
+            df = compact_dtypes(df)
+            infos = {
+                "version": pipeline_version(), "n_topics": n_topics, "dedup": dedup, "topic_engine": TOPIC_ENGINE,
+                "text_column": col_texte,
+                "topics_display": topics_display, "lignes": len(df), "memoire_mo": memory_mb(df),
+                **options_filtres(df),
+            }
+            write_store(df, chemin, infos, min_age=CACHE_TTL)
+    return chemin, infos
+
+def options_filtres(df):
+    """Valeurs possibles des filtres (dates extrêmes, sujets, sentiments) d'un DataFrame enrichi"""
+    return {
+        "date_min": df['Date'].min(), "date_max": df['Date'].max(),
+        "topics": sorted(df['Sujet_Dominant'].dropna().unique().tolist()) if 'Sujet_Dominant' in df else [],
+        "sentiments": sorted(df['Sentiment'].dropna().unique().tolist()),
+    }
+
+def charger_selection(donnees, date_min, date_max, topics, sentiments):
+    """
+    Avis qui passent les filtres.
+    donnees : chemin Parquet (lecture des seules lignes filtrées) ou DataFrame déjà en mémoire (mode job)
+    """
+    if isinstance(donnees, str):
+        return read_store(donnees, date_min=date_min, date_max=date_max, topics=topics, sentiments=sentiments)
+    mask = (
+        (donnees['Date'] >= date_min) &
+        (donnees['Date'] <= date_max) &
+        (donnees['Sujet_Dominant'].isin(topics)) &
+        (donnees['Sentiment'].isin(sentiments))
+    )
+    return donnees[mask]
+
+def afficher_kpis_historique():
+    """KPIs sur tous les avis archivés, calculés en SQL sur les agrégats journaliers (src/kpis.py)"""
+    options = get_filter_options()
+    if options["date_min"] is None:
+        st.info("Aucun avis archivé : utilisez « Sauvegarder la sélection en BDD » (zone admin).")
+        return
+
+    f1, f2, f3, f4 = st.columns(4)
+    periode = f1.date_input("Période (historique)", [options["date_min"], options["date_max"]])
+    sources = f2.multiselect("Sources", options["sources"], default=options["sources"])
+    topics = f3.multiselect("Thèmes (historique)", options["topics"], default=options["topics"],
+                            format_func=lambda t: t or "(sans sujet)")
+    sentiments = f4.multiselect("Sentiments (historique)", options["sentiments"], default=options["sentiments"],
+                                format_func=lambda s: s or "(inconnu)")
+    filtres = {"date_min": periode[0], "date_max": periode[-1], "sources": sources,
+               "topics": topics, "sentiments": sentiments}
+
+    kpis = get_kpis(**filtres)
+    if kpis["avis"] == 0:
+        st.warning("Aucune donnée ne correspond aux filtres sélectionnés.")
+        return
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Note Moyenne (Historique)", f"{kpis['note_moyenne']:.2f} / 5⭐" if kpis["note_moyenne"] else "-")
+    c2.metric("Avis Archivés", kpis["avis"])
+    c3.metric("Confiance Moyenne de l'IA", f"{kpis['score_moyen']:.2f}")
+
+    c_graph1, c_graph2 = st.columns(2)
+    with c_graph1:
+        df_grp = topic_averages(**filtres)
+        fig = px.bar(df_grp, x='topic', y='note_moyenne', color='note_moyenne', title="Qualité par Sujet", range_y=[0,5],
+                     color_continuous_scale='RdYlGn', labels={'topic': 'Sujet', 'note_moyenne': 'Note_Business'})
+        st.plotly_chart(fig, use_container_width=True)
+    with c_graph2:
+        fig2 = px.pie(sentiment_distribution(**filtres), names='sentiment', values='avis', title="Répartition",
+                      color='sentiment', color_discrete_map={'Positif 😃':'green', 'Négatif 😡':'red', 'Neutre 😐':'orange'})
+        st.plotly_chart(fig2, use_container_width=True)
+    fig3 = px.bar(daily_counts(**filtres), x='day', y='avis', color='sentiment', title="Avis par jour",
+                  color_discrete_map={'Positif 😃':'green', 'Négatif 😡':'red', 'Neutre 😐':'orange'})
+    st.plotly_chart(fig3, use_container_width=True)
 
 # =========================================================
 # DÉBUT DE L'APPLICATION
@@ -79,41 +287,42 @@ st.sidebar.header("1. Collecte des Données")
 uploaded_file = st.sidebar.file_uploader("Charger un CSV", type=["csv"])
 
 if uploaded_file is not None:
-    # Lecture
-    df = pd.read_csv(uploaded_file)
-    col_trouvee = [c for c in df.columns if c.lower() in ['commentaire', 'avis', 'review', 'text']]
+    # --- TRAITEMENT AUTOMATIQUE (PIPELINE) ---
+    # Calculé une seule fois par fichier : les filtres ci-dessous ne relancent pas le pipeline
+    contenu = uploaded_file.getvalue()
+    file_hash = hashlib.sha256(contenu).hexdigest()
+    # Gros fichiers : traitement par un job en arrière-plan, la session n'est pas bloquée
+    if st.sidebar.toggle("⏱️ Traitement en arrière-plan", help="Conseillé pour les gros fichiers"):
+        df, topics_display, col_texte, termine = suivre_job(file_hash, contenu, uploaded_file.name)
+        if df.empty and not termine:
+            st.info("⏳ Traitement en cours : les premiers résultats s'afficheront ici dès qu'ils seront prêts.")
+            st.stop()
+        # Résultats (partiels) du job : déjà en mémoire
+        donnees, nb_total = df, len(df)
+        infos = options_filtres(df) if not df.empty else {}
+    else:
+        # Profil / tracemalloc (section Performance) : réglages propres à la session, pas au serveur
+        with st.spinner('⏳ Exécution du Pipeline IA complet...'), metrics.options(
+                profile=st.session_state.get("perf_profile"), trace_memory=st.session_state.get("perf_trace_memory")):
+            donnees, infos = run_pipeline(file_hash, contenu, n_topics=2)
+            if donnees is not None and not os.path.exists(donnees):
+                # Fichier Parquet supprimé depuis la mise en cache (purge, autre processus...) : on recalcule
+                run_pipeline.clear(file_hash, contenu, n_topics=2)
+                donnees, infos = run_pipeline(file_hash, contenu, n_topics=2)
+        topics_display, col_texte = infos.get("topics_display", {}), infos["text_column"]
+        nb_total = infos.get("lignes", 0)
+        termine = True
+    if col_texte is not None and nb_total == 0:
+        # Fichier sans aucun avis : pas de dates ni de sujets pour construire les filtres
+        st.info("📭 Aucun avis à analyser dans ce fichier.")
+        st.stop()
     
-    if col_trouvee:
-        col_texte = col_trouvee[0]
+    if col_texte is not None:
         st.sidebar.success(f"Colonne détectée : {col_texte}")
-        
-        # --- TRAITEMENT AUTOMATIQUE (PIPELINE) ---
-        with st.spinner('⏳ Exécution du Pipeline IA complet...'):
-            
-            # 1. Simulation Dates (Pour filtres S9)
-            dates_random = [datetime.now() - timedelta(days=np.random.randint(0, 365)) for _ in range(len(df))]
-            df['Date'] = dates_random
-            df['Date'] = pd.to_datetime(df['Date']).dt.date
-
-            # 2. NLP
-            df['Langue'] = df[col_texte].apply(detect_language)
-            df['Avis_Nettoye'] = df[col_texte].apply(clean_text)
-            
-            # 3. Sentiment
-            sentiments = []
-            scores_ia = []
-            for text in df[col_texte]:
-                label, score, _ = analyze_sentiment(text)
-                sentiments.append(label)
-                scores_ia.append(score)
-            df['Sentiment'] = sentiments
-            df['Score_IA'] = scores_ia
-            df['Note_Business'] = df['Sentiment'].apply(sentiment_to_stars)
-            
-            # 4. Topics
-            df, topics_display = run_topic_modeling(df, 'Avis_Nettoye', n_topics=2)
-            
-        st.sidebar.success("✅ Traitement terminé !")
+        if termine:
+            st.sidebar.success("✅ Traitement terminé !")
+        else:
+            st.sidebar.info(f"⏳ Résultats partiels : {nb_total} avis prêts")
 
         # =========================================================
         # 🎛️ FILTRES INTERACTIFS (SEMAINE 9)
@@ -121,22 +330,17 @@ if uploaded_file is not None:
         st.sidebar.divider()
         st.sidebar.header("🎛️ Filtres")
         
-        # Filtres
-        date_range = st.sidebar.date_input("Période", [df['Date'].min(), df['Date'].max()])
-        selected_topics = st.sidebar.multiselect("Thèmes", df['Sujet_Dominant'].unique(), default=df['Sujet_Dominant'].unique())
-        selected_sentiments = st.sidebar.multiselect("Sentiments", df['Sentiment'].unique(), default=df['Sentiment'].unique())
-
-        # Application du filtre sur le DataFrame
-        mask = (
-            (df['Date'] >= date_range[0]) & 
-            (df['Date'] <= date_range[1]) & 
-            (df['Sujet_Dominant'].isin(selected_topics)) & 
-            (df['Sentiment'].isin(selected_sentiments))
-        )
+        # Filtres (les métadonnées Parquet stockent les dates en texte)
+        date_min, date_max = (date.fromisoformat(str(infos[cle])) for cle in ("date_min", "date_max"))
+        date_range = st.sidebar.date_input("Période", [date_min, date_max])
+        selected_topics = st.sidebar.multiselect("Thèmes", infos["topics"], default=infos["topics"])
+        selected_sentiments = st.sidebar.multiselect("Sentiments", infos["sentiments"], default=infos["sentiments"])
+
         # On crée df_filtered : C'est LUI qu'on va afficher dans les onglets
-        df_filtered = df[mask]
+        # (lecture des seules lignes filtrées dans le fichier Parquet)
+        df_filtered = charger_selection(donnees, date_range[0], date_range[-1], selected_topics, selected_sentiments)
         
-        st.info(f"🔍 Filtres actifs : {len(df_filtered)} avis affichés sur {len(df)}.")
+        st.info(f"🔍 Filtres actifs : {len(df_filtered)} avis affichés sur {nb_total}.")
 
         # =========================================================
         # AFFICHAGE PAR ONGLETS (STRUCTURE SHOWCASE)
@@ -191,18 +395,25 @@ if uploaded_file is not None:
         # --- ONGLET 5 : BUSINESS INTELLIGENCE (KPIs Dynamiques) ---
         with tab5:
             st.header("Semaine 7 : Dashboard Décisionnel")
-            
-            if not df_filtered.empty:
+            perimetre = st.radio("Périmètre", ["Fichier chargé", "Historique archivé (BDD)"], horizontal=True)
+
+            if perimetre == "Historique archivé (BDD)":
+                afficher_kpis_historique()
+            elif not df_filtered.empty:
                 # KPIs recalculés sur df_filtered
                 avg = df_filtered['Note_Business'].mean()
                 c1, c2, c3 = st.columns(3)
                 c1.metric("Note Moyenne (Filtrée)", f"{avg:.2f} / 5⭐")
                 c2.metric("Avis Sélectionnés", len(df_filtered))
+                if 'Groupe_ID' in df_filtered:
+                    # Un avis par groupe de doublons présent dans la sélection (même si les filtres coupent le groupe)
+                    c3.metric("Avis Uniques", df_filtered['Groupe_ID'].nunique(),
+                              help="Avis sélectionnés, doublons et quasi-doublons regroupés")
                 
                 # Graphiques
                 c_graph1, c_graph2 = st.columns(2)
                 with c_graph1:
-                    df_grp = df_filtered.groupby('Sujet_Dominant')['Note_Business'].mean().reset_index()
+                    df_grp = df_filtered.groupby('Sujet_Dominant', observed=True)['Note_Business'].mean().reset_index()
                     fig = px.bar(df_grp, x='Sujet_Dominant', y='Note_Business', color='Note_Business', title="Qualité par Sujet", range_y=[0,5], color_continuous_scale='RdYlGn')
                     st.plotly_chart(fig, use_container_width=True)
                 
@@ -230,6 +441,9 @@ if uploaded_file is not None:
                     nb = save_to_db(df_filtered, col_texte)
                     if nb > 0: st.success(f"{nb} avis archivés.")
             with col_admin2:
+                # Parquet : types conservés, fichier bien plus petit et rapide à produire qu'un CSV
+                st.download_button("📥 Exporter la sélection (Parquet)", df_filtered.to_parquet(index=False),
+                                   "export_filtre.parquet", "application/octet-stream")
                 csv_data = df_filtered.to_csv(index=False).encode('utf-8')
                 st.download_button("📥 Exporter la sélection (CSV)", csv_data, "export_filtre.csv", "text/csv")
             
@@ -237,24 +451,168 @@ if uploaded_file is not None:
             st.divider()
             st.subheader("🤖 Audit de Performance IA")
             st.caption("Test du modèle sur un jeu de données de contrôle (Gold Standard).")
-            
+            col_audit1, col_audit2 = st.columns(2)
+            with col_audit1:
+                fichier_gold = st.file_uploader("Jeu de test (CSV ou Parquet : texte + label)", type=["csv", "parquet"],
+                                                help="Sans fichier : jeu de contrôle intégré (8 phrases)")
+            with col_audit2:
+                moteurs = ["pytorch", "int8", "onnx"]
+                moteur_audit = st.selectbox("Moteur d'inférence", moteurs, index=moteurs.index(SENTIMENT_BACKEND))
+                sans_cache = st.checkbox("Recalculer toutes les prédictions", help="Pour mesurer la vitesse du modèle")
+
             if st.button("Lancer l'évaluation du modèle"):
                 # On importe la fonction qu'on vient de créer
-                from src.evaluation import get_metrics
-                
-                with st.spinner("Audit en cours..."):
-                    acc, f1, nb_test = get_metrics()
-                
-                # Affichage joli des scores
-                kpi1, kpi2, kpi3 = st.columns(3)
-                kpi1.metric("Précision (Accuracy)", f"{acc*100:.1f}%")
-                kpi2.metric("F1-Score", f"{f1:.2f}")
-                kpi3.metric("Echantillon Test", f"{nb_test} phrases")
-                
-                if acc > 0.7:
-                    st.success("✅ Le modèle est performant ( > 70% ).")
-                else:
-                    st.error("⚠️ Le modèle manque de précision.")
+                from src.evaluation import evaluate
+
+                try:
+                    with st.spinner("Audit en cours..."):
+                        audit = evaluate(fichier_gold, backend=moteur_audit, use_cache=not sans_cache)
+                except (RuntimeError, ValueError) as e:
+                    st.error(f"Erreur : {e}")
+                    audit = None
+
+                if audit is not None and audit["avis"] > 0:
+                    # Affichage joli des scores (avec intervalle de confiance à 95 %)
+                    acc, f1 = audit["accuracy"], audit["f1"]
+                    kpi1, kpi2, kpi3, kpi4 = st.columns(4)
+                    kpi1.metric("Précision (Accuracy)", f"{acc*100:.1f}%",
+                                help=f"IC 95 % : {audit['accuracy_ic'][0]*100:.1f} - {audit['accuracy_ic'][1]*100:.1f} %")
+                    kpi2.metric("F1-Score", f"{f1:.2f}", help=f"IC 95 % : {audit['f1_ic'][0]:.2f} - {audit['f1_ic'][1]:.2f}")
+                    kpi3.metric("Echantillon Test", f"{audit['avis']} phrases",
+                                delta=f"{audit['erreurs']} en erreur" if audit["erreurs"] else None, delta_color="inverse",
+                                help=f"{audit['en_cache']} prédictions déjà en cache, {audit['ignores']} lignes ignorées, "
+                                     f"{audit['erreurs']} avis en erreur (comptés comme faux)")
+                    if audit["avis_par_seconde"]:
+                        kpi4.metric("Vitesse", f"{audit['avis_par_seconde']:.0f} avis/s",
+                                    help=f"Latence par lot de {audit['batch_size']} : p50 {audit['latence_lot_p50_ms']:.0f} ms, "
+                                         f"p95 {audit['latence_lot_p95_ms']:.0f} ms, p99 {audit['latence_lot_p99_ms']:.0f} ms")
+                    else:
+                        kpi4.metric("Vitesse", "cache", help="Toutes les prédictions venaient du cache")
+
+                    if acc > 0.7:
+                        st.success("✅ Le modèle est performant ( > 70% ).")
+                    else:
+                        st.error("⚠️ Le modèle manque de précision.")
+                    if audit["erreurs"]:
+                        st.warning(f"⚠️ {audit['erreurs']} avis n'ont pas pu être classés par le modèle : "
+                                   "ils comptent comme des erreurs dans l'accuracy et le F1.")
+
+                    col_conf, col_classes = st.columns(2)
+                    with col_conf:
+                        fig_conf = px.imshow(audit["matrice_confusion"], x=audit["labels_predits"], y=audit["labels"], text_auto=True,
+                                             labels={"x": "Prédiction", "y": "Vérité"}, title="Matrice de confusion")
+                        st.plotly_chart(fig_conf, use_container_width=True)
+                    with col_classes:
+                        st.dataframe(audit["par_classe"], use_container_width=True)
+
+                    # Historique de la session : comparer modèles / moteurs sur la qualité ET la vitesse
+                    st.session_state.setdefault("audits", []).append({
+                        "Moteur": audit["moteur"], "Avis": audit["avis"], "Erreurs": audit["erreurs"],
+                        "Accuracy": acc, "F1": f1,
+                        "Avis/s": audit["avis_par_seconde"], "Latence lot p95 (ms)": audit["latence_lot_p95_ms"],
+                    })
+                elif audit is not None:
+                    st.warning("Aucune ligne exploitable dans le jeu de test.")
+
+            if st.session_state.get("audits"):
+                st.caption("Audits de la session :")
+                st.dataframe(pd.DataFrame(st.session_state.audits), use_container_width=True)
+
+            # --- 3. Cascade de sentiment (classifieur rapide, puis transformer si besoin) ---
+            st.divider()
+            st.subheader("⚡ Cascade de Sentiment")
+            st.caption("Un classifieur linéaire, entraîné sur les sentiments du transformer archivés en BDD, "
+                       "décide des avis évidents : seuls les avis incertains passent dans le transformer.")
+            etat_cascade = (f"activée (seuil {CASCADE_THRESHOLD})" if SENTIMENT_CASCADE
+                            else "désactivée (AVIS_SENTIMENT_CASCADE=1 pour l'activer)")
+            col_cascade1, col_cascade2 = st.columns(2)
+            with col_cascade1:
+                if st.button("🧠 Entraîner le classifieur rapide"):
+                    try:
+                        with st.spinner("Entraînement..."):
+                            rapport_cascade = train_cascade()
+                        st.success(f"Classifieur entraîné sur {rapport_cascade['avis_entrainement']} avis.")
+                    except ValueError as e:
+                        st.error(f"Erreur : {e}")
+            with col_cascade2:
+                seuil_cascade = st.slider("Seuil de confiance à tester", 0.5, 0.99, CASCADE_THRESHOLD)
+                mesurer_cascade = st.button(f"📏 Comparer au transformer seul ({TAILLE_COMPARAISON_CASCADE} avis max)")
+
+            cascade = registry.get("cascade")
+            if cascade is None:
+                st.info(f"Cascade {etat_cascade}. Aucun classifieur entraîné.")
+            else:
+                st.caption(f"Cascade {etat_cascade}. Classifieur du {cascade.revision}, {cascade.n_train} avis "
+                           f"d'entraînement. Accord avec le transformer sur {cascade.rapport['avis_test']} avis de test :")
+                st.dataframe(pd.DataFrame(cascade.rapport["balayage"]), use_container_width=True)
+            if 'Etape_Sentiment' in df_filtered and not df_filtered.empty:
+                part_rapide = (df_filtered['Etape_Sentiment'] == ETAPE_LINEAIRE).mean()
+                st.caption(f"Sélection actuelle : {part_rapide:.0%} des avis décidés par le classifieur rapide.")
+
+            if mesurer_cascade:
+                echantillon = df_filtered[col_texte].sample(n=min(TAILLE_COMPARAISON_CASCADE, len(df_filtered)), random_state=0)
+                try:
+                    with st.spinner("Comparaison en cours..."):
+                        comparaison = compare_cascade(echantillon.tolist(), threshold=seuil_cascade)
+                    cmp1, cmp2, cmp3 = st.columns(3)
+                    cmp1.metric("Avis escaladés", f"{comparaison['taux_escalade']:.0%}")
+                    cmp2.metric("Accord avec le transformer", f"{comparaison['accord']:.1%}")
+                    cmp3.metric("Accélération", f"x{comparaison['acceleration']:.1f}",
+                                help=f"{comparaison['avis_par_seconde_cascade']:.0f} avis/s contre "
+                                     f"{comparaison['avis_par_seconde_transformer']:.0f} avis/s")
+                    st.dataframe(pd.DataFrame(comparaison["balayage"]), use_container_width=True)
+                except (RuntimeError, ValueError) as e:
+                    st.error(f"Erreur : {e}")
+
+            # --- 4. Traitements en arrière-plan ---
+            st.divider()
+            st.subheader("📋 Traitements en Arrière-plan")
+            jobs = list_jobs()
+            if jobs:
+                st.dataframe(pd.DataFrame([{
+                    "Job": j.id, "Fichier": j.filename, "Statut": j.status,
+                    "Avis traités": j.rows_done, "Créé le": j.created_at, "Erreur": j.error,
+                } for j in jobs]), use_container_width=True)
+            else:
+                st.caption("Aucun traitement lancé.")
+
+            # --- 5. État des modèles (chargement paresseux) ---
+            st.divider()
+            st.subheader("⚙️ État des Modèles")
+            st.dataframe(pd.DataFrame(registry.status()).T, use_container_width=True)
+
+            # --- 6. Performance (mesures par étape, depuis le démarrage du serveur) ---
+            st.divider()
+            st.subheader("⏱️ Performance")
+            st.caption("Temps, volume, cache et mémoire de chaque étape. Les étapes 'pipeline.*' incluent les autres.")
+            col_perf1, col_perf2, col_perf3 = st.columns(3)
+            with col_perf1:
+                st.toggle("Profil cProfile", value=metrics.profile, key="perf_profile",
+                          help="Pour les prochains traitements de cette session seulement")
+            with col_perf2:
+                st.toggle("Pic mémoire (tracemalloc)", value=metrics.trace_memory, key="perf_trace_memory",
+                          help="Précis mais ralentit nettement les traitements (de cette session seulement)")
+            with col_perf3:
+                if st.button("🔄 Remettre à zéro"):
+                    metrics.reset()
+
+            stats_perf = metrics.snapshot()
+            if stats_perf:
+                df_perf = pd.DataFrame(stats_perf).T.sort_values("secondes", ascending=False)
+                st.dataframe(df_perf, use_container_width=True)
+                fig_perf = px.bar(df_perf.reset_index(), x="index", y="secondes", title="Temps cumulé par étape (s)",
+                                  labels={"index": "Étape"})
+                st.plotly_chart(fig_perf, use_container_width=True)
+            else:
+                st.caption("Aucune mesure pour l'instant.")
+
+            cache_langue = detect_language_cache_info()
+            st.caption(f"Cache de détection de langue : {cache_langue.hits} hits, {cache_langue.misses} misses, "
+                       f"{cache_langue.currsize} / {cache_langue.maxsize} textes")
+            for etape, profil in metrics.profils.items():
+                with st.expander(f"Profil : {etape}"):
+                    st.code(profil)
+            st.download_button("📥 Exporter (format Prometheus)", metrics.to_prometheus(), "metrics.prom", "text/plain")
 
         else:
             st.caption("🔒 Connectez-vous en tant qu'Administrateur pour accéder aux outils techniques.")
@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+
+from src.models import registry
+from src.instrumentation import metrics
+from src.serving import MicroBatcher, QueueFullError, score_texts, is_ready, MODELES_SERVICE
+
+# Service HTTP de scoring en temps réel (sentiment + sujet de chaque avis) :
+#   python -m src.api --port 8000
+#   curl -X POST localhost:8000/score -H "Content-Type: application/json" -d '{"text": "Super produit !"}'
+# Un seul processus : toutes les requêtes partagent le même micro-batcher (voir src/serving.py),
+# c'est ce qui permet de regrouper les avis de requêtes concurrentes.
+
+TAILLE_MAX_TEXTE = 10000   # Caractères par avis (le modèle n'en lit de toute façon que 512)
+TAILLE_MAX_BULK = 1000     # Avis par requête /score/bulk
+
+# 1. Schémas
+class AvisEntree(BaseModel):
+    text: str = Field(max_length=TAILLE_MAX_TEXTE)
+
+class LotEntree(BaseModel):
+    texts: list[str] = Field(min_length=1, max_length=TAILLE_MAX_BULK)
+
+class Score(BaseModel):
+    langue: str
+    avis_nettoye: str
+    sentiment: str
+    score: float
+    note: int
+    etape: str | None = None
+    sujet: str | None = None
+
+# 2. Application
+batcher = MicroBatcher(score_texts)
+
+@asynccontextmanager
+async def lifespan(app):
+    batcher.start()
+    # Les modèles se chargent en arrière-plan : /ready répond 503 tant qu'ils ne sont pas prêts.
+    # Toujours, quel que soit AVIS_WARMUP (réglage du dashboard) : sans préchargement, /ready ne passerait
+    # jamais à 200 et aucun trafic ne serait envoyé au service pour déclencher le chargement.
+    registry.warm_up(MODELES_SERVICE, background=True)
+    yield
+    batcher.stop(timeout=30)
+
+app = FastAPI(title="Analyse d'avis clients - scoring", lifespan=lifespan)
+
+async def _attendre(futures):
+    try:
+        return await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+    except asyncio.CancelledError:
+        # Client déconnecté : les avis encore en file ne seront pas calculés
+        for f in futures:
+            f.cancel()
+        raise
+
+def _soumettre(texts):
+    try:
+        return batcher.submit_many(texts)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.post("/score", response_model=Score)
+async def score(avis: AvisEntree):
+    """Sentiment et sujet d'un avis"""
+    (resultat,) = await _attendre(_soumettre([avis.text]))
+    return resultat
+
+@app.post("/score/bulk", response_model=list[Score])
+async def score_bulk(lot: LotEntree):
+    """Sentiment et sujet de plusieurs avis (dans l'ordre reçu)"""
+    if any(len(t) > TAILLE_MAX_TEXTE for t in lot.texts):
+        raise HTTPException(status_code=422, detail=f"Avis de plus de {TAILLE_MAX_TEXTE} caractères")
+    return await _attendre(_soumettre(lot.texts))
+
+@app.get("/health")
+def health():
+    """Le processus répond (liveness) + état du préchargement des modèles et du micro-batcher"""
+    return {"status": "ok", "pret": is_ready(), "modeles": registry.status(), "batcher": batcher.stats()}
+
+@app.get("/ready")
+def ready():
+    """Readiness : 200 quand les modèles indispensables sont chargés, 503 sinon"""
+    pret = is_ready() and batcher.running
+    return JSONResponse({"pret": pret, "modeles": registry.status()}, status_code=200 if pret else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus():
+    return metrics.to_prometheus()
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Service HTTP de scoring des avis clients")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+    uvicorn.run(app, host=args.host, port=args.port, workers=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import argparse
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src import models
+from src.cache import process_with_cache
+from src.database import init_db, save_reviews
+from src.dedup import find_duplicate_groups, fan_out
+from src.pipeline import (find_text_column, assign_topics, apply_results, chunk_to_rows, finalize_topics,
+                          iter_parquet_chunks, spool_file, ParquetSink, ReservoirSample, TAILLE_ECHANTILLON_TOPICS)
+from src.preprocessing import detect_languages, clean_texts
+from src.cascade import analyze_sentiment_cascade
+from src.topic_modeling import TOPIC_ENGINES, TOPIC_ENGINE, TOPIC_MODEL_PATH
+
+# Traitement "batch" sans navigateur, sur plusieurs cœurs :
+#   python -m src.batch avis.csv --workers 8 --output resultats.parquet --db
+# Le fichier est découpé en morceaux (shards) envoyés à un pool de processus.
+# Chaque processus charge ses modèles une seule fois puis traite ses morceaux de bout en bout.
+
+TAILLE_SHARD = 2000
+
+# 1. Côté processus "worker"
+def _init_worker(num_threads):
+    """Exécuté une fois au démarrage de chaque processus : réglage des threads + chargement des modèles"""
+    if num_threads:
+        models.NUM_THREADS = num_threads
+        try:
+            import torch
+            torch.set_num_threads(num_threads)
+        except ImportError:
+            pass
+    models.registry.warm_up(background=False)
+
+def _traiter_shard(textes, batch_size, use_cache):
+    """
+    Langue -> nettoyage -> sentiment sur un morceau.
+    Retourne : (DataFrame des colonnes enrichies, temps de chaque étape en secondes)
+    """
+    temps = {}
+    if use_cache:
+        debut = time.perf_counter()
+        resultats = process_with_cache(textes, batch_size=batch_size)
+        temps["nlp_sentiment_cache"] = time.perf_counter() - debut
+        return resultats, temps
+
+    # Un seul avis par groupe de doublons passe dans les modèles (résultats recopiés ensuite)
+    debut = time.perf_counter()
+    representants = find_duplicate_groups(textes)
+    textes = [textes[i] for i in np.unique(representants)]
+    temps["doublons"] = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    langues = detect_languages(textes)
+    temps["langue"] = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    nettoyes = clean_texts(textes, langues=langues)
+    temps["nettoyage"] = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    sentiments = analyze_sentiment_cascade(textes, batch_size=batch_size)
+    temps["sentiment"] = time.perf_counter() - debut
+
+    resultats = pd.DataFrame({
+        'Langue': langues,
+        'Avis_Nettoye': nettoyes,
+        'Sentiment': [label for label, _, _, _ in sentiments],
+        'Score_IA': [score for _, score, _, _ in sentiments],
+        'Etape_Sentiment': [etape for _, _, _, etape in sentiments],
+    })
+    return fan_out(resultats, representants), temps
+
+# 2. Côté processus principal
+class _CsvSink:
+    """Écrit les morceaux les uns après les autres dans un même CSV"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entete = True
+
+    def write(self, chunk):
+        chunk.to_csv(self.path, mode="w" if self.entete else "a", header=self.entete, index=False)
+        self.entete = False
+
+    def close(self):
+        pass
+
+def run_batch(input_path, output_path=None, save_db=False, workers=None, shard_size=TAILLE_SHARD,
+              batch_size=32, n_topics=2, topic_model_path=TOPIC_MODEL_PATH, use_cache=False, progress=None,
+              topic_engine=TOPIC_ENGINE):
+    """
+    Pipeline complet sur plusieurs processus.
+    Les résultats sont fusionnés dans l'ordre du fichier d'entrée dans un fichier Parquet intermédiaire.
+    Le modèle de sujets est ensuite mis à jour (topic_engine='online', modèle sauvegardé) ou entraîné
+    ('lda' / 'nmf') sur un échantillon de tout le fichier, puis un dernier passage attribue les sujets
+    et écrit les résultats (Parquet ou CSV selon l'extension de output_path, et/ou BDD).
+    Retourne : un dictionnaire de statistiques (dont le temps cumulé de chaque étape)
+    """
+    workers = workers or os.cpu_count() or 1
+    # On répartit les cœurs entre les processus pour éviter qu'ils se marchent dessus
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    if save_db:
+        init_db()
+
+    echantillon = ReservoirSample(TAILLE_ECHANTILLON_TOPICS)
+    temps = {"lecture": 0.0, "topics": 0.0, "ecriture": 0.0}
+    debut = time.perf_counter()
+    nb_shards = 0
+    text_column = None
+
+    with spool_file() as intermediaire:
+        spool = ParquetSink(intermediaire)
+        # "spawn" : chaque processus démarre proprement (pas de threads PyTorch hérités d'un fork)
+        contexte = mp.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexte,
+                                 initializer=_init_worker, initargs=(num_threads,)) as pool:
+            # Au plus 2 morceaux en attente par processus : la mémoire reste bornée
+            en_cours = deque()
+            lecteur = pd.read_csv(input_path, chunksize=shard_size)
+
+            def _terminer_plus_ancien():
+                nonlocal nb_shards
+                chunk, future = en_cours.popleft()
+                resultats, temps_shard = future.result()
+                for etape, secondes in temps_shard.items():
+                    temps[etape] = temps.get(etape, 0.0) + secondes
+                chunk = apply_results(chunk, resultats)
+                echantillon.add(chunk['Avis_Nettoye'])
+
+                t = time.perf_counter()
+                spool.write(chunk)
+                temps["ecriture"] += time.perf_counter() - t
+
+                nb_shards += 1
+                if progress is not None:
+                    progress({"lignes": echantillon.vus, "shards": nb_shards,
+                              "secondes": time.perf_counter() - debut})
+
+            try:
+                while True:
+                    t = time.perf_counter()
+                    chunk = next(lecteur, None)
+                    temps["lecture"] += time.perf_counter() - t
+                    if chunk is None:
+                        break
+                    if text_column is None:
+                        text_column = find_text_column(chunk.columns)
+                        if text_column is None:
+                            raise ValueError("Colonne texte introuvable.")
+                    future = pool.submit(_traiter_shard, chunk[text_column].tolist(), batch_size, use_cache)
+                    en_cours.append((chunk, future))
+                    if len(en_cours) >= 2 * workers:
+                        _terminer_plus_ancien()
+                while en_cours:
+                    _terminer_plus_ancien()
+            finally:
+                spool.close()
+
+        t = time.perf_counter()
+        topic_model, topics_keywords = finalize_topics(echantillon.items, n_topics, topic_model_path,
+                                                       engine=topic_engine)
+        temps["topics"] += time.perf_counter() - t
+
+        # Dernier passage : sujets du modèle final, puis écriture
+        sink = None
+        if output_path:
+            sink = ParquetSink(output_path) if output_path.endswith(".parquet") else _CsvSink(output_path)
+        try:
+            for chunk in iter_parquet_chunks(intermediaire, shard_size):
+                t = time.perf_counter()
+                chunk = assign_topics(chunk, topic_model)
+                temps["topics"] += time.perf_counter() - t
+
+                t = time.perf_counter()
+                if sink is not None:
+                    sink.write(chunk)
+                if save_db:
+                    save_reviews(chunk_to_rows(chunk, text_column))
+                temps["ecriture"] += time.perf_counter() - t
+        finally:
+            if sink is not None:
+                sink.close()
+
+    secondes = time.perf_counter() - debut
+    return {
+        "lignes": echantillon.vus,
+        "shards": nb_shards,
+        "workers": workers,
+        "secondes": secondes,
+        "lignes_par_seconde": echantillon.vus / max(secondes, 1e-9),
+        # Temps cumulés sur tous les processus (les étapes NLP tournent en parallèle)
+        "temps_etapes": temps,
+        "topics_keywords": topics_keywords,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse d'avis clients en ligne de commande (multi-cœurs)")
+    parser.add_argument("input", help="Fichier CSV d'entrée")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus (défaut : nombre de cœurs)")
+    parser.add_argument("--output", default=None, help="Fichier de sortie (.parquet ou .csv)")
+    parser.add_argument("--db", action="store_true", help="Enregistre les avis dans la base SQLite")
+    parser.add_argument("--shard-size", type=int, default=TAILLE_SHARD, help="Lignes par morceau")
+    parser.add_argument("--batch-size", type=int, default=32, help="Taille des lots du modèle de sentiment")
+    parser.add_argument("--topics", type=int, default=2, help="Nombre de sujets")
+    parser.add_argument("--cache", action="store_true", help="Utilise le cache de résultats en BDD")
+    parser.add_argument("--topic-engine", choices=["online", *TOPIC_ENGINES], default=TOPIC_ENGINE,
+                        help="Moteur de sujets : LDA online sauvegardé, ou lda / nmf entraîné sur un échantillon du fichier "
+                             "(défaut : AVIS_TOPIC_ENGINE ou online)")
+    args = parser.parse_args(argv)
+
+    if not args.output and not args.db:
+        parser.error("Indiquer au moins --output ou --db")
+
+    stats = run_batch(
+        args.input, output_path=args.output, save_db=args.db, workers=args.workers,
+        shard_size=args.shard_size, batch_size=args.batch_size, n_topics=args.topics, use_cache=args.cache,
+        topic_engine=args.topic_engine,
+        progress=lambda s: print(f"⏳ {s['lignes']} avis traités ({s['secondes']:.1f} s)"),
+    )
+
+    print(f"✅ {stats['lignes']} avis traités en {stats['secondes']:.1f} s "
+          f"({stats['lignes_par_seconde']:.0f} avis/s, {stats['workers']} processus)")
+    for etape, secondes in stats["temps_etapes"].items():
+        print(f"   - {etape} : {secondes:.2f} s")
+    for sujet, mots in stats["topics_keywords"].items():
+        print(f"   {sujet} : {mots}")
+
+if __name__ == "__main__":
+    main()
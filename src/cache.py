@@ -0,0 +1,197 @@
+import hashlib
+from datetime import datetime, timedelta
+from importlib import metadata
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.sqlite import insert
+
+from src.database import engine, ResultCache
+from src.preprocessing import detect_languages, clean_texts, _normaliser
+from src.models import SPACY_FR, SPACY_EN
+from src.instrumentation import metrics
+from src.dedup import find_duplicate_groups, fan_out, NEAR_DUPLICATES, SEUIL_SIMILARITE
+from src.sentiment import model_name, backend_name
+from src.cascade import analyze_sentiment_cascade, cascade_version
+
+# 1. Paramètres du cache
+# Nombre maximum de lignes gardées dans la table (les moins utilisées sont supprimées au-delà)
+TAILLE_MAX_CACHE = 500000
+# SQLite limite le nombre de paramètres par requête : on découpe les gros IN (...)
+TAILLE_LOT_SQL = 5000
+# À incrémenter si on change la logique de nettoyage ou de mapping des sentiments
+PIPELINE_VERSION = "2"
+# last_used n'est réécrit que s'il date de plus que ce délai : une lecture n'écrit presque jamais en base
+DELAI_MAJ_LAST_USED = timedelta(hours=1)
+
+def pipeline_version():
+    """
+    Version du pipeline : change dès que le modèle de sentiment, son moteur d'inférence,
+    la cascade (classifieur rapide, seuil) ou un modèle spaCy change.
+    Tous les résultats calculés avec une autre version sont donc ignorés (invalidation automatique) ;
+    ils ne sont pas supprimés (un autre processus peut utiliser une autre version, ex: le service HTTP
+    sur un autre moteur) et finissent évincés par evict_cache s'ils ne servent plus.
+    """
+    # On lit la version des packages sans charger spaCy (import lent)
+    versions_spacy = []
+    for nom in (SPACY_FR, SPACY_EN):
+        try:
+            versions_spacy.append(f"{nom}={metadata.version(nom)}")
+        except Exception:
+            versions_spacy.append(f"{nom}=absent")
+    cascade = cascade_version()
+    return "|".join([PIPELINE_VERSION, model_name, backend_name] + ([cascade] if cascade else []) + versions_spacy)
+
+def hash_texte(text, version):
+    """Hash SHA-256 du texte normalisé + version du pipeline (None si ce n'est pas du texte)"""
+    if not isinstance(text, str):
+        return None
+    return hashlib.sha256(f"{version}\x00{_normaliser(text)}".encode("utf-8")).hexdigest()
+
+# 2. Lecture / écriture
+def get_cached_results(hashes):
+    """
+    Récupère les résultats déjà connus pour une liste de hash.
+    Retourne : un dictionnaire {hash: (langue, texte_nettoye, sentiment, score, etape)}
+    """
+    hashes = list({h for h in hashes if h is not None})
+    trouves = {}
+    maintenant = datetime.utcnow()
+    a_rafraichir = []
+    with engine.connect() as conn:
+        for debut in range(0, len(hashes), TAILLE_LOT_SQL):
+            lot = hashes[debut:debut + TAILLE_LOT_SQL]
+            lignes = conn.execute(
+                select(ResultCache.text_hash, ResultCache.langue, ResultCache.texte_nettoye,
+                       ResultCache.sentiment, ResultCache.score, ResultCache.etape, ResultCache.last_used)
+                .where(ResultCache.text_hash.in_(lot))
+            )
+            for h, langue, nettoye, sentiment, score, etape, last_used in lignes:
+                # Étape telle qu'enregistrée (None : avis vide ou non textuel, aucun modèle appelé)
+                trouves[h] = (langue, nettoye, sentiment, score, etape)
+                if last_used is None or maintenant - last_used > DELAI_MAJ_LAST_USED:
+                    a_rafraichir.append(h)
+
+    # On note l'utilisation pour que ces lignes ne soient pas évincées (seulement si la date est ancienne :
+    # la plupart des lectures ne prennent pas le verrou d'écriture de SQLite)
+    if a_rafraichir:
+        with engine.begin() as conn:
+            for debut in range(0, len(a_rafraichir), TAILLE_LOT_SQL):
+                conn.execute(update(ResultCache)
+                             .where(ResultCache.text_hash.in_(a_rafraichir[debut:debut + TAILLE_LOT_SQL]))
+                             .values(last_used=maintenant))
+    return trouves
+
+def store_results(lignes, version):
+    """
+    Enregistre des résultats dans le cache.
+    lignes : liste de (hash, langue, texte_nettoye, sentiment, score, etape)
+    """
+    maintenant = datetime.utcnow()
+    valeurs = [
+        {"text_hash": h, "version": version, "langue": langue, "texte_nettoye": nettoye,
+         "sentiment": sentiment, "score": score, "etape": etape, "last_used": maintenant}
+        for h, langue, nettoye, sentiment, score, etape in lignes
+    ]
+    if not valeurs:
+        return
+    requete = insert(ResultCache)
+    requete = requete.on_conflict_do_update(
+        index_elements=[ResultCache.text_hash],
+        set_={"langue": requete.excluded.langue, "texte_nettoye": requete.excluded.texte_nettoye,
+              "sentiment": requete.excluded.sentiment, "score": requete.excluded.score,
+              "etape": requete.excluded.etape, "last_used": requete.excluded.last_used},
+    )
+    with engine.begin() as conn:
+        # 8 colonnes par ligne : on reste sous la limite de paramètres de SQLite
+        for debut in range(0, len(valeurs), TAILLE_LOT_SQL // 8):
+            conn.execute(requete, valeurs[debut:debut + TAILLE_LOT_SQL // 8])
+
+def evict_cache(taille_max=TAILLE_MAX_CACHE):
+    """Supprime les lignes les moins récemment utilisées si le cache dépasse taille_max"""
+    with engine.begin() as conn:
+        total = conn.execute(select(func.count()).select_from(ResultCache)).scalar()
+        en_trop = total - taille_max
+        if en_trop > 0:
+            plus_anciens = select(ResultCache.text_hash).order_by(ResultCache.last_used).limit(en_trop)
+            conn.execute(delete(ResultCache).where(ResultCache.text_hash.in_(plus_anciens)))
+    return max(en_trop, 0)
+
+def purge_stale_cache(version):
+    """
+    Supprime les résultats produits par une autre version du pipeline.
+    Jamais appelé automatiquement : d'autres processus peuvent encore utiliser ces versions.
+    """
+    with engine.begin() as conn:
+        conn.execute(delete(ResultCache).where(ResultCache.version != version))
+
+# 3. Pipeline avec cache
+def process_with_cache(texts, n_process=1, batch_size=32, near_duplicates=NEAR_DUPLICATES, threshold=SEUIL_SIMILARITE):
+    """
+    Détection de langue + nettoyage + sentiment, en ne calculant que les textes absents du cache.
+    Les doublons (exacts, et quasi-doublons si near_duplicates) sont regroupés avant :
+    un seul avis par groupe est analysé (voir src/dedup.py).
+    Retourne : un DataFrame (même ordre que texts) avec les colonnes
+    'Langue', 'Avis_Nettoye', 'Sentiment', 'Score_IA', 'Etape_Sentiment', 'Taille_Groupe', 'Groupe_ID'
+    """
+    texts = list(texts)
+    with metrics.stage("dedup", items=len(texts)):
+        representants = find_duplicate_groups(texts, near=near_duplicates, threshold=threshold)
+        uniques = np.unique(representants)
+    resultats = _process_uniques([texts[i] for i in uniques], n_process=n_process, batch_size=batch_size)
+    return fan_out(resultats, representants)
+
+def _process_uniques(texts, n_process=1, batch_size=32):
+    """Cache + calcul des textes manquants (appelé par process_with_cache, après le regroupement des doublons)"""
+    version = pipeline_version()
+    hashes = [hash_texte(t, version) for t in texts]
+
+    # A. Lecture du cache (si la BDD pose problème, on calcule tout)
+    with metrics.stage("cache.lecture", items=len(texts)) as mesure:
+        try:
+            connus = get_cached_results(hashes)
+        except Exception as e:
+            print(f"Erreur cache (lecture) : {e}")
+            connus = {}
+        mesure.cache_hits = sum(h is not None and h in connus for h in hashes)
+        mesure.cache_misses = len(hashes) - mesure.cache_hits
+
+    # B. Calcul des textes manquants uniquement (un seul calcul par texte identique)
+    a_calculer = {}
+    for i, h in enumerate(hashes):
+        if h is None or h not in connus:
+            a_calculer.setdefault(h if h is not None else ("sans_hash", i), []).append(i)
+    representants = [indices[0] for indices in a_calculer.values()]
+    textes_manquants = [texts[i] for i in representants]
+
+    langues = detect_languages(textes_manquants)
+    nettoyes = clean_texts(textes_manquants, langues=langues, n_process=n_process)
+    # Cascade (si activée) : seuls les avis incertains passent dans le transformer
+    sentiments = analyze_sentiment_cascade(textes_manquants, batch_size=batch_size)
+
+    nouveaux = []
+    calcules = {}
+    for cle, langue, nettoye, (label, score, _, etape) in zip(a_calculer, langues, nettoyes, sentiments):
+        calcules[cle] = (langue, nettoye, label, score, etape)
+        # On ne garde en cache que les sentiments décidés par un modèle : pas les erreurs (elles peuvent
+        # être passagères) ni les résultats par défaut obtenus quand le transformer n'est pas chargé
+        if not isinstance(cle, tuple) and etape is not None:
+            nouveaux.append((cle, langue, nettoye, label, score, etape))
+
+    # C. Écriture des nouveaux résultats + éviction
+    with metrics.stage("cache.ecriture", items=len(nouveaux)):
+        try:
+            store_results(nouveaux, version)
+            evict_cache()
+        except Exception as e:
+            print(f"Erreur cache (écriture) : {e}")
+
+    # D. Résultats dans l'ordre d'origine
+    lignes = []
+    for i, h in enumerate(hashes):
+        if h is not None and h in connus:
+            lignes.append(connus[h])
+        else:
+            lignes.append(calcules[h if h is not None else ("sans_hash", i)])
+    return pd.DataFrame(lignes, columns=['Langue', 'Avis_Nettoye', 'Sentiment', 'Score_IA', 'Etape_Sentiment'])
@@ -0,0 +1,255 @@
+import os
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import LogisticRegression
+from sqlalchemy import select, or_
+
+from src.database import engine, Review
+from src.instrumentation import metrics
+from src.models import registry, SENTIMENT_CASCADE, CASCADE_THRESHOLD
+from src.sentiment import (analyze_sentiment_batch, get_sentiment_backend, model_name, backend_name,
+                           LABELS_SENTIMENT, COULEURS_SENTIMENT)
+
+# Cascade de sentiment : la plupart des avis sont clairement positifs ou négatifs,
+# inutile de les faire passer dans le transformer (12 couches).
+# 1. Un classifieur linéaire (sac de mots FR/EN haché + régression logistique), entraîné sur les
+#    sentiments que le transformer a déjà calculés (table 'reviews'), décide des avis dont il est sûr
+# 2. Les avis sous le seuil de confiance (AVIS_CASCADE_THRESHOLD) passent dans le transformer
+# Chaque résultat indique l'étape qui a décidé (colonne Etape_Sentiment).
+# Activation : AVIS_SENTIMENT_CASCADE=1 (voir src/models.py) ; sans classifieur entraîné, tout va au transformer.
+ETAPE_LINEAIRE = "lineaire"
+ETAPE_TRANSFORMER = "transformer"
+
+CASCADE_MODEL_PATH = os.path.join("models", "cascade.joblib")
+# À incrémenter si la structure de CascadeModel change (les anciens fichiers sont alors ignorés)
+CASCADE_MODEL_FORMAT = 1
+N_FEATURES = 2 ** 20
+TAILLE_MAX_ENTRAINEMENT = 200000   # Avis les plus récents utilisés pour l'entraînement
+MIN_AVIS_ENTRAINEMENT = 200
+PART_TEST = 0.2                    # Avis gardés de côté pour mesurer l'accord avec le transformer
+SEUILS_BALAYAGE = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98]
+
+_COULEURS = dict(zip(LABELS_SENTIMENT, COULEURS_SENTIMENT))
+_LABELS = set(LABELS_SENTIMENT.tolist())
+
+# 1. Classifieur rapide
+class CascadeModel:
+    """Sac de mots (et paires de mots) haché + régression logistique sur les 3 sentiments"""
+
+    def __init__(self, n_features=N_FEATURES):
+        self.vectorizer = HashingVectorizer(n_features=n_features, ngram_range=(1, 2), alternate_sign=False)
+        self.classifier = LogisticRegression(max_iter=1000)
+        self.revision = None    # Date de l'entraînement (entre dans la version du pipeline)
+        self.teacher = None     # Modèle + moteur dont on a appris les sentiments
+        self.n_train = 0
+        self.rapport = {}       # Accord avec le transformer sur les avis de test (voir train_cascade)
+
+    def fit(self, texts, labels):
+        self.classifier.fit(self.vectorizer.transform(texts), labels)
+        self.n_train = len(texts)
+        self.revision = datetime.now().isoformat(timespec="seconds")
+        return self
+
+    def predict(self, texts):
+        """Retourne : (labels, confiances) sous forme de tableaux numpy"""
+        probas = self.classifier.predict_proba(self.vectorizer.transform(texts))
+        return self.classifier.classes_[probas.argmax(axis=1)], probas.max(axis=1)
+
+    def save(self, path=CASCADE_MODEL_PATH):
+        """Sauvegarde atomique (fichier temporaire puis renommage)"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        joblib.dump({"format": CASCADE_MODEL_FORMAT, "model": self}, tmp)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=CASCADE_MODEL_PATH):
+        """Charge le classifieur sauvegardé, ou None s'il n'existe pas / n'est plus compatible"""
+        if not os.path.exists(path):
+            return None
+        try:
+            contenu = joblib.load(path)
+        except Exception as e:
+            print(f"⚠️ Classifieur de la cascade illisible ({path}) : {e}")
+            return None
+        if contenu.get("format") != CASCADE_MODEL_FORMAT:
+            print(f"⚠️ Classifieur de la cascade ignoré : format {contenu.get('format')} != {CASCADE_MODEL_FORMAT}")
+            return None
+        return contenu["model"]
+
+# 2. Entraînement sur les sorties du transformer
+def _avis_transformer(limit=TAILLE_MAX_ENTRAINEMENT):
+    """
+    Textes et sentiments des avis archivés décidés par le transformer (les plus récents d'abord).
+    Les avis décidés par le classifieur rapide sont exclus : il n'apprend pas de ses propres sorties.
+    """
+    requete = (select(Review.text_content, Review.sentiment)
+               .where(Review.sentiment.in_(LABELS_SENTIMENT.tolist()))
+               .where(or_(Review.sentiment_stage.is_(None), Review.sentiment_stage == ETAPE_TRANSFORMER))
+               .order_by(Review.id.desc()).limit(limit))
+    with engine.connect() as conn:
+        # Un même texte archivé pour plusieurs sources ne compte qu'une fois
+        avis = dict(conn.execute(requete).all())
+    return list(avis.keys()), np.array(list(avis.values()))
+
+def _balayage(labels_reference, labels_rapides, confiances, seuils=SEUILS_BALAYAGE):
+    """
+    Pour chaque seuil : part des avis envoyés au transformer et accord de la cascade avec le transformer
+    (un avis escaladé reçoit par définition le sentiment du transformer).
+    """
+    lignes = []
+    for seuil in seuils:
+        surs = confiances >= seuil
+        accord_rapide = labels_rapides[surs] == labels_reference[surs]
+        lignes.append({
+            "seuil": seuil,
+            "taux_escalade": float(1 - surs.mean()),
+            "accord": float((accord_rapide.sum() + (~surs).sum()) / len(surs)),
+            "accord_lineaire": float(accord_rapide.mean()) if surs.any() else None,
+        })
+    return lignes
+
+def train_cascade(limit=TAILLE_MAX_ENTRAINEMENT, test_size=PART_TEST, seed=42, path=CASCADE_MODEL_PATH):
+    """
+    Entraîne le classifieur rapide sur les avis archivés, mesure son accord avec le transformer
+    sur les avis de test, le sauvegarde et le met en service.
+    Retourne : le rapport (avis d'entraînement / de test, vitesse, balayage des seuils)
+    """
+    texts, labels = _avis_transformer(limit)
+    if len(texts) < MIN_AVIS_ENTRAINEMENT or len(set(labels)) < 2:
+        raise ValueError(f"Pas assez d'avis archivés pour entraîner la cascade ({len(texts)} avis, "
+                         f"{len(set(labels))} sentiments ; minimum {MIN_AVIS_ENTRAINEMENT} avis)")
+
+    ordre = np.random.default_rng(seed).permutation(len(texts))
+    n_test = max(int(len(texts) * test_size), 1)
+    test, train = ordre[:n_test], ordre[n_test:]
+
+    modele = CascadeModel()
+    with metrics.stage("cascade.train", items=len(train)):
+        modele.fit([texts[i] for i in train], labels[train])
+    modele.teacher = f"{model_name}|{backend_name}"
+
+    debut = time.perf_counter()
+    labels_rapides, confiances = modele.predict([texts[i] for i in test])
+    secondes = time.perf_counter() - debut
+    modele.rapport = {
+        "date": modele.revision,
+        "avis_entrainement": len(train),
+        "avis_test": n_test,
+        "avis_par_seconde_lineaire": n_test / max(secondes, 1e-9),
+        "balayage": _balayage(labels[test], labels_rapides, confiances),
+    }
+    modele.save(path)
+    registry.set("cascade", modele)
+    return modele.rapport
+
+def cascade_version(enabled=SENTIMENT_CASCADE, threshold=CASCADE_THRESHOLD):
+    """Partie de la version du pipeline qui dépend de la cascade ("" si elle est désactivée)"""
+    if not enabled:
+        return ""
+    modele = registry.get("cascade")
+    return f"cascade={modele.revision if modele is not None else 'absent'}@{threshold}"
+
+# 3. Analyse en cascade
+def _etape_transformer(label):
+    """
+    Étape d'un résultat de analyze_sentiment_batch : ETAPE_TRANSFORMER seulement si le transformer a vraiment
+    noté le texte (pas pour "Erreur" ni pour le résultat par défaut quand le modèle est indisponible)
+    """
+    return ETAPE_TRANSFORMER if label in _LABELS else None
+
+def analyze_sentiment_cascade(texts, batch_size=32, threshold=CASCADE_THRESHOLD, enabled=SENTIMENT_CASCADE,
+                              backend=None):
+    """
+    Même analyse que analyze_sentiment_batch, avec la cascade si elle est activée.
+    Retourne : une liste de (Label, Score, Couleur, Etape), dans l'ordre des textes reçus
+    Etape : ETAPE_LINEAIRE, ETAPE_TRANSFORMER, ou None (pas du texte, transformer indisponible ou en erreur :
+    aucun modèle n'a décidé)
+    """
+    texts = list(texts)
+    valides = [i for i, t in enumerate(texts) if t and isinstance(t, str)]
+    modele = registry.get("cascade") if enabled and valides else None
+    if modele is None:
+        resultats = analyze_sentiment_batch(texts, batch_size=batch_size, backend=backend)
+        return [(label, score, couleur, _etape_transformer(label)) for label, score, couleur in resultats]
+
+    resultats = [("Neutre", 0.0, "gray", None)] * len(texts)
+    with metrics.stage("sentiment.cascade_lineaire", items=len(valides)):
+        labels, confiances = modele.predict([texts[i] for i in valides])
+    escalades = []
+    for i, label, confiance in zip(valides, labels, confiances):
+        if confiance >= threshold:
+            resultats[i] = (str(label), float(confiance), _COULEURS[label], ETAPE_LINEAIRE)
+        else:
+            escalades.append(i)
+
+    if escalades:
+        for i, (label, score, couleur) in zip(escalades, analyze_sentiment_batch([texts[i] for i in escalades],
+                                                                               batch_size=batch_size, backend=backend)):
+            resultats[i] = (label, score, couleur, _etape_transformer(label))
+    return resultats
+
+# 4. Rapport : cascade contre transformer seul
+def compare_cascade(texts, threshold=CASCADE_THRESHOLD, batch_size=32, backend=None):
+    """
+    Passe les mêmes textes dans le transformer seul puis dans la cascade.
+    Retourne : un dictionnaire avec le taux d'escalade, l'accord avec le transformer, la vitesse de
+    chaque mode, et le balayage des seuils (accord / escalade / accélération estimée pour chaque seuil)
+    """
+    texts = [t for t in texts if t and isinstance(t, str)]
+    modele = registry.get("cascade")
+    if modele is None:
+        raise RuntimeError("Classifieur rapide non entraîné (voir train_cascade).")
+    if get_sentiment_backend(backend) is None:  # Chargement hors chronomètre
+        raise RuntimeError("Modèle de sentiment indisponible.")
+    if not texts:
+        raise ValueError("Aucun texte à comparer.")
+
+    debut = time.perf_counter()
+    complet = analyze_sentiment_batch(texts, batch_size=batch_size, backend=backend)
+    secondes_transformer = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    cascade = analyze_sentiment_cascade(texts, batch_size=batch_size, threshold=threshold, enabled=True,
+                                        backend=backend)
+    secondes_cascade = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    labels_rapides, confiances = modele.predict(texts)
+    secondes_lineaire = time.perf_counter() - debut
+
+    reference = np.array([label for label, _, _ in complet])
+    balayage = _balayage(reference, labels_rapides, confiances, sorted(set(SEUILS_BALAYAGE) | {threshold}))
+    for ligne in balayage:
+        # Temps estimé : classifieur sur tous les avis + transformer sur les avis escaladés
+        estime = secondes_lineaire + ligne["taux_escalade"] * secondes_transformer
+        ligne["acceleration_estimee"] = secondes_transformer / max(estime, 1e-9)
+
+    escalades = sum(etape == ETAPE_TRANSFORMER for _, _, _, etape in cascade)
+    return {
+        "textes": len(texts),
+        "seuil": threshold,
+        "taux_escalade": escalades / len(texts),
+        "accord": float(np.mean([label == ref for (label, _, _, _), ref in zip(cascade, reference)])),
+        "avis_par_seconde_transformer": len(texts) / max(secondes_transformer, 1e-9),
+        "avis_par_seconde_cascade": len(texts) / max(secondes_cascade, 1e-9),
+        "acceleration": secondes_transformer / max(secondes_cascade, 1e-9),
+        "balayage": balayage,
+    }
+
+# --- ENTRAÎNEMENT EN LIGNE DE COMMANDE ---
+if __name__ == "__main__":
+    from src.database import init_db
+
+    init_db()
+    rapport = train_cascade()
+    print(f"✅ Classifieur entraîné sur {rapport['avis_entrainement']} avis "
+          f"({rapport['avis_par_seconde_lineaire']:.0f} avis/s)")
+    print(f"Accord avec le transformer sur {rapport['avis_test']} avis de test :")
+    for ligne in rapport["balayage"]:
+        print(f"   seuil {ligne['seuil']:.2f}   escalade {ligne['taux_escalade'] * 100:5.1f} %   "
+              f"accord {ligne['accord'] * 100:5.1f} %")
@@ -1,14 +1,36 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, Float
+import hashlib
+import os
+from datetime import datetime
+from sqlalchemy import (create_engine, event, inspect, select, update, delete, bindparam, text, Column, Integer,
+                        String, Text, Float, DateTime, Date)
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from src.instrumentation import metrics
+
 # 1. Configuration de la BDD SQLite
 # Le fichier sera créé à la racine du projet sous le nom 'avis_clients.db'
-DATABASE_URL = "sqlite:///avis_clients.db"
+# (AVIS_DATABASE_URL permet d'utiliser une autre base, ex: pour les benchmarks)
+DATABASE_URL = os.environ.get("AVIS_DATABASE_URL", "sqlite:///avis_clients.db")
 
 # Création du moteur (le driver)
 engine = create_engine(DATABASE_URL, echo=False)
 
+# Réglages SQLite appliqués à chaque connexion :
+# - WAL : les lectures (dashboard) ne sont pas bloquées pendant une écriture
+# - synchronous=NORMAL : sûr en mode WAL, et beaucoup moins de fsync
+# - cache / tables temporaires en mémoire pour les gros imports
+@event.listens_for(engine, "connect")
+def _configurer_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")   # ~64 Mo
+    cursor.execute("PRAGMA busy_timeout=5000")   # On attend 5 s au lieu d'échouer si la base est verrouillée
+    cursor.close()
+
 # Création de la Session (pour faire des requêtes)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -20,18 +42,290 @@ class Review(Base):
     __tablename__ = "reviews"
 
     id = Column(Integer, primary_key=True, index=True)
-    source = Column(String)
+    source = Column(String, index=True)
     text_content = Column(Text)
-    topic = Column(String, nullable=True)
-    sentiment = Column(String, nullable=True) # Stockera "Positif 😃"
+    topic = Column(String, nullable=True, index=True)
+    sentiment = Column(String, nullable=True, index=True) # Stockera "Positif 😃"
     score = Column(Float, nullable=True)      # <--- CHANGE ICI (Integer -> Float)
+    text_hash = Column(String(64), nullable=True, unique=True, index=True)  # Évite les doublons (voir content_hash)
+    ingested_at = Column(DateTime, default=datetime.utcnow)                  # Date d'archivage
+    review_date = Column(Date, nullable=True, index=True)                    # Date de l'avis
+    sentiment_stage = Column(String, nullable=True)  # Modèle qui a décidé du sentiment (voir src/cascade.py)
+
+# 3. Table de cache des résultats NLP (voir src/cache.py)
+# Clé = hash du texte normalisé + version du pipeline (modèles spaCy / sentiment)
+class ResultCache(Base):
+    __tablename__ = "results_cache"
+
+    text_hash = Column(String(64), primary_key=True)
+    version = Column(String, index=True)      # Version du pipeline qui a produit le résultat
+    langue = Column(String)
+    texte_nettoye = Column(Text)
+    sentiment = Column(String)
+    score = Column(Float)
+    etape = Column(String, nullable=True)     # Modèle qui a décidé du sentiment (voir src/cascade.py)
+    last_used = Column(DateTime, default=datetime.utcnow, index=True)  # Pour l'éviction (LRU)
+
+# 4. Table des traitements en arrière-plan (voir src/jobs.py)
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    file_hash = Column(String(64), unique=True, index=True)   # Un même fichier re-uploadé retrouve son traitement
+    filename = Column(String)
+    status = Column(String, index=True)          # en_attente, en_cours, termine, erreur
+    text_column = Column(String, nullable=True)
+    rows_total = Column(Integer, nullable=True)  # Estimation (nombre de lignes du fichier)
+    rows_done = Column(Integer, default=0)
+    chunks_done = Column(Integer, default=0)
+    topics_keywords = Column(Text, nullable=True)  # JSON {"Sujet 1": "mot1, mot2..."}
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
 
-# 3. Fonction d'initialisation
+# 5. Table des prédictions de l'évaluation (voir src/evaluation.py)
+# Clé = hash du texte + version du modèle : un ré-audit du même modèle ne refait aucun calcul
+class EvalPrediction(Base):
+    __tablename__ = "eval_predictions"
+
+    text_hash = Column(String(64), primary_key=True)
+    model_version = Column(String, index=True)   # Modèle + moteur d'inférence
+    sentiment = Column(String)
+    score = Column(Float)
+
+# 6. Agrégats journaliers des avis (voir src/kpis.py)
+# Une ligne par (jour, source, sujet, sentiment) : les KPIs sur tout l'historique se calculent
+# sur quelques milliers de lignes au lieu de la table 'reviews' entière.
+# Tenue à jour par save_reviews ; "" = sujet / sentiment inconnu.
+class ReviewRollup(Base):
+    __tablename__ = "review_rollups"
+
+    day = Column(Date, primary_key=True)         # Date de l'avis (ou d'archivage si inconnue)
+    source = Column(String, primary_key=True, index=True)
+    topic = Column(String, primary_key=True, index=True)
+    sentiment = Column(String, primary_key=True, index=True)
+    review_count = Column(Integer, default=0)
+    score_sum = Column(Float, default=0.0)       # Somme des Score_IA (moyenne = score_sum / review_count)
+
+# 7. Fonction d'initialisation
 def init_db():
     # Crée toutes les tables définies ci-dessus si elles n'existent pas
     Base.metadata.create_all(bind=engine)
+    doublons = _migrer_reviews()
+    _migrer_jobs()
+    if _ajouter_colonnes(ResultCache.__tablename__, {"etape": "VARCHAR"}):
+        # Résultats antérieurs à la cascade : calculés par le transformer, sauf les avis vides
+        # (résultat par défaut, score 0) -> une seule fois, à l'ajout de la colonne
+        with engine.begin() as conn:
+            conn.execute(text(f"UPDATE {ResultCache.__tablename__} SET etape = 'transformer' "
+                              "WHERE etape IS NULL AND score > 0"))
+    # Première utilisation des agrégats sur une base existante (ou doublons supprimés) : on les recalcule
+    with engine.begin() as conn:
+        vide = conn.execute(text("SELECT 1 FROM review_rollups LIMIT 1")).first() is None
+        avis = conn.execute(text("SELECT 1 FROM reviews LIMIT 1")).first() is not None
+    if avis and (vide or doublons):
+        rebuild_rollups()
     print("Base de données initialisée avec succès !")
 
+def _migrer_reviews():
+    """
+    Ajoute les nouvelles colonnes / index à une table 'reviews' créée par une ancienne version
+    (create_all ne modifie pas une table existante).
+    Retourne : le nombre d'anciens avis en double supprimés
+    """
+    ajoutees = _ajouter_colonnes("reviews", {"text_hash": "VARCHAR(64)", "ingested_at": "DATETIME", "review_date": "DATE",
+                                  "sentiment_stage": "VARCHAR"})
+    with engine.begin() as conn:
+        for index in Review.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+        # Les anciens avis n'ont pas de hash : on le calcule une fois pour toutes (mises à jour groupées).
+        # Un avis sans hash échapperait à l'upsert (une nouvelle sauvegarde ajouterait une copie) :
+        # les doublons sont fusionnés, seule la version la plus récente est gardée (comme pour l'upsert)
+        anciens = conn.execute(text("SELECT id, text_content, source FROM reviews WHERE text_hash IS NULL "
+                                    "ORDER BY id DESC")).all()
+        deja_vus = set()
+        doublons = []
+        for debut in range(0, len(anciens), TAILLE_LOT_SQL):
+            lot = [(id_avis, content_hash(contenu, source))
+                   for id_avis, contenu, source in anciens[debut:debut + TAILLE_LOT_SQL]]
+            # Hash déjà attribué à un avis récent (sauvegardé depuis la migration) : l'ancien est en trop
+            existants = select(Review.text_hash).where(Review.text_hash.in_([h for _, h in lot]))
+            deja_vus.update(conn.execute(existants).scalars())
+            hashes = []
+            for id_avis, h in lot:
+                if h in deja_vus:
+                    doublons.append(id_avis)
+                else:
+                    deja_vus.add(h)
+                    hashes.append({"b_id": id_avis, "b_hash": h})
+            if hashes:
+                conn.execute(update(Review).where(Review.id == bindparam("b_id")).values(text_hash=bindparam("b_hash")),
+                             hashes)
+        for debut in range(0, len(doublons), TAILLE_LOT_SQL):
+            conn.execute(delete(Review).where(Review.id.in_(doublons[debut:debut + TAILLE_LOT_SQL])))
+        if doublons:
+            print(f"⚠️ Migration : {len(doublons)} avis en double fusionnés (même texte et même source)")
+
+        # Les agrégats rangent un avis sans date à sa date d'archivage : il en faut une.
+        # Seuls les avis antérieurs à la colonne n'en ont pas (ensuite : valeur par défaut) -> une seule fois
+        if "ingested_at" in ajoutees:
+            conn.execute(text("UPDATE reviews SET ingested_at = CURRENT_TIMESTAMP WHERE ingested_at IS NULL"))
+    return len(doublons)
+
+def _migrer_jobs():
+    """
+    Un seul job par fichier : l'index sur file_hash d'une ancienne table 'jobs' devient unique.
+    Les anciens doublons (ex: job relancé après une erreur) gardent leur historique, sans hash.
+    """
+    index = {i["name"]: i for i in inspect(engine).get_indexes(Job.__tablename__)}
+    if index.get("ix_jobs_file_hash", {}).get("unique"):
+        return
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE jobs SET file_hash = NULL "
+                          "WHERE id NOT IN (SELECT MAX(id) FROM jobs GROUP BY file_hash)"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_jobs_file_hash"))
+        conn.execute(text("CREATE UNIQUE INDEX ix_jobs_file_hash ON jobs (file_hash)"))
+
+def _ajouter_colonnes(table, nouvelles):
+    """
+    Ajoute à une table existante les colonnes {nom: type SQL} qui lui manquent.
+    Retourne : les noms des colonnes ajoutées
+    """
+    colonnes = {c["name"] for c in inspect(engine).get_columns(table)}
+    ajoutees = [nom for nom in nouvelles if nom not in colonnes]
+    with engine.begin() as conn:
+        for nom in ajoutees:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {nom} {nouvelles[nom]}"))
+    return ajoutees
+
+def rebuild_rollups():
+    """Recalcule tous les agrégats à partir de la table 'reviews' (une seule requête GROUP BY)"""
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM review_rollups"))
+        conn.execute(text("""
+            INSERT INTO review_rollups (day, source, topic, sentiment, review_count, score_sum)
+            SELECT COALESCE(review_date, date(ingested_at)), COALESCE(source, ''), COALESCE(topic, ''),
+                   COALESCE(sentiment, ''), COUNT(*), COALESCE(SUM(score), 0)
+            FROM reviews
+            GROUP BY 1, 2, 3, 4
+        """))
+
+# 8. Écriture en masse
+# Nombre de lignes envoyées par transaction
+TAILLE_LOT_ECRITURE = 10000
+
+def content_hash(text_content, source):
+    """Hash SHA-256 du texte normalisé (minuscules, espaces réduits) et de sa source"""
+    contenu = " ".join(str(text_content).lower().split())
+    return hashlib.sha256(f"{source}\x00{contenu}".encode("utf-8")).hexdigest()
+
+# SQLite limite le nombre de paramètres par requête : on découpe les gros IN (...)
+TAILLE_LOT_SQL = 5000
+
+def _cle_rollup(review_date, ingested_at, source, topic, sentiment):
+    """Ligne d'agrégat d'un avis (mêmes règles que rebuild_rollups)"""
+    if review_date is None:
+        review_date = ingested_at
+    if isinstance(review_date, datetime):
+        review_date = review_date.date()
+    return (review_date, source or "", topic or "", sentiment or "")
+
+def _mettre_a_jour_rollups(conn, anciens, nouveaux):
+    """
+    Ajoute les nouveaux avis aux agrégats et retire l'ancienne version des avis mis à jour.
+    anciens / nouveaux : listes de (clé d'agrégat, score)
+    """
+    variations = {}
+    for signe, lignes in ((-1, anciens), (1, nouveaux)):
+        for cle, score in lignes:
+            nombre, somme = variations.get(cle, (0, 0.0))
+            variations[cle] = (nombre + signe, somme + signe * (score or 0.0))
+    valeurs = [{"day": day, "source": source, "topic": topic, "sentiment": sentiment,
+                "review_count": nombre, "score_sum": somme}
+               for (day, source, topic, sentiment), (nombre, somme) in variations.items() if nombre or somme]
+    if not valeurs:
+        return
+    requete = insert(ReviewRollup)
+    requete = requete.on_conflict_do_update(
+        index_elements=[ReviewRollup.day, ReviewRollup.source, ReviewRollup.topic, ReviewRollup.sentiment],
+        set_={"review_count": ReviewRollup.review_count + requete.excluded.review_count,
+              "score_sum": ReviewRollup.score_sum + requete.excluded.score_sum},
+    )
+    conn.execute(requete, valeurs)
+    # Seuls les agrégats qui ont perdu des avis dans ce lot peuvent tomber à zéro (recherche par clé primaire)
+    vides = [{"b_day": v["day"], "b_source": v["source"], "b_topic": v["topic"], "b_sentiment": v["sentiment"]}
+             for v in valeurs if v["review_count"] < 0]
+    if vides:
+        conn.execute(delete(ReviewRollup).where(
+            ReviewRollup.day == bindparam("b_day"), ReviewRollup.source == bindparam("b_source"),
+            ReviewRollup.topic == bindparam("b_topic"), ReviewRollup.sentiment == bindparam("b_sentiment"),
+            ReviewRollup.review_count <= 0,
+        ), vides)
+
+def _contributions_existantes(conn, hashes):
+    """Clé d'agrégat et score des avis déjà en base (ceux qui vont être mis à jour)"""
+    anciens = []
+    for debut in range(0, len(hashes), TAILLE_LOT_SQL):
+        lignes = conn.execute(
+            select(Review.review_date, Review.ingested_at, Review.source, Review.topic, Review.sentiment, Review.score)
+            .where(Review.text_hash.in_(hashes[debut:debut + TAILLE_LOT_SQL]))
+        )
+        anciens.extend((_cle_rollup(d, i, s, t, se), score) for d, i, s, t, se, score in lignes)
+    return anciens
+
+@metrics.instrument("database.save_reviews", items=lambda nb: nb)
+def save_reviews(rows, chunk_size=TAILLE_LOT_ECRITURE):
+    """
+    Enregistre une liste d'avis (dictionnaires avec les colonnes de Review) en masse.
+    Idempotent : un avis déjà présent (même texte + même source) est mis à jour, pas dupliqué.
+    Les agrégats journaliers (review_rollups) sont mis à jour dans la même transaction.
+    Retourne : le nombre d'avis envoyés
+    """
+    maintenant = datetime.utcnow()
+    valeurs = {}
+    for row in rows:
+        h = content_hash(row["text_content"], row.get("source", "manuel"))
+        # Même avis en double dans la liste : seule la dernière version compte (comme pour l'upsert)
+        valeurs[h] = {
+            "text_content": row["text_content"],
+            "source": row.get("source", "manuel"),
+            "topic": row.get("topic"),
+            "sentiment": row.get("sentiment"),
+            "score": row.get("score"),
+            "sentiment_stage": row.get("sentiment_stage"),
+            "review_date": row.get("review_date"),
+            "text_hash": h,
+            "ingested_at": maintenant,
+        }
+    valeurs = list(valeurs.values())
+    if not valeurs:
+        return 0
+
+    requete = insert(Review)
+    requete = requete.on_conflict_do_update(
+        index_elements=[Review.text_hash],
+        set_={
+            "topic": requete.excluded.topic,
+            "sentiment": requete.excluded.sentiment,
+            "score": requete.excluded.score,
+            "sentiment_stage": requete.excluded.sentiment_stage,
+            "review_date": requete.excluded.review_date,
+            "ingested_at": requete.excluded.ingested_at,
+        },
+    )
+    # Une transaction par lot : le verrou d'écriture est relâché régulièrement
+    for debut in range(0, len(valeurs), chunk_size):
+        lot = valeurs[debut:debut + chunk_size]
+        with engine.begin() as conn:
+            anciens = _contributions_existantes(conn, [v["text_hash"] for v in lot])
+            conn.execute(requete, lot)
+            nouveaux = [(_cle_rollup(v["review_date"], v["ingested_at"], v["source"], v["topic"], v["sentiment"]),
+                         v["score"]) for v in lot]
+            _mettre_a_jour_rollups(conn, anciens, nouveaux)
+    return len(valeurs)
+
 # Petit test si on lance ce fichier directement
 if __name__ == "__main__":
     init_db()
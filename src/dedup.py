@@ -0,0 +1,172 @@
+import os
+import re
+
+import numpy as np
+
+# Regroupement des doublons AVANT les modèles (voir process_with_cache) :
+# un seul avis par groupe passe dans spaCy / le transformer, le résultat est recopié sur tout le groupe.
+# 1. Doublons exacts : même texte aux majuscules et aux espaces près (comme la clé du cache de résultats) ;
+#    la ponctuation est gardée : "Super :)" et "Super :(" n'ont pas le même sentiment
+# 2. Quasi-doublons (optionnel) : MinHash + LSH sur les n-grammes de caractères, au-dessus d'un seuil
+#    de similarité de Jaccard (avis "templates", spam, copier-coller légèrement modifiés).
+#    Attention : la similarité porte sur les caractères (sans la ponctuation), pas sur le sens. Deux avis qui
+#    ne diffèrent que par une négation ("je ne recommande pas" / "je recommande") ou un émoticône
+#    ("Super :)" / "Super :(") peuvent être regroupés et recevoir le même sentiment : garder un seuil élevé.
+# AVIS_DEDUP_NEAR=1 : active les quasi-doublons ; AVIS_DEDUP_THRESHOLD : seuil de similarité (0 à 1)
+NEAR_DUPLICATES = os.environ.get("AVIS_DEDUP_NEAR", "0") == "1"
+SEUIL_SIMILARITE = float(os.environ.get("AVIS_DEDUP_THRESHOLD", "0.85"))
+
+# Paramètres MinHash
+NB_PERMUTATIONS = 64
+TAILLE_SHINGLE = 5          # n-grammes de caractères
+TAILLE_LOT_MINHASH = 2000   # Documents traités à la fois (borne la mémoire du calcul vectorisé)
+
+def normalize_for_dedup(text):
+    """
+    Clé des doublons exacts : minuscules et espaces réduits seulement.
+    Le modèle de sentiment ne fait pas de différence entre ces textes (tokenizer sans majuscules,
+    découpage sur les espaces) : le regroupement ne change aucun résultat.
+    """
+    return " ".join(text.lower().split())
+
+def _texte_minhash(cle):
+    """Texte comparé pour les quasi-doublons : clé exacte sans la ponctuation ("" si aucun mot)"""
+    return " ".join(re.sub(r"[^\w\s]", " ", cle).split())
+
+# 1. MinHash
+_MASQUE_32 = np.uint64(0xFFFFFFFF)
+# Puissances de la base du hash polynomial des n-grammes (modulo 2^32)
+_PUISSANCES = np.array([pow(1000003, j, 2 ** 32) for j in range(TAILLE_SHINGLE)], dtype=np.uint64)
+
+def _hash_shingles(texts):
+    """
+    Hash (32 bits) de tous les n-grammes de caractères d'une liste de textes, calculés d'un bloc.
+    Retourne : (hashes, bornes) - les n-grammes du texte i commencent à bornes[i]
+    """
+    # Points de code de tous les textes bout à bout (complétés par des \0 pour avoir au moins un n-gramme)
+    textes = [t.ljust(TAILLE_SHINGLE, "\0") for t in texts]
+    longueurs = np.array([len(t) for t in textes])
+    tout = np.frombuffer("".join(textes).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    texte_de = np.repeat(np.arange(len(textes)), longueurs)
+
+    fenetres = np.lib.stride_tricks.sliding_window_view(tout, TAILLE_SHINGLE)
+    hashes = (fenetres * _PUISSANCES).sum(axis=1) & _MASQUE_32
+    # Mélange des bits (finaliseur de MurmurHash3) : des n-grammes proches donnent des hash éloignés
+    hashes ^= hashes >> np.uint64(16)
+    hashes = (hashes * np.uint64(0x85EBCA6B)) & _MASQUE_32
+    hashes ^= hashes >> np.uint64(13)
+    hashes = (hashes * np.uint64(0xC2B2AE35)) & _MASQUE_32
+    hashes ^= hashes >> np.uint64(16)
+
+    # On écarte les fenêtres à cheval sur deux textes
+    valides = texte_de[:-TAILLE_SHINGLE + 1] == texte_de[TAILLE_SHINGLE - 1:]
+    bornes = np.concatenate([[0], np.cumsum(longueurs - TAILLE_SHINGLE + 1)[:-1]])
+    return hashes[valides], bornes
+
+def minhash_signatures(texts, num_perm=NB_PERMUTATIONS, seed=1):
+    """
+    Signatures MinHash (tableau n_textes x num_perm) de textes déjà normalisés.
+    Pour chaque permutation h -> (a.h + b) >> 32 (hachage "multiply-shift", sans modulo coûteux),
+    on garde le minimum sur les n-grammes du texte :
+    deux textes ont la même valeur avec une probabilité égale à leur similarité de Jaccard.
+    """
+    rng = np.random.default_rng(seed)
+    # a impair : la multiplication modulo 2^64 est une permutation
+    a = (rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1))[:, None]
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)[:, None]
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for debut in range(0, len(texts), TAILLE_LOT_MINHASH):
+        # Tous les n-grammes du lot bout à bout, puis minimum par texte (reduceat) : pas de boucle par texte
+        hashes, bornes = _hash_shingles(texts[debut:debut + TAILLE_LOT_MINHASH])
+        valeurs = (a * hashes[None, :] + b) >> np.uint64(32)
+        signatures[debut:debut + len(bornes)] = np.minimum.reduceat(valeurs, bornes, axis=1).T
+    return signatures
+
+def _parametres_lsh(num_perm, threshold):
+    """
+    Découpage de la signature en bandes de r valeurs : deux textes sont "candidats" s'ils ont une
+    bande identique. Le seuil de ce filtre vaut environ (1/bandes)^(1/r) : on prend le plus proche
+    sous le seuil demandé (on préfère trop de candidats, ils sont vérifiés ensuite).
+    """
+    choix = [(r, num_perm // r) for r in range(1, num_perm + 1) if num_perm % r == 0]
+    sous_le_seuil = [(r, b) for r, b in choix if (1 / b) ** (1 / r) <= threshold]
+    return max(sous_le_seuil, key=lambda rb: (1 / rb[1]) ** (1 / rb[0])) if sous_le_seuil else choix[0]
+
+def _racine(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+def near_duplicate_groups(texts, threshold=SEUIL_SIMILARITE, num_perm=NB_PERMUTATIONS):
+    """
+    Groupes de quasi-doublons (textes normalisés).
+    Ignore le sens : "je ne recommande pas" et "je recommande" peuvent dépasser le seuil (voir en tête du module).
+    Retourne : un tableau donnant, pour chaque texte, l'index du premier texte de son groupe
+    """
+    n = len(texts)
+    parents = np.arange(n)
+    if n < 2:
+        return parents
+    signatures = minhash_signatures(texts, num_perm)
+    r, bandes = _parametres_lsh(num_perm, threshold)
+    for bande in range(bandes):
+        # Textes ayant exactement la même bande = même "seau" ; on compare chacun au premier du seau
+        valeurs = np.ascontiguousarray(signatures[:, bande * r:(bande + 1) * r])
+        _, premiers, seaux = np.unique(valeurs.view(np.dtype((np.void, valeurs.dtype.itemsize * r))),
+                                       return_index=True, return_inverse=True)
+        leaders = premiers[seaux.ravel()]
+        candidats = np.nonzero(leaders != np.arange(n))[0]
+        # Similarité estimée = part des valeurs MinHash identiques
+        similarite = (signatures[candidats] == signatures[leaders[candidats]]).mean(axis=1)
+        for i, j in zip(candidats[similarite >= threshold], leaders[candidats[similarite >= threshold]]):
+            ri, rj = _racine(parents, i), _racine(parents, j)
+            if ri != rj:
+                parents[max(ri, rj)] = min(ri, rj)
+    return np.array([_racine(parents, i) for i in range(n)])
+
+# 2. Regroupement complet
+def find_duplicate_groups(texts, near=NEAR_DUPLICATES, threshold=SEUIL_SIMILARITE):
+    """
+    Regroupe les doublons exacts (après normalisation), puis éventuellement les quasi-doublons.
+    Ce qui n'est pas du texte (ou est vide) forme toujours un groupe à lui seul ; un texte sans aucun mot
+    ("!!!", "???") n'est jamais regroupé avec un quasi-doublon (sinon "!!!" et "???" recevraient le même résultat).
+    Retourne : un tableau donnant, pour chaque texte, l'index de son représentant
+               (le premier texte du groupe, le seul à passer dans les modèles)
+    """
+    representants = np.arange(len(texts))
+    premiers = {}
+    for i, text in enumerate(texts):
+        cle = normalize_for_dedup(text) if isinstance(text, str) else ""
+        if cle:
+            representants[i] = premiers.setdefault(cle, i)
+
+    # MinHash uniquement sur un texte par groupe exact, s'il contient au moins un mot
+    avec_mots = [(_texte_minhash(cle), i) for cle, i in premiers.items()] if near else []
+    avec_mots = [(texte, i) for texte, i in avec_mots if texte]
+    if len(avec_mots) > 1:
+        uniques = np.array([i for _, i in avec_mots], dtype=np.int64)
+        groupes = near_duplicate_groups([texte for texte, _ in avec_mots], threshold)
+        # Le représentant d'un groupe exact devient celui de son groupe de quasi-doublons
+        nouveau = dict(zip(uniques, uniques[groupes]))
+        representants = np.array([nouveau.get(r, r) for r in representants])
+    return representants
+
+def group_sizes(representants):
+    """Taille du groupe de chaque texte (1 = texte unique)"""
+    _, inverse, tailles = np.unique(representants, return_inverse=True, return_counts=True)
+    return tailles[inverse.ravel()]
+
+def fan_out(resultats, representants):
+    """
+    Recopie les résultats calculés sur les représentants à tous les membres de leur groupe.
+    resultats : DataFrame avec une ligne par représentant, dans l'ordre de np.unique(representants)
+    Retourne : un DataFrame avec une ligne par texte (les KPIs restent pondérés par le nombre réel d'avis),
+    plus les colonnes 'Taille_Groupe' et 'Groupe_ID' (index du représentant : nombre d'avis uniques
+    d'une sélection = nombre de Groupe_ID distincts, même si la sélection coupe des groupes)
+    """
+    uniques, position, tailles = np.unique(representants, return_inverse=True, return_counts=True)
+    resultats = resultats.iloc[position.ravel()].reset_index(drop=True)
+    resultats['Taille_Groupe'] = tailles[position.ravel()]
+    resultats['Groupe_ID'] = np.asarray(representants, dtype=np.int64)
+    return resultats
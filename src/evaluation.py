@@ -1,9 +1,19 @@
+import time
+
+import numpy as np
 import pandas as pd
-from sklearn.metrics import accuracy_score, f1_score
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
 # Correction de l'import : on précise 'src.sentiment' pour que ça marche depuis le dashboard
-from src.sentiment import analyze_sentiment
+from src.sentiment import analyze_sentiment_batch, get_sentiment_backend, model_name, backend_name, LABELS_SENTIMENT
+from src.cache import hash_texte, PIPELINE_VERSION, TAILLE_LOT_SQL
+from src.database import engine, EvalPrediction
+from src.instrumentation import metrics
+from src.pipeline import find_text_column
 
 # 1. CRÉATION DU JEU DE DONNÉES "VÉRITÉ TERRAIN"
+# Jeu par défaut : un vrai jeu de test (CSV / Parquet, de n'importe quelle taille) peut être passé à evaluate()
 donnees_test = [
     {"text": "J'adore ce produit, il est génial !", "verite": "Positif 😃"},
     {"text": "C'est une catastrophe, je déteste.", "verite": "Négatif 😡"},
@@ -15,33 +25,276 @@ donnees_test = [
     {"text": "Very bad quality.", "verite": "Négatif 😡"}
 ]
 
-# 2. FONCTION APPELÉE PAR LE DASHBOARD
+# Nombre de lignes du jeu de test lues à la fois
+TAILLE_CHUNK_EVAL = 10000
+# Noms de colonnes reconnus comme contenant le label attendu
+COLONNES_LABEL = ['verite', 'label', 'sentiment', 'gold', 'etoiles', 'stars', 'note']
+
+# 2. LECTURE DU JEU DE TEST (en streaming)
+def normaliser_label(valeur):
+    """
+    Convertit un label "vérité terrain" en index de LABELS_SENTIMENT (0 = Négatif, 1 = Neutre, 2 = Positif).
+    Accepte : 'Positif 😃', 'positive', 'neg', 'neutral', une note 1 à 5, '4 stars'...
+    Retourne -1 si le label n'est pas reconnu.
+    """
+    if isinstance(valeur, (int, float, np.integer, np.floating)) and not pd.isna(valeur):
+        etoiles = int(valeur)
+        return -1 if not 1 <= etoiles <= 5 else (0 if etoiles <= 2 else 1 if etoiles == 3 else 2)
+    if not isinstance(valeur, str) or not valeur.strip():
+        return -1
+    texte = valeur.strip().lower()
+    if texte[0].isdigit():
+        return normaliser_label(int(texte[0]))
+    if texte.startswith("pos"):
+        return 2
+    if texte.startswith(("neg", "nég")):
+        return 0
+    if texte.startswith("neu"):
+        return 1
+    return -1
+
+def _encoder_labels(serie):
+    """Version vectorisée de normaliser_label (un seul appel par valeur distincte)"""
+    codes = {v: normaliser_label(v) for v in serie.dropna().unique()}
+    return serie.map(codes).fillna(-1).to_numpy(dtype=np.int8)
+
+def iter_gold_set(source=None, text_column=None, label_column=None, chunksize=TAILLE_CHUNK_EVAL):
+    """
+    Générateur : lit le jeu de test morceau par morceau.
+    source : chemin ou fichier ouvert (CSV ou Parquet), DataFrame, ou None (jeu par défaut)
+    Retourne des DataFrames avec les colonnes 'text' et 'label' (index de LABELS_SENTIMENT, -1 si inconnu)
+    """
+    if source is None:
+        source = pd.DataFrame(donnees_test)
+    nom = source if isinstance(source, str) else getattr(source, "name", "")
+
+    if isinstance(source, pd.DataFrame):
+        morceaux = (source.iloc[debut:debut + chunksize] for debut in range(0, len(source), chunksize))
+    elif str(nom).lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+        # Lecture par lots de lignes : le fichier n'est jamais chargé en entier
+        morceaux = (lot.to_pandas() for lot in pq.ParquetFile(source).iter_batches(batch_size=chunksize))
+    else:
+        morceaux = pd.read_csv(source, chunksize=chunksize)
+
+    for chunk in morceaux:
+        if text_column is None:
+            text_column = find_text_column(chunk.columns) or next(
+                (c for c in chunk.columns if c.lower() in ("text", "texte")), None)
+        if label_column is None:
+            label_column = next((c for c in chunk.columns if c.lower() in COLONNES_LABEL), None)
+        if text_column is None or label_column is None:
+            raise ValueError(f"Colonnes texte / label introuvables dans {list(chunk.columns)}")
+        yield pd.DataFrame({"text": chunk[text_column].to_numpy(), "label": _encoder_labels(chunk[label_column])})
+
+# 3. CACHE DES PRÉDICTIONS (par version du modèle)
+def model_version(backend=None):
+    """Identifiant du modèle évalué : un autre modèle ou un autre moteur = d'autres prédictions"""
+    return "|".join([PIPELINE_VERSION, model_name, backend or backend_name])
+
+def _lire_predictions(hashes):
+    """Retourne : {hash: (sentiment, score)} pour les hash déjà évalués"""
+    hashes = list(set(hashes))
+    trouves = {}
+    with engine.begin() as conn:
+        for debut in range(0, len(hashes), TAILLE_LOT_SQL):
+            lot = hashes[debut:debut + TAILLE_LOT_SQL]
+            lignes = conn.execute(select(EvalPrediction.text_hash, EvalPrediction.sentiment, EvalPrediction.score)
+                                  .where(EvalPrediction.text_hash.in_(lot)))
+            for h, sentiment, score in lignes:
+                trouves[h] = (sentiment, score)
+    return trouves
+
+def _ecrire_predictions(lignes, version):
+    """lignes : liste de (hash, sentiment, score)"""
+    valeurs = [{"text_hash": h, "model_version": version, "sentiment": sentiment, "score": score}
+               for h, sentiment, score in lignes]
+    if not valeurs:
+        return
+    requete = insert(EvalPrediction)
+    requete = requete.on_conflict_do_update(
+        index_elements=[EvalPrediction.text_hash],
+        set_={"sentiment": requete.excluded.sentiment, "score": requete.excluded.score},
+    )
+    with engine.begin() as conn:
+        # 4 colonnes par ligne : on reste sous la limite de paramètres de SQLite
+        for debut in range(0, len(valeurs), TAILLE_LOT_SQL // 4):
+            conn.execute(requete, valeurs[debut:debut + TAILLE_LOT_SQL // 4])
+
+# 4. MÉTRIQUES (à partir de la matrice de confusion)
+def confusion_matrix(y_true, y_pred, n_classes=len(LABELS_SENTIMENT)):
+    """Matrice de confusion (lignes = vérité, colonnes = prédiction), sans boucle Python"""
+    return np.bincount(y_true * n_classes + y_pred, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+
+def _scores(matrices):
+    """
+    Accuracy et F1 pondéré (comme sklearn average='weighted') d'une ou plusieurs matrices de confusion.
+    matrices : tableau (..., K, K). Retourne : (accuracy, f1) de forme (...)
+    """
+    matrices = np.asarray(matrices, dtype=np.float64)
+    total = matrices.sum(axis=(-2, -1))
+    vrais_positifs = np.diagonal(matrices, axis1=-2, axis2=-1)
+    support = matrices.sum(axis=-1)    # Nombre d'avis de chaque classe (vérité)
+    predits = matrices.sum(axis=-2)    # Nombre de prédictions de chaque classe
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # F1 = 2.TP / (support + prédits), 0 pour une classe ni présente ni prédite
+        f1 = np.where(support + predits > 0, 2 * vrais_positifs / (support + predits), 0.0)
+        accuracy = vrais_positifs.sum(axis=-1) / total
+        f1_pondere = (f1 * support).sum(axis=-1) / total
+    return accuracy, f1_pondere
+
+def bootstrap_intervals(matrice, n_bootstrap=1000, niveau=0.95, seed=0):
+    """
+    Intervalles de confiance (bootstrap) de l'accuracy et du F1 pondéré.
+    Ré-échantillonner les avis revient à tirer les cases de la matrice de confusion selon une loi
+    multinomiale : n_bootstrap tirages d'un coup, quel que soit le nombre d'avis.
+    Retourne : {"accuracy": (bas, haut), "f1": (bas, haut)}
+    """
+    n = int(matrice.sum())
+    if n == 0 or n_bootstrap <= 0:
+        return {"accuracy": (None, None), "f1": (None, None)}
+    k = matrice.shape[0]
+    rng = np.random.default_rng(seed)
+    tirages = rng.multinomial(n, matrice.ravel() / n, size=n_bootstrap).reshape(n_bootstrap, k, k)
+    accuracy, f1 = _scores(tirages)
+    bornes = [(1 - niveau) / 2 * 100, (1 + niveau) / 2 * 100]
+    return {"accuracy": tuple(float(x) for x in np.percentile(accuracy, bornes)),
+            "f1": tuple(float(x) for x in np.percentile(f1, bornes))}
+
+def scores_par_classe(matrice):
+    """
+    Précision, rappel, F1 et support de chaque sentiment (DataFrame).
+    Les prédictions en erreur (dernière colonne, voir evaluate) font baisser le rappel de la vraie classe.
+    """
+    vrais_positifs = np.diag(matrice).astype(float)
+    support = matrice.sum(axis=1)
+    predits = matrice.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = np.where(predits > 0, vrais_positifs / predits, 0.0)
+        rappel = np.where(support > 0, vrais_positifs / support, 0.0)
+        f1 = np.where(support + predits > 0, 2 * vrais_positifs / (support + predits), 0.0)
+    k = len(LABELS_SENTIMENT)
+    return pd.DataFrame({"precision": precision[:k], "rappel": rappel[:k], "f1": f1[:k], "support": support[:k]},
+                        index=list(LABELS_SENTIMENT))
+
+# 5. ÉVALUATION
+def evaluate(source=None, backend=None, text_column=None, label_column=None, batch_size=32,
+             chunksize=TAILLE_CHUNK_EVAL, n_bootstrap=1000, use_cache=True, seed=0):
+    """
+    Évalue le modèle de sentiment sur un jeu de test (voir iter_gold_set pour source).
+    - Inférence par lots ; les prédictions sont gardées en base par version du modèle :
+      un ré-audit du même modèle ne recalcule rien (use_cache=False pour mesurer la vitesse)
+    - Qualité : accuracy, F1 pondéré (+ intervalles de confiance), matrice de confusion, scores par classe.
+      Un avis que le modèle n'a pas pu classer ("Erreur") compte comme une prédiction fausse
+      (classe "Erreur" en plus dans la matrice de confusion) et est compté dans rapport["erreurs"]
+    - Vitesse : avis/seconde et latence par lot (sur les avis réellement calculés)
+    Retourne : un dictionnaire
+    """
+    if get_sentiment_backend(backend) is None:
+        raise RuntimeError(f"Modèle de sentiment indisponible (moteur : {backend or backend_name})")
+    version = model_version(backend)
+    index_labels = {label: i for i, label in enumerate(LABELS_SENTIMENT)}
+    # Classe supplémentaire (dernier index) pour les prédictions en erreur : jamais vraie, toujours fausse
+    code_erreur = len(LABELS_SENTIMENT)
+
+    vrais, predits = [], []
+    latences = []
+    secondes_inference = 0.0
+    rapport = {"modele": model_name, "moteur": backend or backend_name, "version": version,
+               "ignores": 0, "erreurs": 0, "en_cache": 0, "calcules": 0}
+    debut_total = time.perf_counter()
+
+    for chunk in iter_gold_set(source, text_column, label_column, chunksize):
+        # A. On écarte les lignes sans texte ou sans label reconnu
+        valides = (chunk["label"].to_numpy() >= 0) & chunk["text"].map(lambda t: isinstance(t, str) and bool(t)).to_numpy()
+        rapport["ignores"] += int((~valides).sum())
+        chunk = chunk[valides]
+        textes = chunk["text"].tolist()
+        hashes = [hash_texte(t, version) for t in textes]
+
+        # B. Prédictions déjà connues pour ce modèle
+        connus = _lire_predictions(hashes) if use_cache else {}
+        manquants = {}
+        for h, t in zip(hashes, textes):
+            if h not in connus:
+                manquants.setdefault(h, t)
+        rapport["en_cache"] += len(hashes) - sum(h not in connus for h in hashes)
+
+        # C. Inférence des textes manquants (triés par longueur : lots homogènes, moins de padding)
+        a_calculer = sorted(manquants.items(), key=lambda item: len(item[1]))
+        nouveaux = []
+        with metrics.stage("evaluation.inference", items=len(a_calculer)):
+            for debut in range(0, len(a_calculer), batch_size):
+                lot = a_calculer[debut:debut + batch_size]
+                t = time.perf_counter()
+                resultats = analyze_sentiment_batch([texte for _, texte in lot], batch_size=batch_size, backend=backend)
+                duree = time.perf_counter() - t
+                latences.append(duree)
+                secondes_inference += duree
+                for (h, _), (label, score, _) in zip(lot, resultats):
+                    connus[h] = (label, score)
+                    if label != "Erreur":
+                        nouveaux.append((h, label, score))
+        rapport["calcules"] += len(a_calculer)
+        _ecrire_predictions(nouveaux, version)
+
+        # D. Labels prédits, dans l'ordre du jeu de test (code_erreur = erreur du modèle, comptée fausse)
+        codes = np.array([index_labels.get(connus[h][0], code_erreur) for h in hashes], dtype=np.int8)
+        rapport["erreurs"] += int((codes == code_erreur).sum())
+        vrais.append(chunk["label"].to_numpy())
+        predits.append(codes)
+
+    y_true = np.concatenate(vrais) if vrais else np.array([], dtype=np.int8)
+    y_pred = np.concatenate(predits) if predits else np.array([], dtype=np.int8)
+    matrice = confusion_matrix(y_true.astype(np.int64), y_pred.astype(np.int64), n_classes=code_erreur + 1)
+    accuracy, f1 = _scores(matrice)
+    intervalles = bootstrap_intervals(matrice, n_bootstrap=n_bootstrap, seed=seed)
+
+    rapport.update({
+        "avis": int(len(y_true)),
+        "accuracy": float(accuracy) if len(y_true) else None,
+        "accuracy_ic": intervalles["accuracy"],
+        "f1": float(f1) if len(y_true) else None,
+        "f1_ic": intervalles["f1"],
+        # Lignes = vérité (sentiments), colonnes = prédiction (sentiments + "Erreur")
+        "labels": list(LABELS_SENTIMENT),
+        "labels_predits": [*LABELS_SENTIMENT, "Erreur"],
+        "matrice_confusion": matrice[:code_erreur].tolist(),
+        "par_classe": scores_par_classe(matrice),
+        "secondes": time.perf_counter() - debut_total,
+        # Vitesse mesurée sur les seuls avis calculés (None si tout venait du cache)
+        "avis_par_seconde": rapport["calcules"] / secondes_inference if secondes_inference > 0 else None,
+        "latence_lot_p50_ms": float(np.percentile(latences, 50) * 1000) if latences else None,
+        "latence_lot_p95_ms": float(np.percentile(latences, 95) * 1000) if latences else None,
+        "latence_lot_p99_ms": float(np.percentile(latences, 99) * 1000) if latences else None,
+        "batch_size": batch_size,
+    })
+    return rapport
+
+# 6. FONCTION APPELÉE PAR LE DASHBOARD (ancienne interface)
 def get_metrics():
     """
-    Fonction qui calcule l'Accuracy et le F1-Score.
+    Fonction qui calcule l'Accuracy et le F1-Score sur le jeu par défaut.
     Retourne : (accuracy, f1_score, nombre_echantillons)
     """
-    y_true = []
-    y_pred = []
-    
-    # On boucle sur chaque phrase test
-    for item in donnees_test:
-        text = item["text"]
-        realite = item["verite"]
-        
-        # On demande à l'IA
-        pred_label, score, _ = analyze_sentiment(text)
-        
-        y_true.append(realite)
-        y_pred.append(pred_label)
-
-    # Calcul des métriques
-    accuracy = accuracy_score(y_true, y_pred)
-    f1 = f1_score(y_true, y_pred, average='weighted') 
-    
-    return accuracy, f1, len(donnees_test)
+    rapport = evaluate(n_bootstrap=0)
+    return rapport["accuracy"], rapport["f1"], rapport["avis"]
 
 # Petit bloc pour tester ce fichier tout seul si besoin
+#   python -m src.evaluation                          (jeu par défaut)
+#   python -m src.evaluation gold.parquet int8        (jeu de test + moteur)
 if __name__ == "__main__":
-    acc, f1, n = get_metrics()
-    print(f"Test manuel : Accuracy={acc}, F1={f1}")
\ No newline at end of file
+    import sys
+    from src.database import init_db
+
+    init_db()
+    source = sys.argv[1] if len(sys.argv) > 1 else None
+    backend = sys.argv[2] if len(sys.argv) > 2 else None
+    r = evaluate(source, backend=backend)
+    print(f"Modèle : {r['version']}  |  {r['avis']} avis ({r['en_cache']} en cache, {r['ignores']} ignorés, "
+          f"{r['erreurs']} en erreur)")
+    print(f"Accuracy = {r['accuracy']:.3f}  IC95 {r['accuracy_ic']}")
+    print(f"F1       = {r['f1']:.3f}  IC95 {r['f1_ic']}")
+    print(r["par_classe"])
+    if r["avis_par_seconde"]:
+        print(f"Vitesse  : {r['avis_par_seconde']:.0f} avis/s, latence par lot p95 {r['latence_lot_p95_ms']:.1f} ms")
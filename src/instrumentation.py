@@ -0,0 +1,206 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Mesures par étape du pipeline (détection de langue, spaCy, transformer, LDA, écriture SQLite...) :
+# temps, nombre d'avis traités, hits / misses de cache, variation de mémoire.
+# Les étapes sont mesurées avec metrics.stage("nom") (bloc with) ou @metrics.instrument("nom") (décorateur).
+# AVIS_PROFILE=1 : profil cProfile de chaque étape (le plus récent est gardé)
+# AVIS_TRACEMALLOC=1 : pic mémoire Python de chaque étape (tracemalloc, ralentit nettement le code)
+PROFILE = os.environ.get("AVIS_PROFILE", "0") == "1"
+TRACEMALLOC = os.environ.get("AVIS_TRACEMALLOC", "0") == "1"
+
+# Nombre de lignes gardées dans le résumé d'un profil cProfile
+LIGNES_PROFIL = 30
+
+def rss_bytes():
+    """Mémoire résidente (RSS) du processus, en octets"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Hors Linux : pic du processus depuis son démarrage (ko sous Linux, octets sous macOS)
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+class Mesure:
+    """Mesure en cours : l'étape peut renseigner items, cache_hits et cache_misses"""
+
+    def __init__(self, items=0):
+        self.items = items
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+class Instrumentation:
+    """
+    Compteurs cumulés par étape, partagés par tous les threads du processus (un seul objet : metrics).
+    La mémoire est celle du processus entier : avec plusieurs traitements en parallèle,
+    la variation attribuée à une étape est approximative.
+    """
+
+    def __init__(self, profile=PROFILE, trace_memory=TRACEMALLOC):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self._stats = {}
+        self.profils = {}       # {étape: résumé texte du dernier profil cProfile}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _nouvelles_stats(self):
+        return {"appels": 0, "erreurs": 0, "secondes": 0.0, "secondes_max": 0.0, "derniere_secondes": 0.0,
+                "items": 0, "cache_hits": 0, "cache_misses": 0,
+                "memoire_delta_mo": 0.0, "memoire_delta_max_mo": 0.0, "pic_python_mo": None}
+
+    @contextmanager
+    def stage(self, name, items=0):
+        """
+        Mesure le bloc de code :
+            with metrics.stage("sentiment.batch", items=len(texts)) as m:
+                ...
+                m.cache_hits = 12
+        Les étapes imbriquées sont toutes mesurées ; le profil et tracemalloc ne concernent que
+        l'étape la plus externe du thread.
+        """
+        mesure = Mesure(items)
+        externe = not getattr(self._local, "profondeur", 0)
+        self._local.profondeur = getattr(self._local, "profondeur", 0) + 1
+        options = getattr(self._local, "options", {})
+
+        profiler = None
+        if options.get("profile", self.profile) and externe:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Un autre profileur est déjà actif (autre thread) : on s'en passe
+                profiler = None
+        trace = options.get("trace_memory", self.trace_memory) and externe and not tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.start()
+
+        memoire_avant = rss_bytes()
+        debut = time.perf_counter()
+        erreur = False
+        try:
+            yield mesure
+        except BaseException:
+            erreur = True
+            raise
+        finally:
+            secondes = time.perf_counter() - debut
+            delta = (rss_bytes() - memoire_avant) / 1e6
+            pic = None
+            if trace:
+                pic = tracemalloc.get_traced_memory()[1] / 1e6
+                tracemalloc.stop()
+            if profiler is not None:
+                profiler.disable()
+                sortie = io.StringIO()
+                pstats.Stats(profiler, stream=sortie).sort_stats("cumulative").print_stats(LIGNES_PROFIL)
+                self.profils[name] = sortie.getvalue()
+            self._local.profondeur -= 1
+            self._enregistrer(name, mesure, secondes, delta, pic, erreur)
+
+    @contextmanager
+    def options(self, profile=None, trace_memory=None):
+        """
+        Profil cProfile / tracemalloc pour le thread courant seulement (ex: une session du dashboard),
+        sans changer les réglages du processus partagés par tous les utilisateurs :
+            with metrics.options(profile=True):
+                ...
+        None : réglage du processus (self.profile / self.trace_memory)
+        """
+        precedentes = getattr(self._local, "options", {})
+        demandees = {"profile": profile, "trace_memory": trace_memory}
+        self._local.options = {**precedentes, **{k: v for k, v in demandees.items() if v is not None}}
+        try:
+            yield
+        finally:
+            self._local.options = precedentes
+
+    def _enregistrer(self, name, mesure, secondes, delta, pic, erreur):
+        with self._lock:
+            stats = self._stats.setdefault(name, self._nouvelles_stats())
+            stats["appels"] += 1
+            stats["erreurs"] += int(erreur)
+            stats["secondes"] += secondes
+            stats["secondes_max"] = max(stats["secondes_max"], secondes)
+            stats["derniere_secondes"] = secondes
+            stats["items"] += mesure.items
+            stats["cache_hits"] += mesure.cache_hits
+            stats["cache_misses"] += mesure.cache_misses
+            stats["memoire_delta_mo"] = delta
+            stats["memoire_delta_max_mo"] = max(stats["memoire_delta_max_mo"], delta)
+            if pic is not None:
+                stats["pic_python_mo"] = pic
+
+    def instrument(self, name, items=None):
+        """
+        Décorateur : mesure chaque appel de la fonction.
+        items : fonction (résultat -> nombre d'avis traités), ex: len. Par défaut : 1 par appel
+        """
+        def decorateur(fonction):
+            @functools.wraps(fonction)
+            def wrapper(*args, **kwargs):
+                with self.stage(name) as mesure:
+                    resultat = fonction(*args, **kwargs)
+                    mesure.items = items(resultat) if items is not None else 1
+                return resultat
+            return wrapper
+        return decorateur
+
+    def snapshot(self):
+        """
+        Copie des compteurs : {étape: {appels, secondes, items, avis_par_seconde, taux_cache...}}
+        """
+        with self._lock:
+            copie = {name: dict(stats) for name, stats in self._stats.items()}
+        for stats in copie.values():
+            stats["avis_par_seconde"] = stats["items"] / stats["secondes"] if stats["secondes"] > 0 else None
+            consultes = stats["cache_hits"] + stats["cache_misses"]
+            stats["taux_cache"] = stats["cache_hits"] / consultes if consultes else None
+        return copie
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.profils.clear()
+
+    def to_prometheus(self, prefix="avis"):
+        """Export au format texte Prometheus (à servir tel quel sur un endpoint /metrics)"""
+        snapshot = self.snapshot()
+        metriques = [
+            ("stage_calls_total", "counter", "Nombre d'appels de l'étape", "appels", 1),
+            ("stage_errors_total", "counter", "Nombre d'appels terminés par une exception", "erreurs", 1),
+            ("stage_seconds_total", "counter", "Temps cumulé passé dans l'étape", "secondes", 1),
+            ("stage_seconds_max", "gauge", "Appel le plus long de l'étape", "secondes_max", 1),
+            ("stage_items_total", "counter", "Nombre d'avis traités par l'étape", "items", 1),
+            ("stage_cache_hits_total", "counter", "Résultats trouvés en cache", "cache_hits", 1),
+            ("stage_cache_misses_total", "counter", "Résultats absents du cache", "cache_misses", 1),
+            ("stage_memory_delta_bytes", "gauge", "Variation de la RSS lors du dernier appel",
+             "memoire_delta_mo", 1e6),
+        ]
+        lignes = []
+        for suffixe, type_metrique, aide, cle, facteur in metriques:
+            nom = f"{prefix}_{suffixe}"
+            lignes.append(f"# HELP {nom} {aide}")
+            lignes.append(f"# TYPE {nom} {type_metrique}")
+            for stage, stats in sorted(snapshot.items()):
+                etiquette = stage.replace("\\", "\\\\").replace('"', '\\"')
+                # repr : toutes les décimales (":g" arrondissait à 6 chiffres significatifs au-delà de 1e6)
+                lignes.append(f'{nom}{{stage="{etiquette}"}} {float(stats[cle] * facteur)!r}')
+        lignes.append(f"# HELP {prefix}_process_resident_memory_bytes RSS du processus")
+        lignes.append(f"# TYPE {prefix}_process_resident_memory_bytes gauge")
+        lignes.append(f"{prefix}_process_resident_memory_bytes {rss_bytes()}")
+        return "\n".join(lignes) + "\n"
+
+# Instance unique utilisée par tous les modules
+metrics = Instrumentation()
@@ -0,0 +1,206 @@
+import glob
+import json
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy.exc import IntegrityError
+
+from src.database import SessionLocal, Job
+from src.pipeline import (enrich_chunk, find_text_column, assign_topics, finalize_topics,
+                          ReservoirSample, TAILLE_ECHANTILLON_TOPICS)
+from src.topic_modeling import load_or_create_topic_model, TOPIC_MODEL_PATH
+
+# Traitements en arrière-plan :
+# un upload crée un "job" (table 'jobs'), traité morceau par morceau par un pool de threads local.
+# Chaque morceau traité est écrit dans jobs/<id>/part-XXXXX.parquet : le dashboard peut afficher
+# les résultats partiels, et un job interrompu (redémarrage du serveur) reprend là où il s'était arrêté.
+
+DOSSIER_JOBS = "jobs"
+TAILLE_CHUNK_JOB = 2000
+NB_WORKERS_JOBS = int(os.environ.get("AVIS_JOB_WORKERS", "2"))
+
+EN_ATTENTE = "en_attente"
+EN_COURS = "en_cours"
+TERMINE = "termine"
+ERREUR = "erreur"
+
+def _dossier_job(job_id):
+    return os.path.join(DOSSIER_JOBS, str(job_id))
+
+def _mettre_a_jour(job_id, **valeurs):
+    session = SessionLocal()
+    try:
+        session.query(Job).filter(Job.id == job_id).update(valeurs)
+        session.commit()
+    finally:
+        session.close()
+
+def get_job(job_id):
+    session = SessionLocal()
+    try:
+        return session.get(Job, job_id)
+    finally:
+        session.close()
+
+def find_job(file_hash):
+    """Job de ce fichier (un seul par fichier : file_hash est unique), ou None"""
+    session = SessionLocal()
+    try:
+        return session.query(Job).filter(Job.file_hash == file_hash).first()
+    finally:
+        session.close()
+
+def list_jobs(limit=20):
+    session = SessionLocal()
+    try:
+        return session.query(Job).order_by(Job.id.desc()).limit(limit).all()
+    finally:
+        session.close()
+
+def load_job_results(job_id):
+    """Concatène les morceaux déjà traités (DataFrame vide si aucun)"""
+    parts = sorted(glob.glob(os.path.join(_dossier_job(job_id), "part-*.parquet")))
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
+
+def get_job_keywords(job):
+    return json.loads(job.topics_keywords) if job.topics_keywords else {}
+
+def _ecrire_morceau(chunk, fichier):
+    """Écriture atomique d'un morceau (fichier temporaire puis renommage)"""
+    chunk.to_parquet(f"{fichier}.tmp", index=False)
+    os.replace(f"{fichier}.tmp", fichier)
+
+def _run_job(job_id, n_topics, topic_model_path):
+    """
+    Traitement d'un job (dans un thread du pool), comme run_streaming_pipeline :
+    1. Morceau par morceau : langue, nettoyage, sentiment, et des sujets provisoires (pour l'affichage
+       des résultats partiels) donnés par une copie du modèle sauvegardé, jamais modifié ici
+    2. Le modèle sauvegardé est mis à jour sur un échantillon de tout le fichier
+    3. Tous les morceaux reçoivent les sujets de ce modèle final (ceux des mots-clés du job)
+    """
+    dossier = _dossier_job(job_id)
+    entree = os.path.join(dossier, "input.csv")
+    # Reprise : les morceaux déjà écrits ne sont pas recalculés
+    deja_faits = len(glob.glob(os.path.join(dossier, "part-*.parquet")))
+    _mettre_a_jour(job_id, status=EN_COURS, started_at=datetime.utcnow(), error=None)
+
+    try:
+        provisoire = load_or_create_topic_model(n_topics, topic_model_path)
+        echantillon = ReservoirSample(TAILLE_ECHANTILLON_TOPICS)
+        lignes = 0
+        text_column = None
+        lecteur = pd.read_csv(entree, chunksize=TAILLE_CHUNK_JOB)
+        for index, chunk in enumerate(lecteur):
+            if text_column is None:
+                text_column = find_text_column(chunk.columns)
+                if text_column is None:
+                    raise ValueError("Colonne texte introuvable.")
+            fichier = os.path.join(dossier, f"part-{index:05d}.parquet")
+            if index < deja_faits:
+                lignes += len(chunk)
+                echantillon.add(pd.read_parquet(fichier, columns=['Avis_Nettoye'])['Avis_Nettoye'])
+                continue
+            chunk = enrich_chunk(chunk, text_column)
+            if not provisoire.is_fitted:
+                # Premier fichier : modèle provisoire entraîné sur ce morceau (ni partagé, ni sauvegardé)
+                provisoire.partial_fit(chunk['Avis_Nettoye'])
+            chunk = assign_topics(chunk, provisoire)
+            _ecrire_morceau(chunk, fichier)
+            echantillon.add(chunk['Avis_Nettoye'])
+
+            lignes += len(chunk)
+            keywords = provisoire.keywords() if provisoire.is_fitted else {}
+            _mettre_a_jour(job_id, text_column=text_column, rows_done=lignes, chunks_done=index + 1,
+                           topics_keywords=json.dumps(keywords, ensure_ascii=False))
+
+        topic_model, keywords = finalize_topics(echantillon.items, n_topics, topic_model_path)
+        for fichier in sorted(glob.glob(os.path.join(dossier, "part-*.parquet"))):
+            _ecrire_morceau(assign_topics(pd.read_parquet(fichier), topic_model), fichier)
+        _mettre_a_jour(job_id, status=TERMINE, rows_done=lignes, finished_at=datetime.utcnow(),
+                       topics_keywords=json.dumps(keywords, ensure_ascii=False))
+    except Exception as e:
+        traceback.print_exc()
+        _mettre_a_jour(job_id, status=ERREUR, error=str(e), finished_at=datetime.utcnow())
+
+class JobManager:
+    """Pool de threads qui exécute les jobs (un seul par processus, voir get_job_manager)"""
+
+    def __init__(self, max_workers=NB_WORKERS_JOBS, n_topics=2, topic_model_path=TOPIC_MODEL_PATH):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.n_topics = n_topics
+        self.topic_model_path = topic_model_path
+
+    def submit(self, contenu, filename, file_hash):
+        """
+        Enregistre le fichier et met le job en file d'attente.
+        Si ce fichier a déjà un job (en attente, en cours ou terminé), on le réutilise ;
+        un job en erreur est relancé (reprise après les morceaux déjà écrits).
+        Deux uploads simultanés du même fichier obtiennent le même job (index unique sur file_hash).
+        Retourne : l'identifiant du job
+        """
+        existant = find_job(file_hash)
+        if existant is not None:
+            if existant.status == ERREUR and self._relancer(existant.id):
+                self.pool.submit(_run_job, existant.id, self.n_topics, self.topic_model_path)
+            return existant.id
+
+        session = SessionLocal()
+        try:
+            job = Job(file_hash=file_hash, filename=filename, status=EN_ATTENTE,
+                      rows_total=max(contenu.count(b"\n") - 1, 0), created_at=datetime.utcnow())
+            session.add(job)
+            session.commit()
+            job_id = job.id
+        except IntegrityError:
+            # Même fichier enregistré entre-temps par un autre upload : c'est lui qui lance le job
+            session.rollback()
+            return find_job(file_hash).id
+        finally:
+            session.close()
+
+        os.makedirs(_dossier_job(job_id), exist_ok=True)
+        with open(os.path.join(_dossier_job(job_id), "input.csv"), "wb") as f:
+            f.write(contenu)
+        self.pool.submit(_run_job, job_id, self.n_topics, self.topic_model_path)
+        return job_id
+
+    @staticmethod
+    def _relancer(job_id):
+        """Repasse un job en erreur en attente ; Faux si un autre upload l'a déjà relancé"""
+        session = SessionLocal()
+        try:
+            relance = (session.query(Job).filter(Job.id == job_id, Job.status == ERREUR)
+                       .update({"status": EN_ATTENTE, "error": None, "finished_at": None}))
+            session.commit()
+            return relance == 1
+        finally:
+            session.close()
+
+    def resume(self):
+        """Relance les jobs interrompus (ex: redémarrage du serveur pendant un traitement)"""
+        session = SessionLocal()
+        try:
+            a_reprendre = [j.id for j in session.query(Job).filter(Job.status.in_([EN_ATTENTE, EN_COURS]))]
+        finally:
+            session.close()
+        for job_id in a_reprendre:
+            self.pool.submit(_run_job, job_id, self.n_topics, self.topic_model_path)
+        return a_reprendre
+
+_manager = None
+_verrou_manager = threading.Lock()
+
+def get_job_manager():
+    """Retourne le gestionnaire de jobs du processus (créé et relancé au premier appel)"""
+    global _manager
+    with _verrou_manager:
+        if _manager is None:
+            _manager = JobManager()
+            _manager.resume()
+        return _manager
@@ -0,0 +1,92 @@
+import pandas as pd
+from sqlalchemy import select, func
+
+from src.database import engine, ReviewRollup
+from src.instrumentation import metrics
+from src.sentiment import sentiment_to_stars
+
+# KPIs sur tout l'historique archivé, calculés en SQL sur les agrégats journaliers (table review_rollups)
+# et non sur la table 'reviews' : le coût ne dépend que du nombre de jours x sources x sujets x sentiments.
+# Filtres communs à toutes les fonctions :
+#   date_min / date_max : dates incluses (None = pas de borne)
+#   sources / topics / sentiments : listes de valeurs (None = pas de filtre, [] = aucun avis)
+
+def _filtrer(requete, date_min=None, date_max=None, sources=None, topics=None, sentiments=None):
+    if date_min is not None:
+        requete = requete.where(ReviewRollup.day >= date_min)
+    if date_max is not None:
+        requete = requete.where(ReviewRollup.day <= date_max)
+    for colonne, valeurs in ((ReviewRollup.source, sources), (ReviewRollup.topic, topics),
+                             (ReviewRollup.sentiment, sentiments)):
+        if valeurs is not None:
+            requete = requete.where(colonne.in_(list(valeurs)))
+    return requete
+
+def _etoiles(sentiments):
+    """Note business de chaque sentiment (NaN si le sentiment est inconnu : exclu des moyennes)"""
+    return sentiments.map(lambda s: sentiment_to_stars(s) if s else float("nan"))
+
+def _lire(requete, colonnes):
+    with engine.connect() as conn:
+        return pd.DataFrame(conn.execute(requete).all(), columns=colonnes)
+
+@metrics.instrument("kpis.filter_options")
+def get_filter_options():
+    """Valeurs possibles des filtres : {date_min, date_max, sources, topics, sentiments}"""
+    with engine.connect() as conn:
+        date_min, date_max = conn.execute(select(func.min(ReviewRollup.day), func.max(ReviewRollup.day))).one()
+        options = {"date_min": date_min, "date_max": date_max}
+        for nom, colonne in (("sources", ReviewRollup.source), ("topics", ReviewRollup.topic),
+                             ("sentiments", ReviewRollup.sentiment)):
+            options[nom] = [v for (v,) in conn.execute(select(colonne).distinct().order_by(colonne))]
+    return options
+
+@metrics.instrument("kpis.sentiment_distribution")
+def sentiment_distribution(**filtres):
+    """Nombre d'avis et score moyen par sentiment (DataFrame : sentiment, avis, score_moyen)"""
+    requete = _filtrer(select(ReviewRollup.sentiment, func.sum(ReviewRollup.review_count),
+                              func.sum(ReviewRollup.score_sum))
+                       .group_by(ReviewRollup.sentiment), **filtres)
+    df = _lire(requete, ["sentiment", "avis", "score_sum"])
+    df["score_moyen"] = df["score_sum"] / df["avis"]
+    return df.drop(columns="score_sum")
+
+def get_kpis(**filtres):
+    """
+    KPIs globaux : {avis, note_moyenne (1 à 5), score_moyen (confiance de l'IA)}
+    La note business ne dépend que du sentiment : elle se déduit de la répartition par sentiment.
+    """
+    df = sentiment_distribution(**filtres)
+    avis = int(df["avis"].sum()) if not df.empty else 0
+    if avis == 0:
+        return {"avis": 0, "note_moyenne": None, "score_moyen": None}
+    etoiles = _etoiles(df["sentiment"])
+    notes = etoiles.notna()
+    return {
+        "avis": avis,
+        "note_moyenne": float((etoiles[notes] * df["avis"][notes]).sum() / df["avis"][notes].sum()) if notes.any() else None,
+        "score_moyen": float((df["score_moyen"] * df["avis"]).sum() / avis),
+    }
+
+@metrics.instrument("kpis.topic_averages")
+def topic_averages(**filtres):
+    """Nombre d'avis et note moyenne par sujet (DataFrame : topic, avis, note_moyenne)"""
+    requete = _filtrer(select(ReviewRollup.topic, ReviewRollup.sentiment, func.sum(ReviewRollup.review_count))
+                       .group_by(ReviewRollup.topic, ReviewRollup.sentiment), **filtres)
+    df = _lire(requete, ["topic", "sentiment", "avis"])
+    if df.empty:
+        return pd.DataFrame(columns=["topic", "avis", "note_moyenne"])
+    etoiles = _etoiles(df["sentiment"])
+    df["etoiles"] = etoiles * df["avis"]
+    df["avis_notes"] = df["avis"].where(etoiles.notna(), 0)
+    df = df.groupby("topic", as_index=False)[["avis", "etoiles", "avis_notes"]].sum()
+    df["note_moyenne"] = df["etoiles"] / df["avis_notes"]
+    return df.drop(columns=["etoiles", "avis_notes"])
+
+@metrics.instrument("kpis.daily_counts")
+def daily_counts(**filtres):
+    """Nombre d'avis par jour et par sentiment (DataFrame : day, sentiment, avis)"""
+    requete = _filtrer(select(ReviewRollup.day, ReviewRollup.sentiment, func.sum(ReviewRollup.review_count))
+                       .group_by(ReviewRollup.day, ReviewRollup.sentiment)
+                       .order_by(ReviewRollup.day), **filtres)
+    return _lire(requete, ["day", "sentiment", "avis"])
@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+
+# 1. Configuration (variables d'environnement)
+# AVIS_SENTIMENT_MODEL : nom Hugging Face OU chemin d'un dossier local contenant le modèle
+# AVIS_SPACY_FR / AVIS_SPACY_EN : nom du package spaCy OU chemin d'un dossier local
+# AVIS_DEVICE : "cpu", "cuda", "cuda:0"... (vide = CPU)
+# AVIS_SENTIMENT_BACKEND : "pytorch" (par défaut), "int8" (quantifié) ou "onnx" (ONNX Runtime)
+# AVIS_NUM_THREADS : nombre de threads de calcul par processus (vide = choix de la librairie)
+# AVIS_MODEL_CACHE_DIR : dossier des fichiers générés (modèle quantifié, export ONNX)
+# AVIS_OFFLINE=1 : interdit tout téléchargement (modèles déjà présents sur le disque)
+# AVIS_WARMUP=0 : désactive le préchargement en arrière-plan au démarrage du dashboard
+# AVIS_SENTIMENT_CASCADE=1 : classifieur linéaire rapide d'abord, transformer seulement si besoin (src/cascade.py)
+# AVIS_CASCADE_THRESHOLD : confiance minimale du classifieur rapide pour garder sa décision (0 à 1)
+SENTIMENT_MODEL = os.environ.get("AVIS_SENTIMENT_MODEL", "nlptown/bert-base-multilingual-uncased-sentiment")
+SPACY_FR = os.environ.get("AVIS_SPACY_FR", "fr_core_news_sm")
+SPACY_EN = os.environ.get("AVIS_SPACY_EN", "en_core_web_sm")
+DEVICE = os.environ.get("AVIS_DEVICE") or None
+SENTIMENT_BACKEND = os.environ.get("AVIS_SENTIMENT_BACKEND", "pytorch")
+NUM_THREADS = int(os.environ["AVIS_NUM_THREADS"]) if os.environ.get("AVIS_NUM_THREADS") else None
+MODEL_CACHE_DIR = os.environ.get("AVIS_MODEL_CACHE_DIR", os.path.join("models", "sentiment"))
+OFFLINE = os.environ.get("AVIS_OFFLINE", "0") == "1"
+WARMUP = os.environ.get("AVIS_WARMUP", "1") == "1"
+SENTIMENT_CASCADE = os.environ.get("AVIS_SENTIMENT_CASCADE", "0") == "1"
+CASCADE_THRESHOLD = float(os.environ.get("AVIS_CASCADE_THRESHOLD", "0.9"))
+
+if OFFLINE:
+    # Doit être positionné avant le premier import de transformers
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+# 2. Registre des modèles
+class ModelRegistry:
+    """
+    Charge chaque modèle à la première utilisation (et une seule fois par processus).
+    Thread-safe : si deux threads demandent le même modèle, un seul le charge.
+    Un modèle qui n'a pas pu être chargé vaut None (comme avant), sans nouvel essai.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._warm = []         # Modèles préchargés par warm_up()
+        self._instances = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._warmup_thread = None
+        self.load_times = {}   # {nom: secondes}
+        self.errors = {}       # {nom: message d'erreur}
+
+    def register(self, name, loader, warm=True):
+        """
+        Déclare un modèle : loader est une fonction sans argument qui retourne le modèle.
+        warm=False : le modèle n'est jamais préchargé (chargé seulement s'il est demandé)
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks[name] = threading.Lock()
+            if warm:
+                self._warm.append(name)
+
+    def get(self, name):
+        """Retourne le modèle (le charge si besoin)"""
+        if name in self._instances:
+            return self._instances[name]
+        with self._locks[name]:
+            # Un autre thread a pu le charger pendant qu'on attendait le verrou
+            if name not in self._instances:
+                debut = time.perf_counter()
+                try:
+                    self._instances[name] = self._loaders[name]()
+                except Exception as e:
+                    print(f"❌ Erreur chargement modèle '{name}' : {e}")
+                    self.errors[name] = str(e)
+                    self._instances[name] = None
+                self.load_times[name] = time.perf_counter() - debut
+                if self._instances[name] is not None:
+                    print(f"✅ Modèle '{name}' chargé en {self.load_times[name]:.1f} s")
+        return self._instances[name]
+
+    def set(self, name, instance):
+        """Remplace un modèle par un objet déjà construit (ex: modèle de substitution pour les benchmarks)"""
+        with self._locks[name]:
+            self._instances[name] = instance
+            self.load_times[name] = 0.0
+
+    def is_loaded(self, name):
+        return name in self._instances
+
+    def warm_up(self, names=None, background=True):
+        """
+        Précharge les modèles (ceux déclarés avec warm=True par défaut).
+        En arrière-plan, l'application reste utilisable pendant le chargement.
+        Sans effet si un préchargement est déjà en cours ou terminé.
+        """
+        names = list(names or self._warm)
+
+        def _charger():
+            for name in names:
+                self.get(name)
+
+        with self._lock:
+            if self._warmup_thread is not None:
+                return self._warmup_thread
+            if not background:
+                self._warmup_thread = threading.current_thread()
+            else:
+                self._warmup_thread = threading.Thread(target=_charger, name="warmup-modeles", daemon=True)
+                self._warmup_thread.start()
+                return self._warmup_thread
+        _charger()
+        return self._warmup_thread
+
+    def status(self):
+        """État de chaque modèle : chargé ou non, temps de chargement, erreur éventuelle"""
+        return {
+            name: {
+                "charge": self._instances.get(name) is not None,
+                "secondes": self.load_times.get(name),
+                "erreur": self.errors.get(name),
+            }
+            for name in self._loaders
+        }
+
+registry = ModelRegistry()
+
+# 3. Déclaration des modèles du projet
+# On n'utilise que is_stop, is_punct et lemma_ : le parser et la NER sont inutiles,
+# on les exclut pour alléger (et accélérer) les pipelines
+COMPOSANTS_INUTILES = ["parser", "ner"]
+
+def _charger_spacy(nom):
+    def _loader():
+        import spacy
+        try:
+            return spacy.load(nom, exclude=COMPOSANTS_INUTILES)
+        except OSError:
+            print(f"⚠️ ERREUR : Il manque le modèle spaCy '{nom}'.")
+            print(f"Assure-toi d'avoir lancé : python -m spacy download {nom}")
+            return None
+    return _loader
+
+def _charger_sentiment(backend):
+    def _loader():
+        from src.sentiment_backends import load_backend
+        return load_backend(backend, SENTIMENT_MODEL, MODEL_CACHE_DIR, device=DEVICE, num_threads=NUM_THREADS)
+    return _loader
+
+registry.register("spacy_fr", _charger_spacy(SPACY_FR))
+registry.register("spacy_en", _charger_spacy(SPACY_EN))
+# Un modèle par moteur d'inférence (utile pour les comparer), chargés seulement à la demande
+for _backend in ("pytorch", "int8", "onnx"):
+    registry.register(f"sentiment_{_backend}", _charger_sentiment(_backend), warm=False)
+# "sentiment" = le moteur choisi dans la configuration (même instance que sentiment_<moteur>)
+registry.register("sentiment", lambda: registry.get(f"sentiment_{SENTIMENT_BACKEND}"))
+
+def _charger_cascade():
+    from src.cascade import CascadeModel
+    return CascadeModel.load()
+
+# Classifieur rapide de la cascade : None tant qu'il n'a pas été entraîné (tout part alors au transformer)
+registry.register("cascade", _charger_cascade, warm=SENTIMENT_CASCADE)
@@ -0,0 +1,252 @@
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from src.cache import process_with_cache
+from src.database import save_reviews
+from src.sentiment import sentiment_to_stars
+from src.topic_modeling import create_topic_model, TOPIC_MODEL_PATH, VERROU_MODELE
+
+# 1. Paramètres du pipeline "streaming"
+# Nombre de lignes lues (et traitées) à la fois : c'est ce qui borne la mémoire utilisée
+TAILLE_CHUNK = 5000
+# Nombre d'avis nettoyés gardés pour le Topic Modeling final
+TAILLE_ECHANTILLON_TOPICS = 20000
+# Noms de colonnes reconnus comme contenant le texte de l'avis
+COLONNES_TEXTE = ['commentaire', 'avis', 'review', 'text']
+
+COLONNES_ENRICHIES = ['Langue', 'Avis_Nettoye', 'Sentiment', 'Score_IA', 'Etape_Sentiment', 'Note_Business', 'Taille_Groupe',
+                      'Groupe_ID']
+
+def find_text_column(columns):
+    """Retourne le nom de la colonne texte (ou None si aucune n'est reconnue)"""
+    trouvees = [c for c in columns if c.lower() in COLONNES_TEXTE]
+    return trouvees[0] if trouvees else None
+
+def apply_results(chunk, resultats):
+    """
+    Copie les colonnes enrichies (process_with_cache / fan_out) dans le morceau.
+    Groupe_ID (index du représentant dans le morceau) devient l'index de sa ligne dans le fichier :
+    les identifiants de groupe restent distincts d'un morceau à l'autre.
+    """
+    for col in resultats.columns:
+        chunk[col] = resultats[col].values
+    if 'Groupe_ID' in resultats:
+        chunk['Groupe_ID'] = chunk.index.to_numpy()[resultats['Groupe_ID'].to_numpy()]
+    chunk['Note_Business'] = chunk['Sentiment'].apply(sentiment_to_stars)
+    return chunk
+
+def enrich_chunk(chunk, text_column, n_process=1, batch_size=32):
+    """Langue + nettoyage + sentiment sur un morceau du fichier (avec le cache de résultats)"""
+    resultats = process_with_cache(chunk[text_column].tolist(), n_process=n_process, batch_size=batch_size)
+    return apply_results(chunk, resultats)
+
+def iter_enriched_chunks(source, chunksize=TAILLE_CHUNK, text_column=None, n_process=1, batch_size=32):
+    """
+    Générateur : lit le CSV morceau par morceau et renvoie chaque morceau enrichi.
+    source : chemin ou fichier ouvert (ex: fichier uploadé dans Streamlit)
+    Seul un morceau est en mémoire à la fois.
+    """
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        if text_column is None:
+            text_column = find_text_column(chunk.columns)
+            if text_column is None:
+                raise ValueError("Colonne texte introuvable.")
+        yield enrich_chunk(chunk, text_column, n_process=n_process, batch_size=batch_size), text_column
+
+class ParquetSink:
+    """Écrit les morceaux les uns après les autres dans un même fichier Parquet"""
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+        self.schema = None
+
+    def write(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Colonnes d'origine en texte, colonnes enrichies typées : le schéma reste le même à chaque morceau
+        chunk = chunk.copy()
+        for col in chunk.columns:
+            if col not in ('Score_IA', 'Note_Business', 'Taille_Groupe', 'Groupe_ID'):
+                chunk[col] = chunk[col].astype("string")
+        if self.writer is None:
+            self.schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+class ReservoirSample:
+    """Échantillon "réservoir" : chaque texte a la même chance d'être gardé, mémoire bornée"""
+
+    def __init__(self, taille, seed=42):
+        self.taille = taille
+        self.items = []
+        self.vus = 0
+        self.rng = random.Random(seed)
+
+    def add(self, textes):
+        for texte in textes:
+            if len(self.items) < self.taille:
+                self.items.append(texte)
+            else:
+                j = self.rng.randint(0, self.vus)
+                if j < self.taille:
+                    self.items[j] = texte
+            self.vus += 1
+
+def assign_topics(chunk, topic_model):
+    """Sujets des avis d'un morceau (transform seulement : None si le modèle n'est pas encore entraîné)"""
+    if topic_model.is_fitted:
+        chunk['Sujet_Dominant'] = [f"Sujet {x + 1}" for x in topic_model.transform(chunk['Avis_Nettoye'])]
+    else:
+        chunk['Sujet_Dominant'] = None
+    return chunk
+
+def chunk_to_rows(chunk, text_column):
+    """Convertit un morceau enrichi en lignes pour save_reviews"""
+    return [
+        {
+            "text_content": "" if pd.isna(texte) else str(texte),
+            "source": source_avis if isinstance(source_avis, str) else "manuel",
+            "topic": sujet,
+            "sentiment": sentiment,
+            "score": float(score),
+            "sentiment_stage": etape if isinstance(etape, str) else None,
+        }
+        for texte, source_avis, sujet, sentiment, score, etape in zip(
+            chunk[text_column],
+            chunk['source'] if 'source' in chunk else ["manuel"] * len(chunk),
+            chunk['Sujet_Dominant'],
+            chunk['Sentiment'],
+            chunk['Score_IA'],
+            chunk['Etape_Sentiment'] if 'Etape_Sentiment' in chunk else [None] * len(chunk),
+        )
+    ]
+
+def finalize_topics(echantillon, n_topics=2, topic_model_path=TOPIC_MODEL_PATH, engine="online"):
+    """
+    Modèle de sujets final, avant l'attribution des sujets (write_topics) :
+    le modèle sauvegardé (topic_model_path) mis à jour sur l'échantillon ('online'),
+    ou un moteur 'lda' / 'nmf' entraîné dessus (jamais sauvegardé : topic_model_path est ignoré).
+    Retourne : (modèle, mots-clés)
+    """
+    if engine != "online":
+        topic_model = create_topic_model(engine, n_topics)
+        topic_model.partial_fit(echantillon)
+        return topic_model, topic_model.keywords() if topic_model.is_fitted else {}
+
+    with VERROU_MODELE:
+        topic_model = create_topic_model(engine, n_topics, topic_model_path)
+        if echantillon:
+            topic_model.partial_fit(echantillon)
+        if not topic_model.is_fitted:
+            return topic_model, {}
+        topic_model.save(topic_model_path)
+    return topic_model, topic_model.keywords()
+
+@contextmanager
+def spool_file():
+    """Fichier Parquet intermédiaire (morceaux enrichis en attente de leurs sujets), supprimé à la fin"""
+    descripteur, chemin = tempfile.mkstemp(prefix="avis_", suffix=".parquet")
+    os.close(descripteur)
+    try:
+        yield chemin
+    finally:
+        os.remove(chemin)
+
+def iter_parquet_chunks(path, chunksize=TAILLE_CHUNK):
+    """Relit un fichier Parquet morceau par morceau (un seul morceau en mémoire à la fois)"""
+    import pyarrow.parquet as pq
+
+    if os.path.getsize(path) == 0:
+        return  # Aucun morceau écrit (fichier d'entrée vide)
+    for lot in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+        yield lot.to_pandas()
+
+def write_topics(spool_path, topic_model, text_column, save_db=True, sink=None, chunksize=TAILLE_CHUNK):
+    """
+    Dernier passage : relit les morceaux enrichis, leur attribue les sujets du modèle final
+    (transform seulement) et les écrit (BDD et/ou fichier).
+    Retourne : le nombre de lignes écrites
+    """
+    lignes = 0
+    for chunk in iter_parquet_chunks(spool_path, chunksize):
+        chunk = assign_topics(chunk, topic_model)
+        if save_db:
+            save_reviews(chunk_to_rows(chunk, text_column))
+        if sink is not None:
+            sink.write(chunk)
+        lignes += len(chunk)
+    return lignes
+
+def run_streaming_pipeline(source, chunksize=TAILLE_CHUNK, save_db=True, parquet_path=None,
+                           n_topics=2, topic_sample_size=TAILLE_ECHANTILLON_TOPICS, topic_model_path=TOPIC_MODEL_PATH,
+                           n_process=1, batch_size=32, progress=None):
+    """
+    Pipeline complet sur un CSV trop gros pour la mémoire :
+    1. Lecture par morceaux -> langue, nettoyage, sentiment, écrits au fil de l'eau dans un fichier
+       Parquet intermédiaire ; un échantillon des textes nettoyés est gardé (échantillonnage "réservoir")
+    2. Topic Modeling : le modèle sauvegardé est mis à jour sur l'échantillon
+    3. Dernier passage sur le fichier intermédiaire : sujets du modèle final (transform seulement),
+       puis écriture (BDD et/ou fichier Parquet) ; tous les avis ont ainsi les sujets des mots-clés retournés
+    progress : fonction appelée après chaque morceau avec un dictionnaire de statistiques
+    Retourne : un dictionnaire de statistiques + les mots-clés des sujets
+    """
+    debut = time.perf_counter()
+    echantillon = ReservoirSample(topic_sample_size)
+    nb_chunks = 0
+    text_column = None
+
+    with spool_file() as intermediaire:
+        # A. Enrichissement des morceaux (sans les sujets)
+        spool = ParquetSink(intermediaire)
+        try:
+            for chunk, text_column in iter_enriched_chunks(source, chunksize, n_process=n_process,
+                                                           batch_size=batch_size):
+                spool.write(chunk)
+                echantillon.add(chunk['Avis_Nettoye'])
+
+                nb_chunks += 1
+                if progress is not None:
+                    progress({
+                        "lignes": echantillon.vus,
+                        "chunks": nb_chunks,
+                        "secondes": time.perf_counter() - debut,
+                        "lignes_par_seconde": echantillon.vus / max(time.perf_counter() - debut, 1e-9),
+                    })
+        finally:
+            spool.close()
+
+        # B. Mise à jour du modèle de sujets (sur l'échantillon seulement)
+        topic_model, topics_keywords = finalize_topics(echantillon.items, n_topics, topic_model_path)
+
+        # C. Sujets du modèle final + écriture
+        sink = ParquetSink(parquet_path) if parquet_path else None
+        try:
+            write_topics(intermediaire, topic_model, text_column, save_db=save_db, sink=sink, chunksize=chunksize)
+        finally:
+            if sink is not None:
+                sink.close()
+
+    return {
+        "lignes": echantillon.vus,
+        "chunks": nb_chunks,
+        "secondes": time.perf_counter() - debut,
+        "taille_echantillon_topics": len(echantillon.items),
+        "topics_keywords": topics_keywords,
+    }
+
+# --- TEST RAPIDE ---
+if __name__ == "__main__":
+    stats = run_streaming_pipeline("data/avis_clients.csv", chunksize=3, save_db=False,
+                                   progress=lambda s: print(f"⏳ {s['lignes']} avis traités..."))
+    print(stats)
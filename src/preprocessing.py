@@ -1,42 +1,123 @@
 import re
 import string
-import spacy
+from functools import lru_cache
 # Il faut installer cette librairie : pip install langdetect
-from langdetect import detect, LangDetectException
+from langdetect import detect, DetectorFactory, LangDetectException
+
+from src.models import registry
+from src.instrumentation import metrics
+
+# langdetect est aléatoire par défaut : on fixe la graine pour avoir toujours le même résultat
+DetectorFactory.seed = 0
 
 # 1. Chargement des DEUX modèles (Français et Anglais)
-# On utilise des variables globales pour les charger une seule fois
-try:
-    nlp_fr = spacy.load("fr_core_news_sm")
-    nlp_en = spacy.load("en_core_web_sm")
-    print("✅ Succès : Modèles spaCy (FR + EN) chargés.")
-except OSError:
-    print("⚠️ ERREUR : Il manque un modèle spaCy.")
-    print("Assure-toi d'avoir lancé :")
-    print("python -m spacy download fr_core_news_sm")
-    print("python -m spacy download en_core_web_sm")
-    # On crée des variables vides pour éviter que le code crashe tout de suite
-    nlp_fr = None
-    nlp_en = None
+# Les modèles sont chargés à la première utilisation (voir src/models.py) et une seule fois
+def get_nlp_fr():
+    return registry.get("spacy_fr")
 
-def detect_language(text):
+def get_nlp_en():
+    return registry.get("spacy_en")
+
+# 2. DÉTECTION DE LANGUE (une seule fois par texte, avec cache)
+# Nombre maximum de textes (normalisés) gardés en mémoire
+TAILLE_CACHE_LANGUE = 50000
+
+# Mots très fréquents servant au raccourci pour les textes courts
+MOTS_FR = {"le", "la", "les", "un", "une", "des", "et", "est", "je", "il", "ce", "c'est",
+           "très", "pas", "trop", "mais", "avec", "pour", "du", "de", "produit", "livraison"}
+MOTS_EN = {"the", "a", "an", "and", "is", "i", "it", "this", "very", "not", "too",
+           "but", "with", "for", "of", "was", "product", "delivery", "bad", "good"}
+ACCENTS_FR = set("éèêàâçùûôîï")
+# Mots-outils d'autres langues (espagnol, italien, portugais, allemand) absents du français et de l'anglais :
+# s'il y en a un, le texte court n'est pas évident ("la", "de", "il", "est" existent ailleurs) -> langdetect
+MOTS_AUTRES = {"el", "los", "las", "muy", "pero", "una", "del", "por", "bueno", "producto",
+               "di", "che", "molto", "gli", "della", "sono", "questo", "prodotto",
+               "não", "muito", "com", "um", "uma", "ótimo", "produto",
+               "der", "die", "das", "und", "ist", "nicht", "sehr", "ich"}
+
+# Au-delà de ce nombre de mots, on laisse langdetect décider
+MOTS_MAX_RACCOURCI = 8
+
+def _normaliser(text):
+    """Nettoyage Regex (Commun aux deux langues)"""
+    text = text.lower()
+    return re.sub(r'\s+', ' ', text).strip()
+
+def _detection_rapide(text):
     """
-    Détecte la langue du texte (fr ou en).
-    Retourne 'fr' par défaut si le texte est trop court ou bizarre.
+    Raccourci pour les textes courts : compte les mots-outils FR/EN et les accents.
+    Retourne 'fr', 'en' ou None si le résultat n'est pas évident.
     """
+    mots = re.findall(r"[\w']+", text)
+    if len(mots) > MOTS_MAX_RACCOURCI or any(m in MOTS_AUTRES for m in mots):
+        return None
+    score_fr = sum(m in MOTS_FR for m in mots) + (1 if ACCENTS_FR & set(text) else 0)
+    score_en = sum(m in MOTS_EN for m in mots)
+    if score_fr > 0 and score_en == 0:
+        return "fr"
+    if score_en > 0 and score_fr == 0:
+        return "en"
+    return None
+
+@lru_cache(maxsize=TAILLE_CACHE_LANGUE)
+def _detecter_normalise(text):
+    """Détection sur un texte déjà normalisé (résultat mis en cache)"""
+    lang = _detection_rapide(text)
+    if lang is not None:
+        return lang
     try:
-        if not isinstance(text, str) or len(text) < 3:
-            return "fr"
         return detect(text)
     except LangDetectException:
         return "fr"
     except Exception:
         return "fr"
 
-def clean_text(text):
+def detect_language(text):
+    """
+    Détecte la langue du texte (fr ou en).
+    Retourne 'fr' par défaut si le texte est trop court ou bizarre.
+    """
+    if not isinstance(text, str) or len(text) < 3:
+        return "fr"
+    return _detecter_normalise(_normaliser(text))
+
+def detect_languages(texts):
+    """
+    Version "bulk" de detect_language.
+    Retourne : une liste de langues (même ordre que texts), à passer ensuite à clean_texts
+    """
+    with metrics.stage("preprocessing.detect_languages") as mesure:
+        avant = _detecter_normalise.cache_info()
+        langues = [detect_language(text) for text in texts]
+        apres = _detecter_normalise.cache_info()
+        mesure.items = len(langues)
+        mesure.cache_hits = apres.hits - avant.hits
+        mesure.cache_misses = apres.misses - avant.misses
+    return langues
+
+# Statistiques du cache (hits, misses, taille) pour le suivi, et remise à zéro (benchmarks)
+detect_language_cache_info = _detecter_normalise.cache_info
+detect_language_cache_clear = _detecter_normalise.cache_clear
+
+def _choisir_modele(lang):
+    """Retourne le modèle spaCy adapté à la langue (ou None si aucun n'est chargé)"""
+    # On choisit le modèle anglais SI la langue est 'en' ET que le modèle est bien chargé
+    if lang == 'en' and get_nlp_en() is not None:
+        return get_nlp_en()
+    return get_nlp_fr()
+
+def _garder_tokens(doc):
+    """On garde le mot si ce n'est pas un stop-word, pas de la ponctuation, et > 1 lettre"""
+    tokens_propres = []
+    for token in doc:
+        if not token.is_stop and not token.is_punct and len(token.text) > 1:
+            tokens_propres.append(token.lemma_)
+    return " ".join(tokens_propres)
+
+def clean_text(text, lang=None):
     """
     Pipeline bilingue :
-    1. Détecte la langue
+    1. Détecte la langue (sauf si elle est déjà connue via lang)
     2. Sélectionne le bon modèle spaCy (nlp_fr ou nlp_en)
     3. Nettoie (Tokenisation -> Stop-words -> Lemmatisation)
     """
@@ -45,36 +126,71 @@ def clean_text(text):
         return ""
 
     # A. Détection de la langue pour choisir le bon modèle
-    lang = detect_language(text)
+    if lang is None:
+        lang = detect_language(text)
     
     # B. Sélection du modèle (Routing)
-    # On choisit le modèle anglais SI la langue est 'en' ET que le modèle est bien chargé
-    if lang == 'en' and nlp_en is not None:
-        nlp = nlp_en
-    elif nlp_fr is not None:
-        nlp = nlp_fr
-    else:
+    nlp = _choisir_modele(lang)
+    if nlp is None:
         # Si aucun modèle n'est chargé (problème installation), on fait juste un nettoyage basique
         return text.lower().strip()
 
     # C. Nettoyage Regex (Commun aux deux langues)
-    text = text.lower()
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = _normaliser(text)
 
     # D. Traitement NLP avec spaCy
     try:
-        doc = nlp(text)
-        tokens_propres = []
-        for token in doc:
-            # On garde le mot si ce n'est pas un stop-word, pas de la ponctuation, et > 1 lettre
-            if not token.is_stop and not token.is_punct and len(token.text) > 1:
-                tokens_propres.append(token.lemma_)
-        
-        return " ".join(tokens_propres)
+        return _garder_tokens(nlp(text))
     except Exception as e:
         print(f"Erreur NLP sur le texte : {e}")
         return text
 
+# En dessous de ce nombre de textes, lancer plusieurs processus coûte plus cher que ça ne rapporte
+SEUIL_MULTIPROCESS = 2000
+
+@metrics.instrument("preprocessing.clean_texts", items=len)
+def clean_texts(texts, langues=None, n_process=1, batch_size=256):
+    """
+    Version "bulk" de clean_text pour les gros fichiers :
+    1. Détecte la langue de chaque texte (sauf si langues est fourni, ex: via detect_languages)
+       et regroupe les textes par langue
+    2. Fait passer chaque groupe dans nlp.pipe (par lots, éventuellement sur plusieurs cœurs)
+    3. Remet les résultats dans l'ordre d'origine
+    Retourne : une liste de textes nettoyés (même longueur que texts)
+    """
+    texts = list(texts)
+    resultats = [""] * len(texts)
+    if langues is None:
+        langues = detect_languages(texts)
+
+    # A. Regroupement par modèle spaCy
+    groupes = {}
+    for i, text in enumerate(texts):
+        # Même sécurité que clean_text
+        if not isinstance(text, str) or len(text) < 2:
+            continue
+        nlp = _choisir_modele(langues[i])
+        if nlp is None:
+            resultats[i] = text.lower().strip()
+            continue
+        groupes.setdefault(id(nlp), (nlp, []))[1].append(i)
+
+    # B. Traitement de chaque groupe en streaming
+    for nlp, indices in groupes.values():
+        normalises = [_normaliser(texts[i]) for i in indices]
+        n = n_process if len(indices) >= SEUIL_MULTIPROCESS else 1
+        try:
+            docs = nlp.pipe(normalises, n_process=n, batch_size=batch_size)
+            for i, doc in zip(indices, docs):
+                resultats[i] = _garder_tokens(doc)
+        except Exception as e:
+            # Si le lot plante, on retombe sur le traitement texte par texte
+            print(f"Erreur NLP (lot) : {e}")
+            for i in indices:
+                resultats[i] = clean_text(texts[i], langues[i])
+
+    return resultats
+
 # --- ZONE DE TEST ---
 if __name__ == "__main__":
     print("--- Test du module Bilingue ---")
@@ -87,4 +203,7 @@ if __name__ == "__main__":
     
     phrase_en = "The delivery was very slow and I hate this product."
     print(f"EN Original : {phrase_en}")
-    print(f"EN Nettoyé  : {clean_text(phrase_en)}")
\ No newline at end of file
+    print(f"EN Nettoyé  : {clean_text(phrase_en)}")
+
+    print("-" * 20)
+    print(f"Bulk        : {clean_texts([phrase_fr, phrase_en])}")
\ No newline at end of file
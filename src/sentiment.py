@@ -1,41 +1,51 @@
-from transformers import pipeline
+import time
 
-# 1. Chargement du Pipeline (La fameuse "Boîte Noire")
+import numpy as np
+
+from src.models import registry, SENTIMENT_MODEL, SENTIMENT_BACKEND
+from src.instrumentation import metrics
+from src.sentiment_backends import BACKENDS
+
+# 1. Chargement du Modèle (La fameuse "Boîte Noire")
 # On spécifie un modèle "multilingue" capable de lire FR et EN
-# Le téléchargement du modèle (environ 500Mo) se fera AUTOMATIQUEMENT à la première exécution.
-model_name = "nlptown/bert-base-multilingual-uncased-sentiment"
+# Le téléchargement du modèle (environ 500Mo) se fera AUTOMATIQUEMENT à la première utilisation.
+# Le modèle n'est créé qu'au premier appel (voir src/models.py), pas à l'import du module.
+# Le moteur d'inférence (pytorch, int8, onnx) est choisi par configuration (voir src/sentiment_backends.py)
+model_name = SENTIMENT_MODEL
+backend_name = SENTIMENT_BACKEND
 
-try:
-    # On crée l'analyseur
-    sentiment_pipeline = pipeline("sentiment-analysis", model=model_name)
-    print(f"✅ Modèle Sentiment chargé : {model_name}")
-except Exception as e:
-    print(f"❌ Erreur chargement modèle : {e}")
-    sentiment_pipeline = None
+def get_sentiment_backend(backend=None):
+    """
+    Retourne le moteur de sentiment (ou None s'il n'a pas pu être chargé).
+    backend : 'pytorch', 'int8' ou 'onnx' (par défaut : celui de la configuration)
+    """
+    if backend is not None and backend not in BACKENDS:
+        raise ValueError(f"Moteur de sentiment inconnu : {backend!r} (choix : {', '.join(BACKENDS)})")
+    return registry.get("sentiment" if backend is None else f"sentiment_{backend}")
 
-def analyze_sentiment(text):
+def analyze_sentiment(text, backend=None):
     """
     Analyse le sentiment d'un texte.
     Retourne : (Label, Score, Couleur)
     Exemple : ("Positif", 0.95, "green")
     """
-    if not text or not isinstance(text, str) or sentiment_pipeline is None:
+    if not text or not isinstance(text, str):
+        return "Neutre", 0.0, "gray"
+    moteur = get_sentiment_backend(backend)
+    if moteur is None:
         return "Neutre", 0.0, "gray"
 
-    # Le pipeline n'aime pas les textes trop longs (> 512 mots). On coupe si besoin.
+    # Le modèle n'aime pas les textes trop longs (> 512 mots). On coupe si besoin.
     text = text[:512]
 
     try:
         # APPEL MAGIQUE : On donne le texte à l'IA
-        result = sentiment_pipeline(text)[0]
-        # result ressemble à : {'label': '5 stars', 'score': 0.85}
-        
-        label_brut = result['label'] # ex: "1 star", "4 stars"
-        score = result['score']      # Confiance de l'IA (0.0 à 1.0)
-        
+        stars, scores = _predict_batch([text], moteur)
+
         # On convertit les étoiles en sentiments humains
-        # Le modèle renvoie '1 star', '2 stars', etc.
-        star_rating = int(label_brut.split()[0]) # On récupère le chiffre 1, 2...
+        # Le modèle renvoie '1 star', '2 stars', etc. -> stars contient le chiffre 1, 2...
+        star_rating = int(stars[0])
+        score = float(scores[0])     # Confiance de l'IA (0.0 à 1.0)
 
         if star_rating <= 2:
             return "Négatif 😡", score, "red"
@@ -48,6 +58,110 @@ def analyze_sentiment(text):
         print(f"Erreur analyse : {e}")
         return "Erreur", 0.0, "black"
 
+def sentiment_to_stars(sentiment_label):
+    """Convertit un sentiment en note business (1, 3 ou 5 étoiles)"""
+    if "Positif" in sentiment_label: return 5
+    elif "Neutre" in sentiment_label: return 3
+    else: return 1
+
+# 2. VERSION "BATCH" (pour les gros fichiers)
+# Table de correspondance utilisée par le mapping vectorisé étoiles -> sentiment
+LABELS_SENTIMENT = np.array(["Négatif 😡", "Neutre 😐", "Positif 😃"])
+COULEURS_SENTIMENT = np.array(["red", "orange", "green"])
+
+def stars_to_labels(stars):
+    """
+    Convertit un tableau d'étoiles (1 à 5) en sentiments, sans boucle Python.
+    Retourne : (labels, couleurs) sous forme de tableaux numpy
+    """
+    stars = np.asarray(stars)
+    # 1-2 étoiles -> 0 (Négatif), 3 -> 1 (Neutre), 4-5 -> 2 (Positif)
+    index = np.select([stars <= 2, stars == 3], [0, 1], default=2)
+    return LABELS_SENTIMENT[index], COULEURS_SENTIMENT[index]
+
+def _predict_batch(texts, moteur):
+    """
+    Passe un lot de textes dans le modèle en UN SEUL appel.
+    Le padding est fait à la longueur du plus long texte du lot (padding dynamique).
+    Retourne : (stars, scores) sous forme de tableaux numpy
+    """
+    probas = moteur.predict(texts)
+    ids = probas.argmax(axis=1)
+    # id2label ressemble à {0: '1 star', 1: '2 stars', ...}
+    stars_par_id = np.array([int(moteur.id2label[i].split()[0]) for i in range(probas.shape[1])])
+    return stars_par_id[ids], probas.max(axis=1)
+
+@metrics.instrument("sentiment.analyze_batch", items=len)
+def analyze_sentiment_batch(texts, batch_size=32, backend=None):
+    """
+    Analyse le sentiment d'une liste de textes par lots.
+    1. Trie les textes par longueur (les lots ont des longueurs proches)
+    2. Passe chaque lot dans le modèle (padding dynamique par lot)
+    3. Convertit les étoiles en sentiments de façon vectorisée
+    Retourne : une liste de (Label, Score, Couleur), dans l'ordre des textes reçus
+    """
+    texts = list(texts)
+    resultats = [("Neutre", 0.0, "gray")] * len(texts)
+
+    # Mêmes règles que analyze_sentiment : on ignore ce qui n'est pas du texte
+    valides = [i for i, t in enumerate(texts) if t and isinstance(t, str)]
+    if not valides:
+        return resultats
+    moteur = get_sentiment_backend(backend)
+    if moteur is None:
+        return resultats
+
+    tronques = {i: texts[i][:512] for i in valides}
+
+    # A. Tri par longueur en caractères (moins de padding inutile dans chaque lot).
+    # Le nombre de caractères suit de près le nombre de tokens, sans tokeniser deux fois chaque texte.
+    ordre = [valides[j] for j in np.argsort([len(tronques[i]) for i in valides], kind="stable")]
+
+    # B. Inférence lot par lot
+    for debut in range(0, len(ordre), batch_size):
+        lot = ordre[debut:debut + batch_size]
+        try:
+            stars, scores = _predict_batch([tronques[i] for i in lot], moteur)
+            labels, couleurs = stars_to_labels(stars)
+            for i, label, score, couleur in zip(lot, labels, scores, couleurs):
+                resultats[i] = (str(label), float(score), str(couleur))
+        except Exception as e:
+            # Si le lot plante, on retombe sur l'analyse texte par texte
+            # pour garder la gestion d'erreur individuelle
+            print(f"Erreur analyse (lot) : {e}")
+            for i in lot:
+                resultats[i] = analyze_sentiment(texts[i], backend)
+
+    return resultats
+
+# 3. COMPARAISON DES MOTEURS (fp32 vs int8 / onnx)
+def check_backend_parity(texts, backend="int8", reference="pytorch", batch_size=32):
+    """
+    Compare un moteur accéléré au modèle de référence (pytorch fp32) sur les mêmes textes.
+    Retourne : un dictionnaire avec le nombre de labels qui changent et la vitesse de chaque moteur
+    """
+    texts = list(texts)
+    rapport = {"textes": len(texts), "moteur": backend, "reference": reference}
+    resultats = {}
+    for nom in (reference, backend):
+        get_sentiment_backend(nom)  # Chargement hors chronomètre
+        debut = time.perf_counter()
+        resultats[nom] = analyze_sentiment_batch(texts, batch_size=batch_size, backend=nom)
+        secondes = time.perf_counter() - debut
+        rapport[f"avis_par_seconde_{nom}"] = len(texts) / max(secondes, 1e-9)
+
+    changements = {}
+    for (label_ref, _, _), (label, _, _) in zip(resultats[reference], resultats[backend]):
+        if label_ref != label:
+            cle = f"{label_ref} -> {label}"
+            changements[cle] = changements.get(cle, 0) + 1
+    nb_changes = sum(changements.values())
+    rapport["labels_changes"] = nb_changes
+    rapport["taux_changement"] = nb_changes / max(len(texts), 1)
+    rapport["detail_changements"] = changements
+    rapport["acceleration"] = rapport[f"avis_par_seconde_{backend}"] / max(rapport[f"avis_par_seconde_{reference}"], 1e-9)
+    return rapport
+
 # --- TEST RAPIDE ---
 if __name__ == "__main__":
     print("--- Test du module Sentiment ---")
@@ -57,4 +171,5 @@ if __name__ == "__main__":
     avis_2 = "I absolutely love this ! Best purchase ever."
     
     print(f"Avis FR : {avis_1} -> {analyze_sentiment(avis_1)}")
-    print(f"Avis EN : {avis_2} -> {analyze_sentiment(avis_2)}")
\ No newline at end of file
+    print(f"Avis EN : {avis_2} -> {analyze_sentiment(avis_2)}")
+    print(f"Batch   : {analyze_sentiment_batch([avis_1, avis_2])}")
\ No newline at end of file
@@ -0,0 +1,168 @@
+import inspect
+import os
+
+import numpy as np
+
+# Moteurs d'inférence du modèle de sentiment (CPU).
+# Tous exposent la même interface :
+#   - tokenizer : le tokenizer Hugging Face du modèle
+#   - id2label  : {0: '1 star', 1: '2 stars', ...}
+#   - predict(texts) : probabilités (numpy, une ligne par texte)
+# Le choix du moteur se fait avec AVIS_SENTIMENT_BACKEND (voir src/models.py).
+
+BACKENDS = ("pytorch", "int8", "onnx")
+
+def _dossier_cache(cache_dir, model_path):
+    """Dossier où sont gardés les fichiers exportés / quantifiés pour ce modèle"""
+    dossier = os.path.join(cache_dir, model_path.strip("/").replace("/", "__"))
+    os.makedirs(dossier, exist_ok=True)
+    return dossier
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+class TorchBackend:
+    """
+    Modèle PyTorch.
+    quantize=True : quantification dynamique int8 des couches Linear (2 à 4x plus rapide sur CPU).
+    Les poids quantifiés (state_dict seulement, jamais l'objet Python complet) sont gardés sur le disque :
+    au démarrage suivant, l'architecture est recréée à partir de la configuration, quantifiée à vide,
+    puis les poids sont relus avec weights_only=True (aucun code arbitraire exécuté au chargement).
+    """
+
+    def __init__(self, model_path, cache_dir, device=None, num_threads=None, quantize=False):
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.name = "int8" if quantize else "pytorch"
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+        if quantize:
+            # La quantification dynamique ne fonctionne que sur CPU
+            device = "cpu"
+            fichier = os.path.join(_dossier_cache(cache_dir, model_path), "model-int8.state_dict.pt")
+            model = self._charger_int8(model_path, fichier) if os.path.exists(fichier) else None
+            if model is None:
+                model = AutoModelForSequenceClassification.from_pretrained(model_path).eval()
+                model = self._quantifier(model)
+                tmp = f"{fichier}.tmp"
+                torch.save(model.state_dict(), tmp)
+                os.replace(tmp, fichier)
+        else:
+            model = AutoModelForSequenceClassification.from_pretrained(model_path)
+
+        self.model = model.eval()
+        if device is not None:
+            self.model.to(device)
+        self.id2label = self.model.config.id2label
+
+    @staticmethod
+    def _quantifier(model):
+        import torch
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def _charger_int8(self, model_path, fichier):
+        """Modèle int8 à partir des poids sauvegardés, ou None s'ils sont illisibles (ils sont alors recalculés)"""
+        import torch
+        from transformers import AutoConfig, AutoModelForSequenceClassification
+
+        # from_config : architecture seule, sans relire les poids float32 (remplacés juste après)
+        model = AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(model_path)).eval()
+        model = self._quantifier(model)
+        try:
+            model.load_state_dict(torch.load(fichier, weights_only=True))
+        except Exception as e:
+            print(f"⚠️ Poids int8 illisibles ({fichier}), nouvelle quantification : {e}")
+            return None
+        return model
+
+    def predict(self, texts):
+        import torch
+
+        # padding=True : on complète jusqu'au plus long texte du lot seulement (padding dynamique)
+        encodage = self.tokenizer(texts, padding=True, truncation=True, max_length=512, return_tensors="pt")
+        encodage = {k: v.to(self.model.device) for k, v in encodage.items()}
+        with torch.no_grad():
+            logits = self.model(**encodage).logits
+        return torch.softmax(logits, dim=-1).cpu().numpy()
+
+class OnnxBackend:
+    """
+    Modèle exporté au format ONNX et exécuté avec ONNX Runtime (CPU).
+    L'export n'est fait qu'une fois, le fichier .onnx est ensuite réutilisé.
+    """
+
+    def __init__(self, model_path, cache_dir, num_threads=None):
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.name = "onnx"
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.id2label = AutoConfig.from_pretrained(model_path).id2label
+
+        # v2 : les exports précédents (model.onnx) inversaient attention_mask et token_type_ids
+        fichier = os.path.join(_dossier_cache(cache_dir, model_path), "model-v2.onnx")
+        if not os.path.exists(fichier):
+            self._exporter(model_path, fichier)
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(fichier, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _exporter(self, model_path, fichier):
+        import torch
+        from transformers import AutoModelForSequenceClassification
+
+        print(f"⏳ Export ONNX du modèle {model_path}...")
+        model = AutoModelForSequenceClassification.from_pretrained(model_path).eval()
+        exemple = self.tokenizer(["export onnx"], return_tensors="pt")
+        # torch.onnx.export passe les entrées par position : il faut l'ordre des paramètres de forward
+        # (input_ids, attention_mask, token_type_ids), pas celui des clés du tokenizer
+        noms = [nom for nom in inspect.signature(model.forward).parameters if nom in exemple]
+        # Taille de lot et longueur de séquence variables
+        axes = {nom: {0: "batch", 1: "sequence"} for nom in noms}
+        axes["logits"] = {0: "batch"}
+        tmp = f"{fichier}.tmp"
+        torch.onnx.export(
+            model, tuple(exemple[n] for n in noms), tmp,
+            input_names=noms, output_names=["logits"], dynamic_axes=axes, opset_version=14,
+        )
+        os.replace(tmp, fichier)
+
+    def predict(self, texts):
+        encodage = self.tokenizer(texts, padding=True, truncation=True, max_length=512, return_tensors="np")
+        entrees = {nom: encodage[nom].astype(np.int64) for nom in self.input_names if nom in encodage}
+        logits = self.session.run(["logits"], entrees)[0]
+        return _softmax(logits)
+
+def load_backend(backend, model_path, cache_dir, device=None, num_threads=None):
+    """Crée le moteur demandé ('pytorch', 'int8' ou 'onnx')"""
+    if backend == "pytorch":
+        return TorchBackend(model_path, cache_dir, device=device, num_threads=num_threads)
+    if backend == "int8":
+        return TorchBackend(model_path, cache_dir, num_threads=num_threads, quantize=True)
+    if backend == "onnx":
+        return OnnxBackend(model_path, cache_dir, num_threads=num_threads)
+    raise ValueError(f"Moteur de sentiment inconnu : {backend} (choix : {', '.join(BACKENDS)})")
+
+# --- COMPARAISON RAPIDE ---
+# python -m src.sentiment_backends int8 data/avis_clients.csv
+if __name__ == "__main__":
+    import sys
+    import pandas as pd
+    from src.pipeline import find_text_column
+    from src.sentiment import check_backend_parity
+
+    backend = sys.argv[1] if len(sys.argv) > 1 else "int8"
+    chemin = sys.argv[2] if len(sys.argv) > 2 else "data/avis_clients.csv"
+    df = pd.read_csv(chemin)
+    rapport = check_backend_parity(df[find_text_column(df.columns)].tolist(), backend=backend)
+    for cle, valeur in rapport.items():
+        print(f"{cle} : {valeur}")
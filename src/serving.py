@@ -0,0 +1,180 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from src.models import registry, SENTIMENT_CASCADE
+from src.instrumentation import metrics
+from src.preprocessing import detect_languages, clean_texts
+from src.sentiment import sentiment_to_stars
+from src.cascade import analyze_sentiment_cascade
+from src.topic_modeling import TopicModel, TOPIC_MODEL_PATH
+
+# Scoring en temps réel (utilisé par le service HTTP, voir src/api.py) :
+# les demandes concurrentes sont regroupées en micro-lots, passés dans les modèles par UN thread.
+# Un lot part dès qu'il est plein, ou quand le plus ancien avis a attendu ATTENTE_MAX_MS :
+# sous faible charge la latence reste basse, sous forte charge les lots sont pleins (meilleur débit).
+# AVIS_SERVE_MAX_BATCH : taille maximale d'un micro-lot
+# AVIS_SERVE_MAX_WAIT_MS : attente maximale avant de lancer un lot incomplet (millisecondes)
+# AVIS_SERVE_MAX_QUEUE : nombre d'avis en attente au-delà duquel les demandes sont refusées
+TAILLE_MAX_LOT = int(os.environ.get("AVIS_SERVE_MAX_BATCH", "32"))
+ATTENTE_MAX_MS = float(os.environ.get("AVIS_SERVE_MAX_WAIT_MS", "10"))
+TAILLE_MAX_FILE = int(os.environ.get("AVIS_SERVE_MAX_QUEUE", "10000"))
+
+# Modèle de sujets : celui entraîné par le dashboard / le mode batch, en lecture seule
+# (le service ne le met jamais à jour). None s'il n'a pas encore été entraîné.
+registry.register("topics", lambda: TopicModel.load(TOPIC_MODEL_PATH), warm=False)
+
+# Modèles préchargés au démarrage du service ; le service est "prêt" quand MODELES_REQUIS sont chargés
+MODELES_SERVICE = ["spacy_fr", "spacy_en", "sentiment", "topics"] + (["cascade"] if SENTIMENT_CASCADE else [])
+MODELES_REQUIS = ["sentiment"]
+
+# 1. Scoring d'un lot
+def score_texts(texts, batch_size=TAILLE_MAX_LOT):
+    """
+    Langue + nettoyage + sentiment + sujet d'une liste de textes (sans cache ni écriture en base).
+    Retourne : une liste de dictionnaires {langue, avis_nettoye, sentiment, score, note, etape, sujet}
+    (etape : modèle qui a décidé du sentiment, voir src/cascade.py)
+    """
+    texts = list(texts)
+    langues = detect_languages(texts)
+    nettoyes = clean_texts(texts, langues)
+    sentiments = analyze_sentiment_cascade(texts, batch_size=batch_size)
+
+    sujets = [None] * len(texts)
+    topic_model = registry.get("topics")
+    if topic_model is not None and topic_model.is_fitted:
+        sujets = [f"Sujet {x + 1}" for x in topic_model.transform(nettoyes)]
+
+    return [
+        {"langue": langue, "avis_nettoye": nettoye, "sentiment": label, "score": score,
+         "note": sentiment_to_stars(label), "etape": etape, "sujet": sujet}
+        for langue, nettoye, (label, score, _, etape), sujet in zip(langues, nettoyes, sentiments, sujets)
+    ]
+
+def is_ready():
+    """Vrai quand les modèles indispensables sont chargés (et non en échec)"""
+    status = registry.status()
+    return all(status[name]["charge"] for name in MODELES_REQUIS)
+
+# 2. Micro-batching
+class QueueFullError(RuntimeError):
+    """Trop d'avis en attente : la demande est refusée plutôt que de laisser la latence exploser"""
+
+_ARRET = object()
+
+class MicroBatcher:
+    """
+    File d'attente + thread de travail :
+        batcher = MicroBatcher(score_texts).start()
+        future = batcher.submit("Super produit !")   # depuis n'importe quel thread
+        resultat = future.result()
+    Chaque appelant récupère son propre résultat (concurrent.futures.Future).
+    Si la fonction échoue sur un lot, tous les avis du lot reçoivent l'exception.
+    """
+
+    def __init__(self, fonction, max_batch_size=TAILLE_MAX_LOT, max_wait_ms=ATTENTE_MAX_MS,
+                 max_queue=TAILLE_MAX_FILE):
+        self.fonction = fonction
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._file = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.lots = 0          # Nombre de micro-lots traités
+        self.avis = 0          # Nombre d'avis traités
+        self.lots_pleins = 0   # Lots partis parce qu'ils étaient pleins (et non sur l'attente maximale)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._boucle, name="micro-batcher", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Termine les lots déjà en file, puis arrête le thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                # Sous verrou : ne peut pas prendre la place réservée par un submit_many en cours
+                self._file.put(_ARRET)
+        if thread is not None:
+            thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, item):
+        """Ajoute un avis à la file ; retourne un Future (QueueFullError si la file est pleine)"""
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items):
+        """
+        Ajoute plusieurs avis (ex: requête "bulk") : ils sont découpés en micro-lots comme les autres.
+        Tout ou rien : si la file n'a pas assez de place, aucun avis n'est ajouté.
+        La place restante est vérifiée et réservée sous verrou : des requêtes concurrentes
+        ne peuvent pas dépasser la capacité de la file à elles toutes.
+        """
+        items = list(items)
+        futures = [Future() for _ in items]
+        with self._lock:
+            if self._file.maxsize > 0 and self._file.qsize() + len(items) > self._file.maxsize:
+                raise QueueFullError(f"File d'attente pleine ({self._file.maxsize} avis)")
+            for item, future in zip(items, futures):
+                self._file.put_nowait((item, future))
+        return futures
+
+    def _boucle(self):
+        while True:
+            premier = self._file.get()
+            if premier is _ARRET:
+                return
+            lot = [premier]
+            limite = time.perf_counter() + self.max_wait
+            arret = False
+            # On complète le lot jusqu'à ce qu'il soit plein ou que l'attente maximale soit écoulée
+            while len(lot) < self.max_batch_size:
+                reste = limite - time.perf_counter()
+                try:
+                    suivant = self._file.get(timeout=reste) if reste > 0 else self._file.get_nowait()
+                except queue.Empty:
+                    break
+                if suivant is _ARRET:
+                    arret = True
+                    break
+                lot.append(suivant)
+            self._traiter(lot)
+            if arret:
+                return
+
+    def _traiter(self, lot):
+        # Les demandes annulées entre-temps (client parti) ne passent pas dans le modèle
+        lot = [(item, future) for item, future in lot if future.set_running_or_notify_cancel()]
+        if not lot:
+            return
+        try:
+            with metrics.stage("serving.micro_batch", items=len(lot)):
+                resultats = self.fonction([item for item, _ in lot])
+        except Exception as e:
+            for _, future in lot:
+                future.set_exception(e)
+            return
+        self.lots += 1
+        self.avis += len(lot)
+        self.lots_pleins += int(len(lot) == self.max_batch_size)
+        for (_, future), resultat in zip(lot, resultats):
+            future.set_result(resultat)
+
+    def stats(self):
+        return {
+            "en_attente": self._file.qsize(),
+            "lots": self.lots,
+            "avis": self.avis,
+            "taille_moyenne_lot": self.avis / self.lots if self.lots else None,
+            "taux_lots_pleins": self.lots_pleins / self.lots if self.lots else None,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
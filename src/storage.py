@@ -0,0 +1,144 @@
+import json
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+# Stockage compact des avis enrichis :
+# - en mémoire : labels en catégories, scores en float32, textes en chaînes Arrow (compact_dtypes)
+# - sur disque : un fichier Parquet par fichier traité (store/<hash>.parquet), trié par date.
+#   Le dashboard ne relit que les colonnes et les lignes dont il a besoin (read_store) :
+#   les filtres date / sujet / sentiment sont appliqués à la lecture (statistiques des row groups).
+
+DOSSIER_STORE = "store"
+# Lignes par row group : plus petit = filtres plus sélectifs, plus grand = meilleure compression
+TAILLE_ROW_GROUP = 50000
+# Nombre de fichiers gardés dans le store (les plus anciens sont supprimés)
+MAX_FICHIERS_STORE = 50
+# Âge minimal (secondes) d'un fichier avant suppression : un fichier plus récent peut encore être
+# référencé par un résultat en cache du dashboard (à garder >= CACHE_TTL de main.py)
+AGE_MIN_PURGE = 3600
+# Clé des métadonnées du projet dans le schéma Parquet
+CLE_METADONNEES = b"avis"
+
+COLONNES_CATEGORIES = ['Langue', 'Sentiment', 'Etape_Sentiment', 'Sujet_Dominant', 'source']
+
+# 1. Types compacts
+def compact_dtypes(df):
+    """
+    Convertit les colonnes du DataFrame enrichi en types compacts (modifie et retourne df) :
+    labels -> category, Score_IA -> float32, Note_Business / Topic_ID / Taille_Groupe / Groupe_ID -> petits entiers,
+    Date -> date Arrow, autres textes -> chaînes Arrow
+    """
+    for col in df.columns:
+        if col in COLONNES_CATEGORIES:
+            df[col] = df[col].astype("category")
+        elif col == 'Score_IA':
+            df[col] = df[col].astype("float32")
+        elif col in ('Note_Business', 'Topic_ID', 'Taille_Groupe', 'Groupe_ID') and df[col].notna().all():
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+        elif col == 'Date':
+            df[col] = df[col].astype(pd.ArrowDtype(pa.date32()))
+        elif df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].astype("string[pyarrow]")
+    return df
+
+def memory_mb(df):
+    """Mémoire réellement occupée par le DataFrame (textes compris), en Mo"""
+    return df.memory_usage(deep=True).sum() / 1e6
+
+# 2. Écriture / lecture
+def store_path(file_hash):
+    return os.path.join(DOSSIER_STORE, f"{file_hash}.parquet")
+
+def write_store(df, path, metadata=None, min_age=AGE_MIN_PURGE):
+    """
+    Écrit le DataFrame (types compacts) en Parquet, trié par date, avec des métadonnées (dict JSON).
+    Écriture atomique : fichier temporaire puis renommage. Les anciens fichiers sont ensuite purgés
+    (voir purge_store ; min_age : âge minimal en secondes d'un fichier supprimé).
+    """
+    if 'Date' in df:
+        df = df.sort_values('Date', kind="stable")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if metadata is not None:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               CLE_METADONNEES: json.dumps(metadata, default=str).encode("utf-8")})
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    pq.write_table(table, tmp, row_group_size=TAILLE_ROW_GROUP, compression="zstd")
+    os.replace(tmp, path)
+    purge_store(min_age=min_age)
+    return path
+
+def read_store_metadata(path):
+    """Métadonnées écrites par write_store (None si le fichier n'existe pas / est illisible)"""
+    if not os.path.exists(path):
+        return None
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+    except Exception as e:
+        print(f"⚠️ Fichier Parquet illisible ({path}) : {e}")
+        return None
+    return json.loads(metadata[CLE_METADONNEES]) if CLE_METADONNEES in metadata else None
+
+def _types_compacts(type_arrow):
+    """Conversion Arrow -> pandas : chaînes et dates restent au format Arrow (pas d'objets Python)"""
+    if type_arrow in (pa.string(), pa.large_string()):
+        return pd.StringDtype("pyarrow")
+    if type_arrow == pa.date32():
+        return pd.ArrowDtype(pa.date32())
+    return None
+
+def read_store(path, columns=None, date_min=None, date_max=None, topics=None, sentiments=None):
+    """
+    Lit le fichier Parquet en ne chargeant que :
+    - les colonnes demandées (columns=None : toutes)
+    - les lignes qui passent les filtres (date_min / date_max incluses ; topics / sentiments : listes)
+    Le fichier est lu en mémoire mappée ; les row groups hors période ne sont pas lus.
+    """
+    dataset = ds.dataset(path, format="parquet", filesystem=fs.LocalFileSystem(use_mmap=True))
+    conditions = []
+    if date_min is not None:
+        conditions.append(ds.field('Date') >= pa.scalar(date_min, pa.date32()))
+    if date_max is not None:
+        conditions.append(ds.field('Date') <= pa.scalar(date_max, pa.date32()))
+    if topics is not None:
+        conditions.append(ds.field('Sujet_Dominant').isin(list(topics)))
+    if sentiments is not None:
+        conditions.append(ds.field('Sentiment').isin(list(sentiments)))
+    filtre = None
+    for condition in conditions:
+        filtre = condition if filtre is None else filtre & condition
+    table = dataset.to_table(columns=columns, filter=filtre)
+    return table.to_pandas(types_mapper=_types_compacts)
+
+def purge_store(max_files=MAX_FICHIERS_STORE, min_age=AGE_MIN_PURGE):
+    """
+    Supprime les fichiers les plus anciens au-delà de max_files, s'ils n'ont pas été écrits
+    (ou réutilisés, voir touch_store) depuis min_age secondes. Retourne le nombre de fichiers supprimés.
+    """
+    if not os.path.isdir(DOSSIER_STORE):
+        return 0
+    fichiers = sorted((os.path.join(DOSSIER_STORE, f) for f in os.listdir(DOSSIER_STORE) if f.endswith(".parquet")),
+                      key=os.path.getmtime, reverse=True)
+    limite = time.time() - min_age
+    supprimes = 0
+    for fichier in fichiers[max_files:]:
+        try:
+            if os.path.getmtime(fichier) < limite:
+                os.remove(fichier)
+                supprimes += 1
+        except FileNotFoundError:
+            pass   # Déjà supprimé par un autre processus
+    return supprimes
+
+def touch_store(path):
+    """Marque un fichier comme utilisé à l'instant (il redevient le plus récent pour purge_store)"""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
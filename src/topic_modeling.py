@@ -1,45 +1,353 @@
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
+import os
+import threading
+from abc import ABC, abstractmethod
+import time
+import tracemalloc
+import joblib
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer, TfidfVectorizer
+from sklearn.decomposition import LatentDirichletAllocation, MiniBatchNMF
+from sklearn.utils import murmurhash3_32
 import pandas as pd
 import numpy as np
 
-def run_topic_modeling(df, text_column='Avis_Nettoye', n_topics=3):
+from src.instrumentation import metrics
+
+# Au-delà de ce nombre de documents, la LDA utilise tous les cœurs (en dessous, le coût de lancement domine)
+SEUIL_PARALLELE = 10000
+# Moteur de sujets du dashboard et du mode batch (AVIS_TOPIC_ENGINE) :
+# "online" (défaut) : LDA online sauvegardé (TopicModel), mis à jour fichier après fichier
+# "lda" / "nmf" : moteur entraîné sur chaque fichier ("nmf" : le plus rapide sur les gros corpus)
+TOPIC_ENGINE = os.environ.get("AVIS_TOPIC_ENGINE", "online")
+
+def top_keywords(components, feature_names, top_n=10):
+    """
+    Mots-clés de chaque sujet.
+    argpartition ne trie que les top_n meilleurs mots (au lieu de trier tout le vocabulaire).
+    Même ordre que l'ancien argsort()[-top_n:] : du moins important au plus important.
+    """
+    top_n = min(top_n, components.shape[1])
+    topics_keywords = {}
+    for index, topic in enumerate(components):
+        top_words_indices = np.argpartition(topic, -top_n)[-top_n:]
+        top_words_indices = top_words_indices[np.argsort(topic[top_words_indices], kind="stable")]
+        top_words = [feature_names[i] for i in top_words_indices]
+        topics_keywords[f"Sujet {index + 1}"] = ", ".join(top_words)
+    return topics_keywords
+
+# =========================================================
+# MOTEURS DE TOPIC MODELING (INTERCHANGEABLES)
+# =========================================================
+class TopicEngine(ABC):
+    """
+    Interface commune des moteurs de sujets (chaque moteur définit _build).
+    Après fit_transform : topic_ids (sujet dominant de chaque texte), keywords() et stats
+    (temps d'apprentissage, mémoire de la matrice + du modèle, et pic mémoire si track_memory).
+    track_memory utilise tracemalloc : précis mais ralentit nettement l'apprentissage.
+    """
+    name = "base"
+
+    def __init__(self, n_topics=3, track_memory=False):
+        self.n_topics = n_topics
+        self.track_memory = track_memory
+        self.vectorizer = None
+        self.model = None
+        self.stats = {}
+
+    @abstractmethod
+    def _build(self, n_documents):
+        """Retourne (vectorizer, modèle) : à définir dans chaque moteur"""
+
+    def fit_transform(self, texts):
+        """Vectorise, entraîne le modèle et retourne l'index du sujet dominant de chaque texte"""
+        texts = list(texts)
+        self.vectorizer, self.model = self._build(len(texts))
+
+        if self.track_memory:
+            tracemalloc.start()
+        debut = time.perf_counter()
+        try:
+            dtm = self.vectorizer.fit_transform(texts)
+            topic_results = self.model.fit_transform(dtm)
+        finally:
+            secondes = time.perf_counter() - debut
+            pic = tracemalloc.get_traced_memory()[1] if self.track_memory else None
+            if self.track_memory:
+                tracemalloc.stop()
+
+        # Mémoire de la matrice documents x mots (creuse) et des sujets appris
+        memoire = dtm.data.nbytes + dtm.indices.nbytes + dtm.indptr.nbytes + self.model.components_.nbytes
+        self.stats = {
+            "moteur": self.name,
+            "documents": len(texts),
+            "vocabulaire": dtm.shape[1],
+            "fit_secondes": secondes,
+            "memoire_mo": memoire / 1e6,
+            "pic_memoire_mo": pic / 1e6 if pic is not None else None,
+        }
+        # argmax récupère l'index du sujet le plus fort (0, 1, 2...)
+        self.topic_ids = topic_results.argmax(axis=1)
+        return self.topic_ids
+
+    def transform(self, texts):
+        """Sujet dominant de nouveaux textes (après fit_transform)"""
+        textes = ["" if not isinstance(t, str) else t for t in texts]
+        return self.model.transform(self.vectorizer.transform(textes)).argmax(axis=1)
+
+    def keywords(self, top_n=10):
+        return top_keywords(self.model.components_, self.vectorizer.get_feature_names_out(), top_n)
+
+class LDAEngine(TopicEngine):
+    """
+    LDA classique (batch), sur plusieurs cœurs pour les gros corpus.
+    Mêmes réglages que l'ancienne version par défaut (10 itérations, perplexité jamais calculée).
+    Arrêt anticipé en option : evaluate_every > 0 calcule la perplexité toutes les evaluate_every
+    itérations et s'arrête quand elle varie de moins de perp_tol (utile seulement avec max_iter élevé :
+    chaque évaluation coûte environ une itération).
+    """
+    name = "lda"
+
+    def __init__(self, n_topics=3, max_iter=10, evaluate_every=-1, perp_tol=0.1, n_jobs=None, **kwargs):
+        super().__init__(n_topics, **kwargs)
+        self.max_iter = max_iter
+        self.evaluate_every = evaluate_every
+        self.perp_tol = perp_tol
+        self.n_jobs = n_jobs
+
+    def _build(self, n_documents):
+        # On évite les mots trop fréquents (95%) et trop rares
+        vectorizer = CountVectorizer(max_df=0.95, min_df=1)
+        n_jobs = self.n_jobs
+        if n_jobs is None:
+            n_jobs = -1 if n_documents >= SEUIL_PARALLELE else 1
+        model = LatentDirichletAllocation(
+            n_components=self.n_topics, random_state=42, max_iter=self.max_iter,
+            evaluate_every=self.evaluate_every, perp_tol=self.perp_tol, n_jobs=n_jobs,
+        )
+        return vectorizer, model
+
+class NMFEngine(TopicEngine):
+    """TF-IDF + NMF par mini-lots : beaucoup plus rapide que la LDA sur les gros corpus"""
+    name = "nmf"
+
+    def __init__(self, n_topics=3, batch_size=2048, max_iter=50, tol=1e-2, **kwargs):
+        super().__init__(n_topics, **kwargs)
+        self.batch_size = batch_size
+        self.max_iter = max_iter
+        self.tol = tol
+
+    def _build(self, n_documents):
+        vectorizer = TfidfVectorizer(max_df=0.95, min_df=1)
+        # tol=1e-2 : avec la tolérance par défaut (1e-4), les passes sur les mêmes mini-lots n'atteignent
+        # jamais le critère d'arrêt (ConvergenceWarning dès 10 000 avis) ; ici 2 à 6 passes suffisent
+        # pour une erreur de reconstruction à ~1 % de celle d'un apprentissage complet
+        model = MiniBatchNMF(
+            n_components=self.n_topics, batch_size=self.batch_size, max_iter=self.max_iter,
+            tol=self.tol, init="nndsvda", random_state=42,
+        )
+        return vectorizer, model
+
+TOPIC_ENGINES = {"lda": LDAEngine, "nmf": NMFEngine}
+
+def get_topic_engine(engine="lda", n_topics=3, **options):
+    """Crée un moteur de sujets à partir de son nom ('lda' ou 'nmf')"""
+    if engine not in TOPIC_ENGINES:
+        raise ValueError(f"Moteur de sujets inconnu : {engine} (choix : {', '.join(TOPIC_ENGINES)})")
+    return TOPIC_ENGINES[engine](n_topics=n_topics, **options)
+
+@metrics.instrument("topics.run_topic_modeling", items=lambda resultat: len(resultat[0]))
+def run_topic_modeling(df, text_column='Avis_Nettoye', n_topics=3, engine="lda", **options):
     """
     Exécute le Topic Modeling et retourne :
     1. Le DataFrame enrichi avec une colonne 'Sujet_Dominant'
     2. Un dictionnaire des mots-clés pour l'affichage
+    engine : 'lda' (par défaut) ou 'nmf' (gros corpus). Les options sont passées au moteur.
     """
-    
-    # 1. VECTORISATION
-    # On évite les mots trop fréquents (95%) et trop rares
-    vectorizer = CountVectorizer(max_df=0.95, min_df=1)
+    moteur = get_topic_engine(engine, n_topics, **options)
     try:
-        dtm = vectorizer.fit_transform(df[text_column])
+        df['Topic_ID'] = moteur.fit_transform(df[text_column])
     except ValueError:
         # Si le vocabulaire est vide (ex: textes vides)
         return df, {}
 
-    # 2. MODÉLISATION LDA
-    lda_model = LatentDirichletAllocation(n_components=n_topics, random_state=42)
-    lda_model.fit(dtm)
-
-    # 3. ATTRIBUTION DES SUJETS (C'est l'étape qui manquait !)
-    # transform retourne la probabilité d'appartenance [0.1, 0.9] -> Sujet 2 gagne
-    topic_results = lda_model.transform(dtm)
-    
-    # argmax récupère l'index du sujet le plus fort (0, 1, 2...)
-    df['Topic_ID'] = topic_results.argmax(axis=1)
-    
     # On crée un nom plus joli "Sujet 1", "Sujet 2"
     df['Sujet_Dominant'] = df['Topic_ID'].apply(lambda x: f"Sujet {x + 1}")
+    df.attrs['topic_stats'] = moteur.stats
+    return df, moteur.keywords()
 
-    # 4. EXTRACTION DES MOTS CLÉS (Pour l'affichage)
-    topics_keywords = {}
-    feature_names = vectorizer.get_feature_names_out()
-    
-    for index, topic in enumerate(lda_model.components_):
-        top_words_indices = topic.argsort()[-10:]
-        top_words = [feature_names[i] for i in top_words_indices]
-        topics_keywords[f"Sujet {index + 1}"] = ", ".join(top_words)
-        
-    return df, topics_keywords
\ No newline at end of file
+# =========================================================
+# MODÈLE DE SUJETS INCRÉMENTAL (SAUVEGARDÉ SUR DISQUE)
+# =========================================================
+# Emplacement par défaut du modèle sauvegardé
+TOPIC_MODEL_PATH = os.path.join("models", "topic_model.joblib")
+# À incrémenter si la structure de TopicModel change (les anciens fichiers sont alors ignorés)
+TOPIC_MODEL_FORMAT = 1
+# Taille de l'espace de hachage (nombre de "colonnes" du vocabulaire)
+N_FEATURES = 2 ** 18
+# Le modèle sauvegardé est partagé (dashboard, jobs) : relecture + mise à jour + sauvegarde se font sous
+# ce verrou, sinon deux mises à jour simultanées s'écrasent (la dernière sauvegarde gagne)
+VERROU_MODELE = threading.Lock()
+
+class TopicModel:
+    """
+    LDA "online" mis à jour lot par lot (partial_fit) et sauvegardé sur disque.
+    - Le vocabulaire est haché (HashingVectorizer) : pas besoin de le recalculer sur tout le corpus
+    - Les sujets gardent les mêmes numéros d'une mise à jour à l'autre
+    - L'attribution d'un sujet à un nouvel avis ne coûte qu'un transform
+    """
+
+    def __init__(self, n_topics=3, n_features=N_FEATURES):
+        self.n_topics = n_topics
+        self.n_features = n_features
+        self.vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+        self.lda = LatentDirichletAllocation(n_components=n_topics, learning_method="online", random_state=42)
+        # Pour retrouver les mots-clés : index haché -> premier mot rencontré avec cet index
+        self.vocabulaire = {}
+        self.n_documents = 0
+        self.revision = 0   # Nombre de mises à jour (sauvegardé avec le modèle)
+
+    @property
+    def is_fitted(self):
+        return self.revision > 0
+
+    def _vectoriser(self, texts):
+        return self.vectorizer.transform(["" if not isinstance(t, str) else t for t in texts])
+
+    def _mettre_a_jour_vocabulaire(self, texts):
+        analyzer = self.vectorizer.build_analyzer()
+        for text in texts:
+            if not isinstance(text, str):
+                continue
+            for mot in analyzer(text):
+                # Même calcul d'index que HashingVectorizer
+                index = abs(murmurhash3_32(mot, seed=0)) % self.n_features
+                self.vocabulaire.setdefault(index, mot)
+
+    def partial_fit(self, texts):
+        """Met à jour le modèle avec un nouveau lot de textes nettoyés"""
+        texts = list(texts)
+        if not texts:
+            return self
+        with metrics.stage("topics.partial_fit", items=len(texts)):
+            dtm = self._vectoriser(texts)
+            if dtm.nnz == 0:
+                return self
+            self._mettre_a_jour_vocabulaire(texts)
+            self.lda.partial_fit(dtm)
+        self.n_documents += len(texts)
+        self.revision += 1
+        return self
+
+    def transform(self, texts):
+        """Retourne l'index du sujet dominant de chaque texte (0, 1, 2...)"""
+        if len(texts) == 0:
+            return np.empty(0, dtype=np.int64)
+        with metrics.stage("topics.transform", items=len(texts)):
+            return self.lda.transform(self._vectoriser(texts)).argmax(axis=1)
+
+    def keywords(self, top_n=10):
+        """Dictionnaire {"Sujet 1": "mot1, mot2, ..."} pour l'affichage"""
+        # On ne garde que les index pour lesquels on connaît un mot
+        connus = np.fromiter(self.vocabulaire.keys(), dtype=np.int64)
+        mots = [self.vocabulaire[i] for i in connus]
+        return top_keywords(self.lda.components_[:, connus], mots, top_n)
+
+    def save(self, path=TOPIC_MODEL_PATH):
+        """Sauvegarde atomique (fichier temporaire puis renommage)"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        joblib.dump({"format": TOPIC_MODEL_FORMAT, "model": self}, tmp)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=TOPIC_MODEL_PATH):
+        """Charge le modèle sauvegardé, ou None s'il n'existe pas / n'est plus compatible"""
+        if not os.path.exists(path):
+            return None
+        try:
+            contenu = joblib.load(path)
+        except Exception as e:
+            print(f"⚠️ Modèle de sujets illisible ({path}) : {e}")
+            return None
+        if contenu.get("format") != TOPIC_MODEL_FORMAT:
+            print(f"⚠️ Modèle de sujets ignoré : format {contenu.get('format')} != {TOPIC_MODEL_FORMAT}")
+            return None
+        return contenu["model"]
+
+def load_or_create_topic_model(n_topics=3, path=TOPIC_MODEL_PATH):
+    """Charge le modèle sauvegardé s'il a le bon nombre de sujets, sinon en crée un nouveau"""
+    model = TopicModel.load(path)
+    if model is None or model.n_topics != n_topics:
+        model = TopicModel(n_topics=n_topics)
+    return model
+
+class EngineTopicModel:
+    """
+    Moteur 'lda' ou 'nmf' avec l'interface de TopicModel (mode batch, traitement par morceaux) :
+    entraîné une seule fois, sur le premier lot reçu par partial_fit (l'échantillon du fichier,
+    voir finalize_topics), puis transform seulement
+    (le réentraîner changerait la numérotation des sujets déjà attribués).
+    Jamais sauvegardé : le modèle partagé avec le service de scoring reste le LDA online.
+    """
+
+    def __init__(self, engine="nmf", n_topics=3):
+        self.engine = get_topic_engine(engine, n_topics)
+        self.n_topics = n_topics
+        self.revision = 0
+
+    @property
+    def is_fitted(self):
+        return self.revision > 0
+
+    def partial_fit(self, texts):
+        if self.is_fitted:
+            return self
+        textes = ["" if not isinstance(t, str) else t for t in texts]
+        with metrics.stage(f"topics.{self.engine.name}_fit", items=len(textes)):
+            try:
+                self.engine.fit_transform(textes)
+            except ValueError:
+                # Vocabulaire vide (ex: textes vides) : on réessaiera sur le lot suivant
+                return self
+        self.revision = 1
+        return self
+
+    def transform(self, texts):
+        with metrics.stage("topics.transform", items=len(texts)):
+            return self.engine.transform(texts)
+
+    def keywords(self, top_n=10):
+        return self.engine.keywords(top_n)
+
+def create_topic_model(engine=TOPIC_ENGINE, n_topics=3, path=None):
+    """
+    Modèle de sujets du traitement par morceaux :
+    LDA online sauvegardé dans path ('online', TOPIC_MODEL_PATH par défaut) ou moteur 'lda' / 'nmf'.
+    Un moteur 'lda' / 'nmf' n'est jamais sauvegardé : lui donner un chemin est une erreur
+    (l'appelant croirait le modèle enregistré).
+    """
+    if engine == "online":
+        return load_or_create_topic_model(n_topics, path or TOPIC_MODEL_PATH)
+    model = EngineTopicModel(engine, n_topics)
+    if path is not None:
+        raise ValueError(f"Le moteur de sujets '{engine}' n'est pas sauvegardé : aucun chemin attendu ({path})")
+    return model
+
+def run_incremental_topic_modeling(df, text_column='Avis_Nettoye', n_topics=3, path=TOPIC_MODEL_PATH):
+    """
+    Même résultat que run_topic_modeling, mais avec le modèle sauvegardé :
+    1. Met à jour le modèle avec les nouveaux avis uniquement (partial_fit)
+    2. Sauvegarde le modèle
+    3. Attribue les sujets (transform)
+    Retourne : (DataFrame enrichi, dictionnaire des mots-clés)
+    """
+    with VERROU_MODELE:
+        model = load_or_create_topic_model(n_topics, path)
+        model.partial_fit(df[text_column])
+        if not model.is_fitted:
+            # Si le vocabulaire est vide (ex: textes vides)
+            return df, {}
+        model.save(path)
+
+    df['Topic_ID'] = model.transform(df[text_column])
+    df['Sujet_Dominant'] = df['Topic_ID'].apply(lambda x: f"Sujet {x + 1}")
+    return df, model.keywords()
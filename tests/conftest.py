@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Base SQLite temporaire et modèles de substitution : les tests ne touchent ni à la vraie base
+# ni aux vrais modèles (spaCy / transformers ne sont pas nécessaires).
+_DOSSIER_TMP = tempfile.mkdtemp(prefix="tests_avis_")
+os.environ["AVIS_DATABASE_URL"] = f"sqlite:///{os.path.join(_DOSSIER_TMP, 'tests.db')}"
+os.environ["AVIS_WARMUP"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.standins import install_standins
+from src.database import engine, init_db, Base
+
+install_standins()
+
+@pytest.fixture
+def db():
+    """Base vide à chaque test"""
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    yield engine
@@ -0,0 +1,51 @@
+import pandas as pd
+
+from benchmarks.corpus import generate_corpus
+from src.batch import run_batch
+from src.pipeline import run_streaming_pipeline, COLONNES_ENRICHIES
+from src.topic_modeling import TopicModel
+
+# Les processus "worker" démarrent sans les modèles de substitution des tests (ni vrais modèles) :
+# nettoyage basique et sentiment par défaut. On compare donc au pipeline mono-processus ce qui
+# ne dépend pas des modèles : ordre des lignes, colonnes, langue, doublons et sujets.
+COLONNES_SANS_MODELE = ['commentaire', 'source', 'Langue', 'Taille_Groupe', 'Groupe_ID']
+
+def test_run_batch_matches_single_process_pipeline(tmp_path):
+    source = tmp_path / "avis.csv"
+    generate_corpus(250, seed=11).to_csv(source, index=False)
+    reference, sortie = str(tmp_path / "reference.parquet"), str(tmp_path / "batch.parquet")
+    chemin_modele = str(tmp_path / "topics.joblib")
+    run_streaming_pipeline(str(source), chunksize=60, save_db=False, parquet_path=reference,
+                           topic_model_path=str(tmp_path / "topics_reference.joblib"))
+
+    avancement = []
+    stats = run_batch(str(source), output_path=sortie, workers=2, shard_size=60, topic_model_path=chemin_modele,
+                      progress=avancement.append)
+
+    assert (stats["lignes"], stats["shards"], stats["workers"]) == (250, 5, 2)
+    assert [a["shards"] for a in avancement] == [1, 2, 3, 4, 5]
+    assert set(stats["temps_etapes"]) == {"lecture", "doublons", "langue", "nettoyage", "sentiment", "topics",
+                                          "ecriture"}
+    assert all(secondes >= 0 for secondes in stats["temps_etapes"].values())
+
+    attendu, df = pd.read_parquet(reference), pd.read_parquet(sortie)
+    assert df.columns.tolist() == attendu.columns.tolist()
+    assert set(COLONNES_ENRICHIES) <= set(df.columns)
+    pd.testing.assert_frame_equal(df[COLONNES_SANS_MODELE].astype(str), attendu[COLONNES_SANS_MODELE].astype(str))
+
+    # Sujets : ceux du modèle final, pour toutes les lignes
+    modele = TopicModel.load(chemin_modele)
+    assert stats["topics_keywords"] == modele.keywords()
+    assert df["Sujet_Dominant"].astype(str).tolist() == [f"Sujet {x + 1}"
+                                                         for x in modele.transform(df["Avis_Nettoye"].tolist())]
+
+def test_run_batch_writes_csv(tmp_path):
+    source, sortie = tmp_path / "avis.csv", tmp_path / "resultats.csv"
+    corpus = generate_corpus(90, seed=12)
+    corpus.to_csv(source, index=False)
+    run_batch(str(source), output_path=str(sortie), workers=2, shard_size=40,
+              topic_model_path=str(tmp_path / "topics.joblib"))
+
+    df = pd.read_csv(sortie)
+    assert len(df) == 90
+    assert df["commentaire"].tolist() == corpus["commentaire"].tolist()
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import select, func, update, text
+
+from src import cache
+from src.cache import hash_texte, pipeline_version, get_cached_results, store_results, process_with_cache
+from src.database import ResultCache, engine, init_db
+
+def test_hash_texte_normalises_and_depends_on_version():
+    assert hash_texte("Super  Produit ", "v1") == hash_texte("super produit", "v1")
+    assert hash_texte("super produit", "v1") != hash_texte("super produit", "v2")
+    assert hash_texte(None, "v1") is None
+    assert len(hash_texte("x", "v1")) == 64
+
+def test_pipeline_version_changes_with_backend(monkeypatch):
+    version = pipeline_version()
+    monkeypatch.setattr(cache, "backend_name", "onnx" if cache.backend_name != "onnx" else "int8")
+    assert pipeline_version() != version
+
+def test_new_version_misses_cache_without_purging_others(db, monkeypatch):
+    textes = ["Super produit", "Livraison très lente"]
+    process_with_cache(textes)
+    with db.connect() as conn:
+        lignes = conn.execute(select(func.count()).select_from(ResultCache)).scalar()
+    assert lignes == 2
+
+    # Autre version (ex: autre moteur dans un autre processus) : rien n'est relu... ni supprimé
+    monkeypatch.setattr(cache, "backend_name", "autre-moteur")
+    hashes = [hash_texte(t, pipeline_version()) for t in textes]
+    assert get_cached_results(hashes) == {}
+    process_with_cache(textes)
+    with db.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(ResultCache)).scalar() == 4
+
+def test_last_used_only_refreshed_when_stale(db):
+    ancien = datetime.utcnow() - timedelta(days=2)
+    store_results([("h1", "fr", "super", "Positif 😃", 0.9, "transformer")], "v")
+    with db.begin() as conn:
+        conn.execute(update(ResultCache).values(last_used=ancien))
+    get_cached_results(["h1"])
+    with db.connect() as conn:
+        rafraichi = conn.execute(select(ResultCache.last_used)).scalar()
+    assert rafraichi > ancien
+
+    # Date récente : pas de nouvelle écriture
+    get_cached_results(["h1"])
+    with db.connect() as conn:
+        assert conn.execute(select(ResultCache.last_used)).scalar() == rafraichi
+
+def test_cache_hit_keeps_stored_stage(db):
+    textes = ["", "Super produit"]
+    calcule = process_with_cache(textes)
+    relu = process_with_cache(textes)
+    # Avis vide : aucun modèle appelé, ni au calcul ni à la relecture du cache
+    assert pd.isna(calcule["Etape_Sentiment"][0]) and pd.isna(relu["Etape_Sentiment"][0])
+    assert relu["Etape_Sentiment"].tolist()[1:] == calcule["Etape_Sentiment"].tolist()[1:] == ["transformer"]
+
+def test_migration_labels_legacy_rows_once(db):
+    store_results([("h1", "fr", "super", "Positif 😃", 0.9, None), ("h2", "unknown", "", "Neutre", 0.0, None)], "v")
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE results_cache DROP COLUMN etape"))
+    init_db()
+    relus = get_cached_results(["h1", "h2"])
+    assert relus["h1"][-1] == "transformer" and relus["h2"][-1] is None
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+from sqlalchemy import select, func
+
+from src import cascade
+from src.cache import process_with_cache
+from src.cascade import analyze_sentiment_cascade, compare_cascade, ETAPE_LINEAIRE, ETAPE_TRANSFORMER
+from src.database import ResultCache
+from src.models import registry
+from src.sentiment import analyze_sentiment_batch, LABELS_SENTIMENT
+
+NEGATIF, NEUTRE, POSITIF = LABELS_SENTIMENT.tolist()
+
+class _CascadeFixe:
+    """Classifieur rapide dont les décisions sont fixées à l'avance : {texte: (label, confiance)}"""
+    revision = "test"
+
+    def __init__(self, decisions):
+        self.decisions = decisions
+
+    def predict(self, texts):
+        labels, confiances = zip(*(self.decisions[t] for t in texts))
+        return np.array(labels), np.array(confiances)
+
+class _TransformerEnPanne:
+    """Moteur de sentiment qui plante à chaque appel"""
+    id2label = {i: f"{i + 1} stars" for i in range(5)}
+
+    def predict(self, texts):
+        raise RuntimeError("panne")
+
+DECISIONS = {
+    "Super produit, je recommande": (POSITIF, 0.99),
+    "Livraison catastrophique": (NEGATIF, 0.95),
+    "Bof, ça dépend des jours": (NEUTRE, 0.55),
+    "Colis reçu, emballage abîmé mais produit ok": (POSITIF, 0.40),
+}
+
+@pytest.fixture
+def classifieur():
+    registry.set("cascade", _CascadeFixe(DECISIONS))
+    yield
+    registry.set("cascade", None)
+
+@pytest.fixture
+def transformer():
+    """Permet de remplacer le moteur de sentiment le temps d'un test"""
+    standin = registry.get("sentiment")
+    yield lambda moteur: registry.set("sentiment", moteur)
+    registry.set("sentiment", standin)
+
+def test_threshold_routes_uncertain_texts_to_transformer(classifieur, monkeypatch):
+    escalades = []
+
+    def batch_espion(texts, **kwargs):
+        escalades.extend(texts)
+        return analyze_sentiment_batch(texts, **kwargs)
+
+    monkeypatch.setattr(cascade, "analyze_sentiment_batch", batch_espion)
+    texts = list(DECISIONS) + [None, ""]
+    resultats = analyze_sentiment_cascade(texts, threshold=0.9, enabled=True)
+
+    assert escalades == ["Bof, ça dépend des jours", "Colis reçu, emballage abîmé mais produit ok"]
+    assert [etape for _, _, _, etape in resultats] == [ETAPE_LINEAIRE, ETAPE_LINEAIRE,
+                                                       ETAPE_TRANSFORMER, ETAPE_TRANSFORMER, None, None]
+    assert resultats[0][:2] == (POSITIF, pytest.approx(0.99))
+    assert [r[:3] for r in resultats[2:4]] == analyze_sentiment_batch(escalades)
+    assert resultats[4][:3] == resultats[5][:3] == ("Neutre", 0.0, "gray")
+
+    # Seuil plus bas : moins d'avis escaladés
+    escalades.clear()
+    analyze_sentiment_cascade(texts, threshold=0.5, enabled=True)
+    assert escalades == ["Colis reçu, emballage abîmé mais produit ok"]
+
+def test_disabled_cascade_sends_everything_to_transformer(classifieur):
+    texts = list(DECISIONS)
+    resultats = analyze_sentiment_cascade(texts, enabled=False)
+    assert [r[:3] for r in resultats] == analyze_sentiment_batch(texts)
+    assert {etape for _, _, _, etape in resultats} == {ETAPE_TRANSFORMER}
+
+@pytest.mark.parametrize("moteur", [_TransformerEnPanne(), None])
+def test_transformer_failure_is_not_tagged_nor_cached(db, classifieur, transformer, moteur):
+    transformer(moteur)
+    texts = list(DECISIONS)
+    resultats = analyze_sentiment_cascade(texts, threshold=0.9, enabled=True)
+    assert [etape for _, _, _, etape in resultats] == [ETAPE_LINEAIRE, ETAPE_LINEAIRE, None, None]
+    assert {r[0] for r in resultats[2:]} == ({"Erreur"} if moteur is not None else {"Neutre"})
+
+    # Sans cascade non plus, un résultat par défaut n'est pas attribué au transformer
+    assert {etape for _, _, _, etape in analyze_sentiment_cascade(texts, enabled=False)} == {None}
+
+    # Seuls les avis décidés par un modèle sont gardés en cache : les autres seront recalculés
+    process_with_cache(texts)
+    with db.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(ResultCache)).scalar() == 0
+
+def test_compare_cascade_report(classifieur):
+    texts = list(DECISIONS) + [None]
+    reference = [label for label, _, _ in analyze_sentiment_batch(list(DECISIONS))]
+    rapport = compare_cascade(texts, threshold=0.9)
+
+    assert rapport["textes"] == 4
+    assert rapport["seuil"] == 0.9
+    assert rapport["taux_escalade"] == pytest.approx(0.5)
+    # Avis escaladés : même label que le transformer ; avis décidés par le classifieur : selon leur label
+    accord_rapide = sum(DECISIONS[t][0] == ref for t, ref in zip(list(DECISIONS)[:2], reference[:2]))
+    assert rapport["accord"] == pytest.approx((accord_rapide + 2) / 4)
+
+    lignes = {ligne["seuil"]: ligne for ligne in rapport["balayage"]}
+    assert lignes[0.9]["taux_escalade"] == pytest.approx(0.5)
+    assert lignes[0.5]["taux_escalade"] == pytest.approx(0.25)
+    assert lignes[0.98]["taux_escalade"] == pytest.approx(0.75)
+    assert all(ligne["acceleration_estimee"] > 0 for ligne in rapport["balayage"])
+
+def test_compare_cascade_requires_trained_classifier():
+    registry.set("cascade", None)
+    with pytest.raises(RuntimeError):
+        compare_cascade(["Super produit"])
@@ -0,0 +1,96 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect, select, text
+
+from src.database import Review, Job, save_reviews, init_db, rebuild_rollups
+from src.pipeline import chunk_to_rows
+
+def test_missing_text_is_not_stored_as_nan():
+    chunk = pd.DataFrame({"avis": ["Super", np.nan], "Sujet_Dominant": ["Sujet 1", "Sujet 2"],
+                          "Sentiment": ["Positif 😃", "Neutre 😐"], "Score_IA": [0.9, 0.0]})
+    lignes = chunk_to_rows(chunk, "avis")
+    assert [l["text_content"] for l in lignes] == ["Super", ""]
+
+def test_save_reviews_is_idempotent(db):
+    lignes = [{"text_content": "Super produit", "source": "web", "sentiment": "Positif 😃", "score": 0.9}]
+    save_reviews(lignes)
+    save_reviews(lignes)
+    with db.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM reviews")).scalar() == 1
+        assert conn.execute(select(Review.ingested_at)).scalar() is not None
+
+def test_init_db_twice(db):
+    save_reviews([{"text_content": "Super produit", "source": "web", "sentiment": "Positif 😃", "score": 0.9}])
+    init_db()
+    with db.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM reviews")).scalar() == 1
+
+def _rollups(conn):
+    return sorted(conn.execute(text(
+        "SELECT day, source, topic, sentiment, review_count, ROUND(score_sum, 6) FROM review_rollups")).all())
+
+def test_rollups_follow_updates_on_resave(db):
+    premier_jour, second_jour = date(2024, 1, 1), date(2024, 1, 2)
+    save_reviews([
+        {"text_content": "Super", "source": "web", "topic": "Sujet 1", "sentiment": "Positif 😃", "score": 0.9,
+         "review_date": premier_jour},
+        {"text_content": "Nul", "source": "web", "topic": "Sujet 1", "sentiment": "Négatif 😡", "score": 0.8,
+         "review_date": premier_jour},
+    ])
+    # Re-sauvegarde de "Nul" avec un autre sentiment et une autre date : il quitte son ancien agrégat
+    save_reviews([
+        {"text_content": "Nul", "source": "web", "topic": "Sujet 2", "sentiment": "Neutre 😐", "score": 0.5,
+         "review_date": second_jour},
+        {"text_content": "Bien", "source": "web", "topic": "Sujet 1", "sentiment": "Positif 😃", "score": 0.7,
+         "review_date": premier_jour},
+    ])
+    with db.connect() as conn:
+        incremental = _rollups(conn)
+    rebuild_rollups()
+    with db.connect() as conn:
+        assert incremental == _rollups(conn)
+    assert incremental == [
+        ("2024-01-01", "web", "Sujet 1", "Positif 😃", 2, 1.6),
+        ("2024-01-02", "web", "Sujet 2", "Neutre 😐", 1, 0.5),
+    ]
+
+def test_migration_makes_job_file_hash_unique(db):
+    # Ancienne table : index simple, un job relancé après une erreur pour le même fichier
+    with db.begin() as conn:
+        conn.execute(text("DROP INDEX ix_jobs_file_hash"))
+        conn.execute(text("CREATE INDEX ix_jobs_file_hash ON jobs (file_hash)"))
+        conn.execute(text("INSERT INTO jobs (id, file_hash, status) VALUES (1, 'h', 'erreur'), (2, 'h', 'termine')"))
+    init_db()
+    with db.connect() as conn:
+        assert conn.execute(select(Job.id, Job.file_hash).order_by(Job.id)).all() == [(1, None), (2, "h")]
+    index = {i["name"]: i for i in inspect(db).get_indexes("jobs")}
+    assert index["ix_jobs_file_hash"]["unique"]
+
+def test_migration_backfills_hashes_and_merges_legacy_duplicates(db):
+    save_reviews([{"text_content": "Super", "source": "web", "sentiment": "Positif 😃", "score": 0.9}])
+    # Anciens avis, enregistrés sans hash (dont des doublons, et une copie d'un avis déjà migré)
+    with db.begin() as conn:
+        conn.execute(text("INSERT INTO reviews (text_content, source, sentiment, score, ingested_at) VALUES "
+                          "('Nul', 'web', 'Négatif 😡', 0.8, '2024-01-01'), "
+                          "('nul ', 'web', 'Neutre 😐', 0.5, '2024-01-02'), "
+                          "('super', 'web', 'Positif 😃', 0.7, '2024-01-01'), "
+                          "('Bien', 'email', 'Positif 😃', 0.6, '2024-01-01')"))
+    init_db()
+    with db.connect() as conn:
+        lignes = conn.execute(select(Review.text_content, Review.sentiment, Review.text_hash)
+                              .order_by(Review.text_content)).all()
+        incremental = _rollups(conn)
+    # La version la plus récente de chaque avis est gardée
+    assert [(t, s) for t, s, _ in lignes] == [("Bien", "Positif 😃"), ("Super", "Positif 😃"),
+                                              ("nul ", "Neutre 😐")]
+    assert all(h is not None for _, _, h in lignes)
+    rebuild_rollups()
+    with db.connect() as conn:
+        assert incremental == _rollups(conn)
+
+    # Plus aucun avis n'échappe à l'upsert : une nouvelle sauvegarde ne crée pas de copie
+    save_reviews([{"text_content": "Nul", "source": "web", "sentiment": "Négatif 😡", "score": 0.8}])
+    with db.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM reviews")).scalar() == 3
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from src.dedup import find_duplicate_groups, fan_out, group_sizes, normalize_for_dedup
+from src.pipeline import apply_results
+
+def test_exact_duplicates_after_normalisation():
+    textes = ["Super produit !", "super   PRODUIT !", "Livraison lente", "Super produit !\n", None, "", ""]
+    assert find_duplicate_groups(textes, near=False).tolist() == [0, 0, 2, 0, 4, 5, 6]
+
+def test_punctuation_is_never_ignored_by_exact_duplicates():
+    textes = ["Super :)", "Super :(", "Livré ?", "Livré !", "Livré", "!!!", "???", "!!!"]
+    assert normalize_for_dedup("Livré  ?") == "livré ?"
+    assert find_duplicate_groups(textes, near=False).tolist() == [0, 1, 2, 3, 4, 5, 6, 5]
+
+def test_texts_without_words_are_never_near_duplicates():
+    textes = ["", "!!!", "???", "", "ok", "OK !"]
+    assert find_duplicate_groups(textes, near=True).tolist() == [0, 1, 2, 3, 4, 4]
+
+def test_near_duplicates():
+    base = "La livraison a pris trois semaines et le colis était abîmé à l'arrivée"
+    textes = [base, base + " !!", base.replace("semaines", "semaine"), "Produit parfait, je recommande vivement"]
+    assert find_duplicate_groups(textes, near=False).tolist() == [0, 1, 2, 3]
+    assert find_duplicate_groups(textes, near=True, threshold=0.7).tolist() == [0, 0, 0, 3]
+
+def test_fan_out_group_ids_and_sizes():
+    representants = find_duplicate_groups(["a b", "c d", "A B", "a b", "e f"], near=False)
+    uniques = np.unique(representants)
+    resultats = pd.DataFrame({"Sentiment": [f"s{i}" for i in uniques]})
+    sortie = fan_out(resultats, representants)
+    assert sortie["Sentiment"].tolist() == ["s0", "s1", "s0", "s0", "s4"]
+    assert sortie["Taille_Groupe"].tolist() == group_sizes(representants).tolist() == [3, 1, 3, 3, 1]
+    # Une sélection qui coupe un groupe compte toujours ce groupe une fois
+    assert sortie["Groupe_ID"].iloc[[1, 2, 3]].nunique() == 2
+
+def test_group_ids_are_distinct_across_chunks():
+    resultats = fan_out(pd.DataFrame({"Sentiment": ["Positif 😃"]}), np.array([0, 0]))
+    morceaux = [apply_results(pd.DataFrame({"avis": ["x", "x"]}, index=index), resultats)
+                for index in (pd.RangeIndex(0, 2), pd.RangeIndex(2, 4))]
+    assert [m["Groupe_ID"].tolist() for m in morceaux] == [[0, 0], [2, 2]]
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn import metrics as skm
+
+from src import evaluation
+from src.evaluation import confusion_matrix, _scores, scores_par_classe, evaluate
+from src.sentiment import LABELS_SENTIMENT
+
+@pytest.fixture
+def predictions():
+    rng = np.random.default_rng(0)
+    y_true = rng.integers(0, 3, size=500)
+    # Trois classes + la classe "Erreur" (3), jamais dans la vérité
+    y_pred = np.where(rng.random(500) < 0.7, y_true, rng.integers(0, 4, size=500))
+    return y_true, y_pred
+
+def test_confusion_matrix_matches_sklearn(predictions):
+    y_true, y_pred = predictions
+    attendu = skm.confusion_matrix(y_true, y_pred, labels=[0, 1, 2, 3])
+    assert (confusion_matrix(y_true, y_pred, n_classes=4) == attendu).all()
+
+def test_scores_match_sklearn(predictions):
+    y_true, y_pred = predictions
+    accuracy, f1 = _scores(confusion_matrix(y_true, y_pred, n_classes=4))
+    assert accuracy == pytest.approx(skm.accuracy_score(y_true, y_pred))
+    assert f1 == pytest.approx(skm.f1_score(y_true, y_pred, labels=[0, 1, 2, 3], average="weighted",
+                                            zero_division=0))
+
+def test_scores_par_classe_match_sklearn(predictions):
+    y_true, y_pred = predictions
+    par_classe = scores_par_classe(confusion_matrix(y_true, y_pred, n_classes=4))
+    precision, rappel, f1, support = skm.precision_recall_fscore_support(y_true, y_pred, labels=[0, 1, 2],
+                                                                         zero_division=0)
+    assert np.allclose(par_classe["precision"], precision)
+    assert np.allclose(par_classe["rappel"], rappel)
+    assert np.allclose(par_classe["f1"], f1)
+    assert (par_classe["support"] == support).all()
+
+def test_errors_count_as_wrong_predictions(db, monkeypatch):
+    positif, negatif = LABELS_SENTIMENT[2], LABELS_SENTIMENT[0]
+
+    def faux_modele(texts, batch_size=32, backend=None):
+        return [("Erreur", 0.0, "black") if t == "panne" else (positif, 0.9, "green") for t in texts]
+
+    monkeypatch.setattr(evaluation, "analyze_sentiment_batch", faux_modele)
+    gold = pd.DataFrame({"text": ["super", "génial", "panne", "nul"],
+                         "verite": [positif, positif, positif, negatif]})
+    rapport = evaluate(gold, n_bootstrap=0, use_cache=False)
+
+    assert rapport["avis"] == 4
+    assert rapport["erreurs"] == 1
+    assert rapport["accuracy"] == pytest.approx(0.5)
+    assert rapport["matrice_confusion"] == [[0, 0, 1, 0], [0, 0, 0, 0], [0, 0, 2, 1]]
+    assert rapport["labels_predits"][-1] == "Erreur"
+    assert rapport["par_classe"].loc[positif, "rappel"] == pytest.approx(2 / 3)
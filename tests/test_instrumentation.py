@@ -0,0 +1,29 @@
+import threading
+
+from src.instrumentation import Instrumentation
+
+def test_prometheus_keeps_large_values_exact():
+    metrics = Instrumentation()
+    with metrics.stage("pipeline.total", items=12345678):
+        pass
+    texte = metrics.to_prometheus()
+    assert 'avis_stage_items_total{stage="pipeline.total"} 12345678.0' in texte
+    assert 'avis_stage_calls_total{stage="pipeline.total"} 1.0' in texte
+
+def test_options_only_apply_to_current_thread():
+    metrics = Instrumentation(profile=False)
+
+    def autre_session():
+        with metrics.stage("autre"):
+            sum(range(1000))
+
+    with metrics.options(profile=True):
+        with metrics.stage("profilee"):
+            thread = threading.Thread(target=autre_session)
+            thread.start()
+            thread.join()
+    with metrics.stage("apres"):
+        pass
+
+    assert metrics.profile is False
+    assert list(metrics.profils) == ["profilee"]
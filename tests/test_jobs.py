@@ -0,0 +1,75 @@
+import os
+
+from benchmarks.corpus import generate_corpus
+from src import jobs
+from src.database import SessionLocal, Job
+from src.topic_modeling import TopicModel
+
+def _creer_job(dossier_jobs, n_avis):
+    session = SessionLocal()
+    try:
+        job = Job(file_hash="h", filename="avis.csv", status=jobs.EN_ATTENTE, rows_total=n_avis)
+        session.add(job)
+        session.commit()
+        job_id = job.id
+    finally:
+        session.close()
+    os.makedirs(os.path.join(dossier_jobs, str(job_id)))
+    generate_corpus(n_avis, seed=5).to_csv(os.path.join(dossier_jobs, str(job_id), "input.csv"), index=False)
+    return job_id
+
+def test_job_topics_come_from_final_model(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "DOSSIER_JOBS", str(tmp_path / "jobs"))
+    monkeypatch.setattr(jobs, "TAILLE_CHUNK_JOB", 40)
+    chemin_modele = str(tmp_path / "topics.joblib")
+    job_id = _creer_job(jobs.DOSSIER_JOBS, 100)
+
+    jobs._run_job(job_id, 2, chemin_modele)
+
+    job = jobs.get_job(job_id)
+    assert job.status == jobs.TERMINE
+    assert (job.rows_done, job.chunks_done) == (100, 3)
+    # Le modèle partagé n'est mis à jour qu'une fois, sur l'échantillon de tout le fichier
+    modele = TopicModel.load(chemin_modele)
+    assert (modele.revision, modele.n_documents) == (1, 100)
+    assert jobs.get_job_keywords(job) == modele.keywords()
+    # Y compris les morceaux écrits avec les sujets provisoires
+    resultats = jobs.load_job_results(job_id)
+    assert len(resultats) == 100
+    assert resultats["Sujet_Dominant"].tolist() == [f"Sujet {x + 1}"
+                                                    for x in modele.transform(resultats["Avis_Nettoye"].tolist())]
+
+def _manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "DOSSIER_JOBS", str(tmp_path / "jobs"))
+    lances = []
+    monkeypatch.setattr(jobs, "_run_job", lambda job_id, *args: lances.append(job_id))
+    return jobs.JobManager(max_workers=1), lances
+
+def test_same_file_submitted_twice_gets_one_job(db, tmp_path, monkeypatch):
+    manager, lances = _manager(tmp_path, monkeypatch)
+    contenu = generate_corpus(10).to_csv(index=False).encode("utf-8")
+    premier = manager.submit(contenu, "avis.csv", "h")
+
+    # Upload simultané : le job n'existait pas encore à la vérification, l'index unique tranche
+    find_job, appels = jobs.find_job, []
+
+    def find_job_en_retard(file_hash):
+        appels.append(file_hash)
+        return None if len(appels) == 1 else find_job(file_hash)
+
+    monkeypatch.setattr(jobs, "find_job", find_job_en_retard)
+    assert manager.submit(contenu, "avis.csv", "h") == premier
+    manager.pool.shutdown(wait=True)
+    assert lances == [premier]
+
+def test_failed_job_is_relaunched_once(db, tmp_path, monkeypatch):
+    manager, lances = _manager(tmp_path, monkeypatch)
+    contenu = generate_corpus(10).to_csv(index=False).encode("utf-8")
+    job_id = manager.submit(contenu, "avis.csv", "h")
+    jobs._mettre_a_jour(job_id, status=jobs.ERREUR, error="panne")
+
+    assert manager.submit(contenu, "avis.csv", "h") == job_id
+    assert manager.submit(contenu, "avis.csv", "h") == job_id
+    manager.pool.shutdown(wait=True)
+    assert lances == [job_id, job_id]
+    assert (jobs.get_job(job_id).status, jobs.get_job(job_id).error) == (jobs.EN_ATTENTE, None)
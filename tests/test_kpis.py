@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.database import save_reviews
+from src.kpis import get_filter_options, get_kpis, sentiment_distribution, topic_averages, daily_counts
+from src.sentiment import LABELS_SENTIMENT, sentiment_to_stars
+
+@pytest.fixture
+def avis(db):
+    """Base remplie d'avis aléatoires ; retourne les mêmes avis en DataFrame (calcul de référence)"""
+    rng = np.random.default_rng(1)
+    n = 300
+    df = pd.DataFrame({
+        "text_content": [f"avis {i}" for i in range(n)],
+        "source": rng.choice(["web", "magasin"], n),
+        "topic": rng.choice(["Sujet 1", "Sujet 2", "Sujet 3"], n),
+        "sentiment": rng.choice(LABELS_SENTIMENT, n),
+        "score": rng.random(n).round(3),
+        "review_date": [date(2024, 1, 1) + timedelta(days=int(j)) for j in rng.integers(0, 10, n)],
+    })
+    save_reviews(df.to_dict("records"))
+    df["etoiles"] = df["sentiment"].map(sentiment_to_stars)
+    return df
+
+FILTRES = {"date_min": date(2024, 1, 3), "date_max": date(2024, 1, 7), "sources": ["web"],
+           "topics": ["Sujet 1", "Sujet 3"]}
+
+def _filtrer(df):
+    return df[(df["review_date"] >= FILTRES["date_min"]) & (df["review_date"] <= FILTRES["date_max"])
+              & df["source"].isin(FILTRES["sources"]) & df["topic"].isin(FILTRES["topics"])]
+
+def test_get_kpis(avis):
+    attendu = _filtrer(avis)
+    kpis = get_kpis(**FILTRES)
+    assert kpis["avis"] == len(attendu)
+    assert kpis["note_moyenne"] == pytest.approx(attendu["etoiles"].mean())
+    assert kpis["score_moyen"] == pytest.approx(attendu["score"].mean())
+    assert get_kpis(topics=[]) == {"avis": 0, "note_moyenne": None, "score_moyen": None}
+
+def test_sentiment_distribution(avis):
+    attendu = _filtrer(avis).groupby("sentiment")["score"].agg(["size", "mean"])
+    resultat = sentiment_distribution(**FILTRES).set_index("sentiment").loc[attendu.index]
+    assert (resultat["avis"] == attendu["size"]).all()
+    assert np.allclose(resultat["score_moyen"], attendu["mean"])
+
+def test_topic_averages(avis):
+    attendu = _filtrer(avis).groupby("topic")["etoiles"].agg(["size", "mean"])
+    resultat = topic_averages(**FILTRES).set_index("topic").loc[attendu.index]
+    assert (resultat["avis"] == attendu["size"]).all()
+    assert np.allclose(resultat["note_moyenne"], attendu["mean"])
+
+def test_daily_counts(avis):
+    attendu = _filtrer(avis).groupby(["review_date", "sentiment"]).size()
+    resultat = daily_counts(**FILTRES)
+    resultat["day"] = pd.to_datetime(resultat["day"]).dt.date
+    assert resultat.set_index(["day", "sentiment"])["avis"].sort_index().tolist() == attendu.sort_index().tolist()
+
+def test_filter_options(avis):
+    options = get_filter_options()
+    assert str(options["date_min"]) == str(avis["review_date"].min())
+    assert str(options["date_max"]) == str(avis["review_date"].max())
+    assert options["sources"] == sorted(avis["source"].unique())
+    assert options["topics"] == sorted(avis["topic"].unique())
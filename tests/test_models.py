@@ -0,0 +1,121 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from src.models import ModelRegistry
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class _Chargeur:
+    """Loader qui compte ses appels (et peut prendre du temps ou planter)"""
+
+    def __init__(self, secondes=0.0, erreur=None):
+        self.appels = 0
+        self.secondes = secondes
+        self.erreur = erreur
+
+    def __call__(self):
+        self.appels += 1
+        time.sleep(self.secondes)
+        if self.erreur:
+            raise RuntimeError(self.erreur)
+        return object()
+
+def test_models_are_loaded_lazily():
+    registre = ModelRegistry()
+    chargeur = _Chargeur()
+    registre.register("modele", chargeur)
+    assert chargeur.appels == 0 and not registre.is_loaded("modele")
+
+    modele = registre.get("modele")
+    assert registre.get("modele") is modele
+    assert chargeur.appels == 1 and registre.is_loaded("modele")
+
+def test_concurrent_get_loads_once():
+    registre = ModelRegistry()
+    chargeur = _Chargeur(secondes=0.05)
+    registre.register("modele", chargeur)
+    depart = threading.Barrier(16)
+    resultats = []
+
+    def client():
+        depart.wait()
+        resultats.append(registre.get("modele"))
+
+    threads = [threading.Thread(target=client) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert chargeur.appels == 1
+    assert len(resultats) == 16 and all(r is resultats[0] for r in resultats)
+
+def test_failed_load_is_none_and_not_retried():
+    registre = ModelRegistry()
+    chargeur = _Chargeur(erreur="fichier absent")
+    registre.register("modele", chargeur)
+    assert registre.get("modele") is None
+    assert registre.get("modele") is None
+    assert chargeur.appels == 1
+    assert registre.status()["modele"]["erreur"] == "fichier absent"
+
+def test_warm_up_and_status():
+    registre = ModelRegistry()
+    lent, a_la_demande = _Chargeur(secondes=0.05), _Chargeur()
+    registre.register("lent", lent)
+    registre.register("a_la_demande", a_la_demande, warm=False)
+    assert registre.status() == {
+        "lent": {"charge": False, "secondes": None, "erreur": None},
+        "a_la_demande": {"charge": False, "secondes": None, "erreur": None},
+    }
+
+    thread = registre.warm_up()
+    thread.join(timeout=5)
+    etat = registre.status()
+    assert etat["lent"]["charge"] and etat["lent"]["secondes"] >= 0.05
+    assert not etat["a_la_demande"]["charge"] and a_la_demande.appels == 0
+
+    # Préchargement déjà fait : sans effet
+    assert registre.warm_up() is thread
+    assert lent.appels == 1
+
+def test_warm_up_in_foreground():
+    registre = ModelRegistry()
+    chargeur = _Chargeur()
+    registre.register("modele", chargeur)
+    registre.warm_up(background=False)
+    assert registre.is_loaded("modele") and chargeur.appels == 1
+
+def _configuration(env):
+    """Configuration lue par src.models dans un nouveau processus, avec ces variables d'environnement"""
+    code = ("import json, os; from src import models; print(json.dumps({nom: getattr(models, nom) for nom in ("
+            "'SENTIMENT_MODEL', 'SPACY_FR', 'SPACY_EN', 'DEVICE', 'SENTIMENT_BACKEND', 'NUM_THREADS', "
+            "'MODEL_CACHE_DIR', 'OFFLINE', 'WARMUP', 'SENTIMENT_CASCADE', 'CASCADE_THRESHOLD')} "
+            "| {'HF_HUB_OFFLINE': os.environ.get('HF_HUB_OFFLINE')}))")
+    propre = {k: v for k, v in os.environ.items() if not k.startswith("AVIS_") and k != "HF_HUB_OFFLINE"}
+    sortie = subprocess.run([sys.executable, "-c", code], env={**propre, **env}, cwd=RACINE,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(sortie)
+
+def test_environment_overrides_configuration():
+    defaut = _configuration({})
+    assert defaut["SENTIMENT_BACKEND"] == "pytorch" and defaut["DEVICE"] is None
+    assert defaut["NUM_THREADS"] is None and defaut["WARMUP"] and not defaut["OFFLINE"]
+    assert not defaut["SENTIMENT_CASCADE"] and defaut["CASCADE_THRESHOLD"] == 0.9
+
+    config = _configuration({
+        "AVIS_SENTIMENT_MODEL": "/modeles/sentiment", "AVIS_SPACY_FR": "fr_core_news_md",
+        "AVIS_SPACY_EN": "en_core_web_md", "AVIS_DEVICE": "cuda:0", "AVIS_SENTIMENT_BACKEND": "onnx",
+        "AVIS_NUM_THREADS": "4", "AVIS_MODEL_CACHE_DIR": "/tmp/modeles", "AVIS_OFFLINE": "1", "AVIS_WARMUP": "0",
+        "AVIS_SENTIMENT_CASCADE": "1", "AVIS_CASCADE_THRESHOLD": "0.75",
+    })
+    assert config == {
+        "SENTIMENT_MODEL": "/modeles/sentiment", "SPACY_FR": "fr_core_news_md", "SPACY_EN": "en_core_web_md",
+        "DEVICE": "cuda:0", "SENTIMENT_BACKEND": "onnx", "NUM_THREADS": 4, "MODEL_CACHE_DIR": "/tmp/modeles",
+        "OFFLINE": True, "WARMUP": False, "SENTIMENT_CASCADE": True, "CASCADE_THRESHOLD": 0.75,
+        "HF_HUB_OFFLINE": "1",
+    }
@@ -0,0 +1,28 @@
+import pandas as pd
+from sqlalchemy import select
+
+from benchmarks.corpus import generate_corpus
+from src.database import Review
+from src.pipeline import run_streaming_pipeline
+from src.topic_modeling import TopicModel
+
+def test_streamed_topics_come_from_final_model(db, tmp_path):
+    source = tmp_path / "avis.csv"
+    generate_corpus(250, seed=7).to_csv(source, index=False)
+    sortie, chemin_modele = str(tmp_path / "avis.parquet"), str(tmp_path / "topics.joblib")
+
+    stats = run_streaming_pipeline(str(source), chunksize=60, parquet_path=sortie, topic_model_path=chemin_modele)
+
+    assert stats["chunks"] == 5
+    # Un seul apprentissage, sur l'échantillon (ici tout le fichier), avant l'attribution des sujets
+    modele = TopicModel.load(chemin_modele)
+    assert (modele.revision, modele.n_documents) == (1, 250)
+    assert stats["topics_keywords"] == modele.keywords()
+
+    df = pd.read_parquet(sortie)
+    attendus = [f"Sujet {x + 1}" for x in modele.transform(df["Avis_Nettoye"].tolist())]
+    assert len(df) == 250
+    assert df["Sujet_Dominant"].tolist() == attendus
+    with db.connect() as conn:
+        en_base = dict(conn.execute(select(Review.text_content, Review.topic)).all())
+    assert en_base == dict(zip(df["commentaire"], attendus))
@@ -0,0 +1,58 @@
+import pytest
+
+from src import preprocessing
+from src.preprocessing import detect_language, detect_languages, clean_text, clean_texts, _detection_rapide
+
+@pytest.mark.parametrize("text, langue", [
+    ("La livraison est rapide", "fr"),
+    ("Très bien", "fr"),
+    ("The product is good", "en"),
+])
+def test_short_text_shortcut(text, langue):
+    assert _detection_rapide(text.lower()) == langue
+
+@pytest.mark.parametrize("text", [
+    "el producto es muy bueno",
+    "il prodotto è molto buono",
+    "o produto é muito bom",
+    "das ist sehr gut",
+])
+def test_other_languages_fall_back_to_langdetect(text):
+    assert _detection_rapide(text) is None
+    assert detect_language(text) not in ("fr", "en")
+
+def test_detect_languages_matches_single_calls():
+    texts = ["Super produit", "Great value for money", None, "ok"]
+    assert detect_languages(texts) == [detect_language(t) for t in texts]
+
+TEXTES_MELANGES = [
+    "Les clients n'ont pas aimé les produits livrés hier !",
+    "The delivery was late and the box was damaged.",
+    None,
+    "El producto es muy bueno",
+    "",
+    "Très bien, je recommande ce vendeur.",
+    "x",
+    "I love this app, it works great!",
+    "Das ist sehr gut",
+    "Livraison rapide, emballage soigné.",
+]
+
+@pytest.mark.parametrize("batch_size", [256, 2])
+def test_clean_texts_matches_clean_text_in_input_order(batch_size):
+    attendu = [clean_text(t) for t in TEXTES_MELANGES]
+    assert clean_texts(TEXTES_MELANGES, batch_size=batch_size) == attendu
+    # Langues déjà connues (comme dans le pipeline) : même résultat
+    langues = detect_languages(TEXTES_MELANGES)
+    assert clean_texts(TEXTES_MELANGES, langues=langues, batch_size=batch_size) == attendu
+
+    # Chaque texte est traité par le modèle de sa langue, et reste à sa place
+    assert attendu[2] == attendu[4] == attendu[6] == ""
+    assert "the" not in attendu[1].split() and "delivery" in attendu[1]
+    assert "les" not in attendu[0].split() and "clients" in attendu[0]
+    assert "app" in attendu[7] and "livraison" in attendu[9]
+
+def test_clean_texts_multiprocess_keeps_order(monkeypatch):
+    monkeypatch.setattr(preprocessing, "SEUIL_MULTIPROCESS", 2)
+    texts = TEXTES_MELANGES * 3
+    assert clean_texts(texts, n_process=2, batch_size=2) == [clean_text(t) for t in texts]
@@ -0,0 +1,17 @@
+import pytest
+
+from src.sentiment import analyze_sentiment_batch, analyze_sentiment, get_sentiment_backend
+
+def test_batch_keeps_input_order():
+    texts = ["Super produit, je recommande vivement à tout le monde", "nul", None, "", "Livraison correcte"]
+    batch = analyze_sentiment_batch(texts, batch_size=2)
+    assert len(batch) == len(texts)
+    for text, resultat in zip(texts, batch):
+        assert resultat[:1] == analyze_sentiment(text)[:1]
+        assert resultat[1] == pytest.approx(analyze_sentiment(text)[1])
+
+def test_unknown_backend_raises_value_error():
+    with pytest.raises(ValueError):
+        get_sentiment_backend("tensorflow")
+    with pytest.raises(ValueError):
+        analyze_sentiment_batch(["Super produit"], backend="tensorflow")
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("onnxruntime")
+
+from src.sentiment_backends import TorchBackend, OnnxBackend
+
+MOTS = ["super", "produit", "livraison", "lente", "colis", "abîmé", "je", "recommande"]
+
+@pytest.fixture
+def petit_modele(tmp_path):
+    """Petit BERT aléatoire (5 classes) + tokenizer, enregistrés comme un modèle Hugging Face"""
+    dossier = tmp_path / "modele"
+    dossier.mkdir()
+    vocab = dossier / "vocab.txt"
+    vocab.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + MOTS), encoding="utf-8")
+    transformers.BertTokenizerFast(vocab_file=str(vocab)).save_pretrained(str(dossier))
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=5 + len(MOTS), hidden_size=32, num_hidden_layers=2,
+                                     num_attention_heads=2, intermediate_size=37, num_labels=5,
+                                     id2label={i: f"{i + 1} stars" for i in range(5)})
+    transformers.BertForSequenceClassification(config).save_pretrained(str(dossier))
+    return str(dossier), str(tmp_path / "cache")
+
+def test_onnx_matches_pytorch(petit_modele):
+    model_path, cache_dir = petit_modele
+    # Longueurs différentes : le padding n'est correct que si attention_mask arrive à la bonne entrée
+    textes = ["super", "livraison lente colis abîmé je recommande", "produit super super"]
+    attendu = TorchBackend(model_path, cache_dir).predict(textes)
+    obtenu = OnnxBackend(model_path, cache_dir).predict(textes)
+    assert np.allclose(obtenu, attendu, atol=1e-4)
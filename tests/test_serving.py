@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api
+from src.serving import MicroBatcher, QueueFullError, MODELES_SERVICE
+
+def _doubler(items):
+    return [2 * x for x in items]
+
+def test_results_keep_submission_order():
+    batcher = MicroBatcher(_doubler, max_batch_size=8, max_wait_ms=5).start()
+    try:
+        futures = batcher.submit_many(range(50)) + [batcher.submit(50)]
+        assert [f.result(timeout=5) for f in futures] == [2 * x for x in range(51)]
+        assert batcher.avis == 51
+        assert batcher.stats()["taille_moyenne_lot"] <= 8
+    finally:
+        batcher.stop(timeout=5)
+
+def test_submit_many_is_all_or_nothing():
+    batcher = MicroBatcher(_doubler, max_queue=5)   # Pas démarré : la file ne se vide pas
+    batcher.submit_many([1, 2, 3])
+    with pytest.raises(QueueFullError):
+        batcher.submit_many([4, 5, 6])
+    assert batcher.stats()["en_attente"] == 3
+    batcher.submit_many([4, 5])
+    with pytest.raises(QueueFullError):
+        batcher.submit(6)
+
+def test_concurrent_bulk_requests_never_exceed_capacity():
+    batcher = MicroBatcher(_doubler, max_queue=10)
+    acceptees = []
+    depart = threading.Barrier(20)
+
+    def client():
+        depart.wait()
+        try:
+            acceptees.append(len(batcher.submit_many([0, 1, 2])))
+        except QueueFullError:
+            pass
+
+    threads = [threading.Thread(target=client) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(acceptees) == batcher.stats()["en_attente"] == 9
+
+def test_service_always_warms_up_its_models(monkeypatch):
+    appels = []
+    monkeypatch.setattr(api.registry, "warm_up", lambda names=None, background=True: appels.append(list(names)))
+    with TestClient(api.app) as client:
+        assert client.get("/health").status_code == 200
+    assert appels == [MODELES_SERVICE]
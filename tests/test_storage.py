@@ -0,0 +1,60 @@
+import os
+import time
+from datetime import date
+
+import pandas as pd
+
+from src import storage
+from src.storage import compact_dtypes, write_store, read_store, read_store_metadata, purge_store, touch_store
+
+def _df_enrichi():
+    return pd.DataFrame({
+        "avis": ["Super produit", "Livraison lente", None, "Correct"],
+        "Langue": ["fr", "fr", "unknown", "fr"],
+        "Avis_Nettoye": ["super produit", "livraison lent", "", "correct"],
+        "Sentiment": ["Positif 😃", "Négatif 😡", "Neutre 😐", "Neutre 😐"],
+        "Score_IA": [0.91, 0.75, 0.0, 0.5],
+        "Etape_Sentiment": ["transformer", "lineaire", None, "transformer"],
+        "Taille_Groupe": [1, 2, 1, 1],
+        "Note_Business": [5, 1, 3, 3],
+        "Topic_ID": [0, 1, 1, 0],
+        "Sujet_Dominant": ["Sujet 1", "Sujet 2", "Sujet 2", "Sujet 1"],
+        "Date": [date(2024, 1, 3), date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 4)],
+    })
+
+def test_compact_dtypes_round_trip(tmp_path):
+    original = _df_enrichi()
+    compact = compact_dtypes(_df_enrichi())
+    assert compact["Sentiment"].dtype == "category"
+    assert compact["Score_IA"].dtype == "float32"
+    assert compact["Note_Business"].dtype == "int8"
+
+    chemin = write_store(compact, str(tmp_path / "f.parquet"), {"lignes": 4})
+    relu = read_store(chemin)
+    assert read_store_metadata(chemin) == {"lignes": 4}
+    # Trié par date à l'écriture ; mêmes types et mêmes valeurs qu'en mémoire
+    attendu = compact.sort_values("Date").reset_index(drop=True)
+    assert (relu.dtypes == attendu.dtypes).all()
+    pd.testing.assert_frame_equal(relu, attendu, check_categorical=False)
+    assert relu["Score_IA"].tolist() == original.sort_values("Date")["Score_IA"].astype("float32").tolist()
+
+def test_read_store_filters(tmp_path):
+    chemin = write_store(compact_dtypes(_df_enrichi()), str(tmp_path / "f.parquet"))
+    relu = read_store(chemin, columns=["avis", "Sentiment"], date_min=date(2024, 1, 2), date_max=date(2024, 1, 3),
+                      sentiments=["Neutre 😐", "Positif 😃"])
+    assert relu["avis"].tolist()[1] == "Super produit"
+    assert len(relu) == 2 and list(relu.columns) == ["avis", "Sentiment"]
+
+def test_purge_keeps_recent_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DOSSIER_STORE", str(tmp_path))
+    ancien = time.time() - 7200
+    for i in range(4):
+        chemin = tmp_path / f"{i}.parquet"
+        chemin.write_bytes(b"")
+        os.utime(chemin, (ancien + i, ancien + i))
+    (tmp_path / "recent.parquet").write_bytes(b"")
+    # Le fichier 0 vient d'être réutilisé : il redevient récent
+    touch_store(str(tmp_path / "0.parquet"))
+
+    assert purge_store(max_files=1, min_age=3600) == 3
+    assert sorted(os.listdir(tmp_path)) == ["0.parquet", "recent.parquet"]
@@ -0,0 +1,128 @@
+import random
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.exceptions import ConvergenceWarning
+
+from benchmarks.corpus import generate_corpus
+from src.pipeline import assign_topics, finalize_topics
+from src.topic_modeling import (LDAEngine, NMFEngine, EngineTopicModel, TopicEngine, TopicModel, create_topic_model,
+                                run_topic_modeling, TOPIC_MODEL_FORMAT)
+
+def test_lda_defaults_match_previous_version():
+    _, model = LDAEngine(n_topics=2)._build(100)
+    assert model.max_iter == 10
+    assert model.evaluate_every == -1
+
+def test_nmf_converges_on_10k_reviews():
+    textes = generate_corpus(10000, seed=42)["commentaire"].tolist()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", ConvergenceWarning)
+        topic_ids = NMFEngine(n_topics=3).fit_transform(textes)
+    assert len(topic_ids) == 10000
+
+@pytest.mark.parametrize("engine", ["lda", "nmf"])
+def test_run_topic_modeling_engines(engine):
+    df = pd.DataFrame({"Avis_Nettoye": generate_corpus(200, seed=1)["commentaire"]})
+    df, mots_cles = run_topic_modeling(df, n_topics=2, engine=engine)
+    assert set(df["Sujet_Dominant"]) <= {"Sujet 1", "Sujet 2"}
+    assert list(mots_cles) == ["Sujet 1", "Sujet 2"]
+
+def test_engine_topic_model_fits_once_and_is_never_saved(tmp_path):
+    chemin = tmp_path / "topics.joblib"
+    textes = generate_corpus(300, seed=3)["commentaire"]
+    model, mots_cles = finalize_topics(list(textes[:150]), n_topics=2, topic_model_path=str(chemin), engine="nmf")
+    assert isinstance(model, EngineTopicModel)
+
+    composantes = model.engine.model.components_.copy()
+    model.partial_fit(textes[150:])
+    sujets = assign_topics(pd.DataFrame({"Avis_Nettoye": textes[150:]}), model)
+
+    assert sujets["Sujet_Dominant"].notna().all()
+    assert (model.engine.model.components_ == composantes).all()
+    assert list(mots_cles) == ["Sujet 1", "Sujet 2"]
+    assert not chemin.exists()
+
+def test_assign_topics_never_fits():
+    model = TopicModel(n_topics=2)
+    sujets = assign_topics(pd.DataFrame({"Avis_Nettoye": ["livraison lente", "produit super"]}), model)
+    assert sujets["Sujet_Dominant"].isna().all()
+    assert not model.is_fitted
+
+def test_create_topic_model_online_and_unknown(tmp_path):
+    assert isinstance(create_topic_model("online", 2, str(tmp_path / "t.joblib")), TopicModel)
+    with pytest.raises(ValueError):
+        create_topic_model("bertopic", 2)
+
+def test_engines_are_never_given_a_path(tmp_path):
+    assert isinstance(create_topic_model("lda", 2), EngineTopicModel)
+    with pytest.raises(ValueError):
+        create_topic_model("nmf", 2, str(tmp_path / "t.joblib"))
+
+def test_incomplete_engine_fails_at_creation():
+    class SansBuild(TopicEngine):
+        name = "incomplet"
+
+    with pytest.raises(TypeError):
+        SansBuild(n_topics=2)
+
+def test_topic_model_ignores_empty_batches():
+    model = TopicModel(n_topics=2)
+    assert not model.partial_fit([]).is_fitted
+    model.partial_fit(generate_corpus(50, seed=2)["commentaire"])
+    assert len(model.transform([])) == 0
+
+THEMES = {
+    "livraison": ["livraison", "colis", "retard", "transporteur", "expedition", "suivi", "relais", "facteur"],
+    "batterie": ["batterie", "ecran", "chargeur", "autonomie", "telephone", "recharge", "cable", "tactile"],
+}
+SONDES = {"livraison": "colis livraison retard transporteur suivi", "batterie": "batterie ecran chargeur autonomie"}
+
+def _avis_themes(n, seed):
+    """Avis nettoyés tirés de deux thèmes sans mot commun"""
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(THEMES[rng.choice(list(THEMES))], k=6)) for _ in range(n)]
+
+def _sujets_sondes(model):
+    return dict(zip(SONDES, model.transform(list(SONDES.values()))))
+
+def test_topic_indices_stay_stable_across_partial_fit():
+    model = TopicModel(n_topics=2).partial_fit(_avis_themes(200, seed=1))
+    sujets = _sujets_sondes(model)
+    assert sujets["livraison"] != sujets["batterie"]
+
+    for seed in range(2, 6):
+        model.partial_fit(_avis_themes(100, seed=seed))
+        assert _sujets_sondes(model) == sujets
+        # Les mots-clés de chaque numéro de sujet restent ceux du même thème
+        mots_cles = model.keywords(top_n=3)
+        for theme, sujet in sujets.items():
+            assert set(mots_cles[f"Sujet {sujet + 1}"].split(", ")) <= set(THEMES[theme])
+    assert model.revision == 5 and model.n_documents == 600
+
+def test_topic_model_save_load_round_trip(tmp_path):
+    chemin = str(tmp_path / "topics" / "model.joblib")
+    assert TopicModel.load(chemin) is None
+    model = TopicModel(n_topics=2).partial_fit(_avis_themes(200, seed=1))
+    model.save(chemin)
+    relu = TopicModel.load(chemin)
+
+    assert (relu.n_topics, relu.revision, relu.n_documents) == (2, 1, 200)
+    assert relu.vocabulaire == model.vocabulaire
+    assert relu.keywords() == model.keywords()
+    textes = _avis_themes(50, seed=7)
+    assert (relu.transform(textes) == model.transform(textes)).all()
+
+    # Le modèle relu continue d'apprendre exactement comme l'original
+    lot = _avis_themes(100, seed=8)
+    model.partial_fit(lot)
+    relu.partial_fit(lot)
+    assert np.allclose(relu.lda.components_, model.lda.components_)
+
+def test_topic_model_load_ignores_other_formats(tmp_path):
+    chemin = str(tmp_path / "model.joblib")
+    joblib.dump({"format": TOPIC_MODEL_FORMAT + 1, "model": TopicModel(n_topics=2)}, chemin)
+    assert TopicModel.load(chemin) is None